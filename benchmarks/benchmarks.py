@@ -0,0 +1,125 @@
+"""
+Benchmarks of the loaders, samplers and growth generators.
+
+The suites follow the conventions of asv (airspeed velocity): `setup` prepares the inputs for a combination of
+`params`, methods prefixed with `time_` are timed and methods prefixed with `peakmem_` are measured for their peak
+memory. They can be run with `asv run` or with `python -m benchmarks.run`, which compares the results to a stored
+baseline.
+"""
+import pandas as pd
+# registers the pint dtype of time series values
+import pint_pandas  # noqa: F401
+
+from excel_helper import ExcelParameterLoader, ParameterRepository, Parameter, DistributionFunctionGenerator, \
+    growth_coefficients
+from benchmarks.workbooks import xlsx_workbook, csv_file
+
+
+class LoaderSuite(object):
+    """
+    Loading definitions with the XLRD and the pandas CSV handlers into a repository.
+    """
+    params = [1000, 10000, 100000]
+    param_names = ['rows']
+    timeout = 600
+
+    def setup(self, rows):
+        self.xlsx = xlsx_workbook(rows)
+        self.csv = csv_file(rows)
+
+    def load_xlrd(self):
+        ExcelParameterLoader(filename=self.xlsx, excel_handler='xlrd').load_into_repo(ParameterRepository())
+
+    def load_pandas_csv(self):
+        ExcelParameterLoader(filename=self.csv, excel_handler='pandas').load_into_repo(ParameterRepository())
+
+    def time_xlrd(self, rows):
+        self.load_xlrd()
+
+    def peakmem_xlrd(self, rows):
+        self.load_xlrd()
+
+    def time_pandas_csv(self, rows):
+        self.load_pandas_csv()
+
+    def peakmem_pandas_csv(self, rows):
+        self.load_pandas_csv()
+
+
+class SamplerSuite(object):
+    """
+    Scalar samples with the DistributionFunctionGenerator.
+    """
+    params = [['normal', 'uniform', 'triangular', 'choice'], [1000, 100000]]
+    param_names = ['distribution', 'samples']
+
+    distribution_params = {'normal': (10, 1, None), 'uniform': (0, 1, None), 'triangular': (0, 1, 2),
+                           'choice': ('1,2,3', None, None)}
+
+    def setup(self, distribution, samples):
+        a, b, c = self.distribution_params[distribution]
+        self.generator = DistributionFunctionGenerator(module_name='numpy.random', distribution_name=distribution,
+                                                       param_a=a, param_b=b, param_c=c, size=samples)
+
+    def time_generate_values(self, distribution, samples):
+        self.generator.generate_values()
+
+    def peakmem_generate_values(self, distribution, samples):
+        self.generator.generate_values()
+
+
+class GrowthSuite(object):
+    """
+    Time series with growth: growth_coefficients, the version 2 GrowthTimeSeriesGenerator and the version 1
+    ConstantUncertaintyExponentialGrowthTimeSeriesGenerator, through Parameter.__call__.
+    """
+    params = [[12, 120, 600], [1000, 100000]]
+    param_names = ['months', 'samples']
+    timeout = 600
+
+    def setup(self, months, samples):
+        self.times = pd.date_range('2020-01-01', periods=months, freq='MS')
+        self.settings = {'use_time_series': True, 'times': self.times, 'sample_size': samples}
+        self.v2 = Parameter('v2', version=2, type='exp', unit='kg', **{'ref value': 10.},
+                            initial_value_proportional_variation=.2, growth_factor=.05, ef_growth_factor=.02,
+                            ref_date=self.times[0].to_pydatetime(), param='')
+        self.v1 = Parameter('v1', version=1, module_name='numpy.random', distribution_name='normal', param_a=10,
+                            param_b=1, cagr=.05, ref_date=self.times[0].to_pydatetime(), unit='kg')
+
+    def sample(self, parameter):
+        parameter.cache = None
+        parameter(self.settings)
+
+    def time_growth_coefficients(self, months, samples):
+        growth_coefficients(self.times[0], self.times[-1], self.times[months // 2], .05, samples)
+
+    def peakmem_growth_coefficients(self, months, samples):
+        growth_coefficients(self.times[0], self.times[-1], self.times[months // 2], .05, samples)
+
+    def time_growth_time_series_v2(self, months, samples):
+        self.sample(self.v2)
+
+    def peakmem_growth_time_series_v2(self, months, samples):
+        self.sample(self.v2)
+
+    def time_growth_time_series_v1(self, months, samples):
+        self.sample(self.v1)
+
+    def peakmem_growth_time_series_v1(self, months, samples):
+        self.sample(self.v1)
+
+    def sample_wide(self, parameter):
+        self.settings['layout'] = 'wide'
+        try:
+            self.sample(parameter)
+        finally:
+            del self.settings['layout']
+
+    def time_growth_time_series_v2_wide(self, months, samples):
+        self.sample_wide(self.v2)
+
+    def peakmem_growth_time_series_v2_wide(self, months, samples):
+        self.sample_wide(self.v2)
+
+
+suites = [LoaderSuite, SamplerSuite, GrowthSuite]
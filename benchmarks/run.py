@@ -0,0 +1,154 @@
+"""
+Run the benchmarks and compare them to a stored baseline.
+
+    # record a baseline on the machine that runs the comparisons
+    python -m benchmarks.run --profile quick --save baseline.json
+
+    # fail (exit code 1) if a stage got slower or uses more memory than the baseline
+    python -m benchmarks.run --profile quick --compare baseline.json
+
+`benchmarks/baseline.json` is a reference baseline of the quick profile. Its peak memory is comparable across
+machines, its times are only comparable on a machine of similar speed, so record a baseline before comparing times on
+another machine. A missing baseline file is an error (exit code 2) before any benchmark runs.
+
+Profiles: 'quick' runs the smallest parameter combination of every suite, 'full' runs all of them (100k rows
+workbooks and 600 months x 100k samples, several GB of memory).
+
+Time is the best of several repeats. Peak memory is the peak of the memory traced by tracemalloc during a call, which
+includes numpy buffers.
+"""
+import argparse
+import itertools
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+from benchmarks.benchmarks import suites
+
+
+def parameter_combinations(suite, profile):
+    params = suite.params
+    if params and not isinstance(params[0], list):
+        params = [params]
+    if profile == 'quick':
+        params = [p[:1] for p in params]
+    return list(itertools.product(*params))
+
+
+def benchmark_id(suite, method, combination):
+    return f'{suite.__name__}.{method}({", ".join(map(str, combination))})'
+
+
+def measure_time(function, repeat):
+    # the first call warms up caches and lazy imports
+    start = time.perf_counter()
+    function()
+    if time.perf_counter() - start > 2:
+        repeat = 1
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        # long stages are not repeated
+        if elapsed > 2:
+            break
+    return best
+
+
+def measure_peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(profile='quick', pattern=None, repeat=5, log=print):
+    """
+    :return: dict of {benchmark id: {'time': seconds} or {'peakmem': bytes}}
+    """
+    results = {}
+    for suite in suites:
+        methods = [m for m in dir(suite) if m.startswith(('time_', 'peakmem_'))]
+        for combination in parameter_combinations(suite, profile):
+            selected = [m for m in methods
+                        if pattern is None or re.search(pattern, benchmark_id(suite, m, combination))]
+            if not selected:
+                continue
+            instance = suite()
+            instance.setup(*combination)
+            for method in selected:
+                function = getattr(instance, method)
+                key = benchmark_id(suite, method, combination)
+                if method.startswith('time_'):
+                    results[key] = {'time': measure_time(lambda: function(*combination), repeat)}
+                    log(f'{key:<80} {results[key]["time"] * 1000:12.2f} ms')
+                else:
+                    results[key] = {'peakmem': measure_peak_memory(lambda: function(*combination))}
+                    log(f'{key:<80} {results[key]["peakmem"] / 2 ** 20:12.2f} MiB')
+    return results
+
+
+def compare(results, baseline, time_tolerance=.5, memory_tolerance=.2, min_time=.001):
+    """
+    :param time_tolerance: allowed relative increase of time
+    :param memory_tolerance: allowed relative increase of peak memory
+    :param min_time: time differences below this number of seconds are not regressions
+    :return: list of messages for the benchmarks that regressed
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        if 'time' in result:
+            before, after = baseline[key]['time'], result['time']
+            if after > before * (1 + time_tolerance) and after - before > min_time:
+                regressions.append(f'{key}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms')
+        if 'peakmem' in result:
+            before, after = baseline[key]['peakmem'], result['peakmem']
+            if after > before * (1 + memory_tolerance):
+                regressions.append(f'{key}: {before / 2 ** 20:.2f} MiB -> {after / 2 ** 20:.2f} MiB')
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Run the excel_helper benchmarks')
+    parser.add_argument('--profile', choices=['quick', 'full'], default='quick')
+    parser.add_argument('--filter', help='regular expression of the benchmarks to run')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--save', help='write the results as baseline to this file')
+    parser.add_argument('--compare', help='compare the results to the baseline in this file')
+    parser.add_argument('--time-tolerance', type=float, default=.5)
+    parser.add_argument('--memory-tolerance', type=float, default=.2)
+    args = parser.parse_args(args)
+    if args.compare and not os.path.exists(args.compare):
+        parser.error(f'no baseline {args.compare}, record one with --save {args.compare}')
+
+    results = run(args.profile, args.filter, args.repeat)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        missing = [key for key in results if key not in baseline]
+        if missing:
+            print(f'{len(missing)} benchmarks are not in the baseline {args.compare}: {", ".join(missing)}')
+        regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Synthetic parameter definitions for the benchmarks.
+
+Files are generated once per size into a temporary directory and reused by all benchmarks in a process.
+"""
+import csv
+import datetime
+import os
+import tempfile
+
+import numpy as np
+
+# the columns of version 2 definitions as read by the PandasCSVHandler (the first 15 columns are used)
+v2_header = ['variable', 'scenario', 'type', 'ref value', 'param', 'initial_value_proportional_variation', 'unit',
+             'mean growth', 'variability growth', 'ref date', 'label', 'comment', 'source', 'tags', 'expression']
+
+_directory = None
+
+
+def data_directory():
+    global _directory
+    if _directory is None:
+        _directory = tempfile.mkdtemp(prefix='excel_helper_benchmarks_')
+    return _directory
+
+
+def v2_rows(rows: int, scenario_share=.1, seed=0):
+    """
+    Version 2 definition rows of exponential growth parameters. A share of the variables also has a scenario row.
+
+    :return: list of lists in the order of `v2_header`
+    """
+    random_state = np.random.RandomState(seed)
+    scenarios = int(rows * scenario_share)
+    definitions = []
+    for i in range(rows - scenarios):
+        definitions.append(_v2_row(f'var_{i}', '', random_state))
+    for i in range(scenarios):
+        definitions.append(_v2_row(f'var_{i}', 's1', random_state))
+    return definitions
+
+
+def _v2_row(name, scenario, random_state):
+    return [name, scenario, 'exp', float(random_state.uniform(1, 100)), '',
+            float(random_state.uniform(0, .3)), 'kg', float(random_state.uniform(-.1, .1)),
+            float(random_state.uniform(0, .1)), datetime.datetime(2020, 1, 1), f'label {name}', '', 'synthetic',
+            'bench', '']
+
+
+def xlsx_workbook(rows: int) -> str:
+    """
+    A version 2 workbook with a metadata sheet and one sheet of definitions.
+
+    :return: the path of the workbook
+    """
+    path = os.path.join(data_directory(), f'definitions_{rows}.xlsx')
+    if not os.path.exists(path):
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        metadata = wb.create_sheet('metadata')
+        metadata.append(['version', 2])
+        sheet = wb.create_sheet('params')
+        sheet.append(v2_header)
+        for row in v2_rows(rows):
+            sheet.append(row)
+        wb.save(path)
+    return path
+
+
+def csv_file(rows: int) -> str:
+    """
+    :return: the path of a CSV file with version 2 definitions
+    """
+    path = os.path.join(data_directory(), f'definitions_{rows}.csv')
+    if not os.path.exists(path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(v2_header)
+            for row in v2_rows(rows):
+                row[9] = row[9].strftime('%d/%m/%Y')
+                writer.writerow(row)
+    return path
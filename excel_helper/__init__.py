@@ -1,23 +1,28 @@
 import csv
 import datetime
 import importlib
+import os
 import sys
-from abc import abstractmethod
+import weakref
+from abc import ABC, abstractmethod
 from collections import defaultdict
-from typing import Dict, List, Set
+from collections.abc import Mapping
+from typing import Dict, List, Set, Tuple
 
 import numpy as np
 import pandas as pd
 from dateutil import relativedelta as rdelta
 
 import logging
-from functools import partial
+from functools import partial, lru_cache
 
-from xlrd import xldate_as_tuple
 import calendar
+from contextlib import nullcontext
 from scipy.interpolate import interp1d
 import json
 
+from excel_helper import events
+
 __author__ = 'schien'
 
 import pkg_resources  # part of setuptools
@@ -28,7 +33,7 @@ param_name_map_v1 = {'variable': 'name', 'scenario': 'source_scenarios_string',
                      'distribution': 'distribution_name', 'param 1': 'param_a', 'param 2': 'param_b',
                      'param 3': 'param_c',
                      'unit': '', 'CAGR': 'cagr', 'ref date': 'ref_date', 'label': '', 'tags': '', 'comment': '',
-                     'source': ''}
+                     'source': '', 'expression': ''}
 
 param_name_map_v2 = {'CAGR': 'cagr',
                      'comment': '',
@@ -44,13 +49,17 @@ param_name_map_v2 = {'CAGR': 'cagr',
                      'unit': '',
                      'variability growth': 'ef_growth_factor',
                      'initial_value_proportional_variation': '',
-                     'variable': 'name'}
+                     'variable': 'name',
+                     'expression': ''}
 
 param_name_maps = {1: param_name_map_v1, 2: param_name_map_v2}
 
 # logger.basicConfig(level=logger.DEBUG)
 logger = logging.getLogger(__name__)
 
+# the stage of sampling without a profiler
+_no_profiling = nullcontext()
+
 
 class DistributionFunctionGenerator(object):
     module: str
@@ -60,7 +69,8 @@ class DistributionFunctionGenerator(object):
     param_c: str
 
     def __init__(self, module_name=None, distribution_name=None, param_a: float = None,
-                 param_b: float = None, param_c: float = None, size=None, **kwargs):
+                 param_b: float = None, param_c: float = None, size=None, random_state=None, profiler=None,
+                 **kwargs):
         """
         Instantiate a new object.
 
@@ -70,10 +80,15 @@ class DistributionFunctionGenerator(object):
         :param param_b:
         :param param_c:
         :param size:
+        :param random_state: optional np.random.RandomState to draw numpy.random distributions from instead of the
+        global random state
+        :param profiler: optional excel_helper.profiling.SamplingProfiler that times the stages of sampling
         :param kwargs: can contain key "sample_mean_value" with bool value
         """
         self.kwargs = kwargs
         self.size = size
+        self.random_state = random_state
+        self.profiler = profiler
         self.module_name = module_name
         self.distribution_name = distribution_name
         self.sample_mean_value = kwargs.get('sample_mean_value', False)
@@ -86,7 +101,7 @@ class DistributionFunctionGenerator(object):
             else:
                 self.random_function_params = [np.array([i for i in [param_a, param_b, param_c] if i], dtype=np.float)]
 
-            logger.debug(f'setting function params for choice distribution {self.random_function_params}')
+            logger.debug('setting function params for choice distribution %s', self.random_function_params)
         else:
             self.random_function_params = [i for i in [param_a, param_b, param_c] if i not in [None, ""]]
 
@@ -122,16 +137,44 @@ class DistributionFunctionGenerator(object):
         """
         sample_size = kwargs.get('size', self.size)
 
-        f = self.instantiate_distribution_function(self.module_name, self.distribution_name)
-        distribution_function = partial(f, *self.random_function_params, size=sample_size)
+        with self.stage('lookup'):
+            distribution_function = partial(self.get_distribution_function(), *self.random_function_params,
+                                            size=sample_size)
 
-        if self.sample_mean_value:
-            sample = np.full(sample_size, self.get_mean(distribution_function))
-        else:
-            sample = distribution_function()
+        with self.stage('draw'):
+            if self.sample_mean_value:
+                sample = np.full(sample_size, self.get_mean(distribution_function))
+            else:
+                sample = distribution_function()
 
         return sample
 
+    def stage(self, name):
+        """
+        :return: a context manager that times a stage of sampling with the profiler, a no-op without a profiler
+        """
+        if self.profiler is None:
+            return _no_profiling
+        return self.profiler.stage(name)
+
+    def get_distribution_function(self):
+        if self.random_state is not None and self.module_name == 'numpy.random':
+            return getattr(self.random_state, self.distribution_name)
+        return self.instantiate_distribution_function(self.module_name, self.distribution_name)
+
+    def skip(self, size, chunk_size=2 ** 20):
+        """
+        Advance the random state past `size` draws without keeping the values.
+
+        :param size: number of draws to skip
+        :param chunk_size: maximum number of draws held in memory at once
+        """
+        if self.sample_mean_value:
+            return
+        f = self.get_distribution_function()
+        for offset in range(0, size, chunk_size):
+            f(*self.random_function_params, size=min(chunk_size, size - offset))
+
     @staticmethod
     def instantiate_distribution_function(module_name, distribution_name):
         module = importlib.import_module(module_name)
@@ -139,10 +182,57 @@ class DistributionFunctionGenerator(object):
         return func
 
 
+class DefinitionRecord(Mapping):
+    """
+    A read-only mapping of the columns of a parameter definition row.
+
+    Rows with the same columns share a single schema (the column names and their positions), each record only holds
+    a tuple of values. Short string values are interned, so repeated values such as module and distribution names are
+    stored once.
+    """
+    __slots__ = ('_schema', '_values')
+
+    # {column names: (column names, {column name: position})}
+    _schemas = {}
+
+    def __init__(self, columns: Dict = None):
+        columns = columns if columns is not None else {}
+        keys = tuple(columns)
+        schema = DefinitionRecord._schemas.get(keys)
+        if schema is None:
+            schema = DefinitionRecord._schemas.setdefault(keys, (keys, {key: i for i, key in enumerate(keys)}))
+        self._schema = schema
+        self._values = tuple(sys.intern(v) if isinstance(v, str) and len(v) <= 64 else v for v in columns.values())
+
+    def __getitem__(self, key):
+        return self._values[self._schema[1][key]]
+
+    def __iter__(self):
+        return iter(self._schema[0])
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._schema[1]
+
+    def __repr__(self):
+        return f'DefinitionRecord({dict(self)!r})'
+
+    def __reduce__(self):
+        return DefinitionRecord, (dict(self),)
+
+
 class Parameter(object):
     """
     A single parameter
+
+    Parameters are slotted objects. The remaining columns of the definition row are kept in `kwargs` as a read-only
+    `DefinitionRecord`, and `processes` is only allocated when a usage is recorded.
     """
+    __slots__ = ('version', 'name', 'unit', 'comment', 'source', 'scenario', 'source_scenarios_string', 'tags',
+                 'cache', '_processes', '_kwargs')
+
     version: int
 
     name: str
@@ -164,19 +254,37 @@ class Parameter(object):
         self.source = source
         self.comment = comment
 
-        self.unit = unit
+        self.unit = sys.intern(unit) if isinstance(unit, str) else unit
         self.source_scenarios_string = source_scenarios_string
-        self.tags = tags
+        self.tags = sys.intern(tags) if isinstance(tags, str) else tags
         self.name = name
 
         self.scenario = None
         self.cache = None
 
         # track the usages of this parameter per process as a list of process-specific variable names that are backed by this parameter
-        self.processes = defaultdict(list)
+        self._processes = None
 
         self.kwargs = kwargs
 
+    @property
+    def kwargs(self) -> DefinitionRecord:
+        return self._kwargs
+
+    @kwargs.setter
+    def kwargs(self, columns):
+        self._kwargs = columns if isinstance(columns, DefinitionRecord) else DefinitionRecord(columns)
+
+    @property
+    def processes(self) -> Dict[str, List]:
+        if self._processes is None:
+            self._processes = defaultdict(list)
+        return self._processes
+
+    @processes.setter
+    def processes(self, processes):
+        self._processes = processes
+
     def __call__(self, settings=None, *args, **kwargs):
         """
         Samples from a parameter. Values are cached and returns the same value every time called.
@@ -184,35 +292,68 @@ class Parameter(object):
         @todo confusing interface that accepts 'settings' and kwargs  at the same time.
         worse- 'use_time_series' must be present in the settings dict
 
+        A 'profiler' in the settings (excel_helper.profiling.SamplingProfiler) records the time of the call and its
+        stages. A 'memory_budget' (excel_helper.memory.MemoryBudget) enforces a soft limit on the memory of the caches.
+
         :param args:
         :param kwargs:
         :return:
         """
         if self.cache is None:
-            kwargs['name'] = self.name
-            kwargs['unit'] = self.unit
-            kwargs['tags'] = self.tags
-            kwargs['scenario'] = self.scenario
+            if self.kwargs.get('expression'):
+                raise ValueError(f'{self.name} is derived from the expression "{self.kwargs["expression"]}". '
+                                 f'Evaluate it with excel_helper.expressions.ExpressionGraph')
+            kwargs.update(self.value_kwargs())
 
             if not settings:
                 settings = {}
 
-            common_args = {'size': settings.get('sample_size', 1),
-                           'sample_mean_value': settings.get('sample_mean_value', False)}
-            common_args.update(**self.kwargs)
-
-            if settings.get('use_time_series', False):
-                if self.version == 2:
-                    generator = GrowthTimeSeriesGenerator(**common_args, times=settings['times'])
-                else:
-                    generator = ConstantUncertaintyExponentialGrowthTimeSeriesGenerator(**common_args,
-                                                                                        times=settings['times'])
+            profiler = settings.get('profiler')
+            if profiler is None:
+                self.cache = self.create_generator(settings).generate_values(*args, **kwargs)
             else:
-                generator = DistributionFunctionGenerator(**common_args)
+                with profiler.parameter(self):
+                    self.cache = self.create_generator(settings).generate_values(*args, **kwargs)
 
-            self.cache = generator.generate_values(*args, **kwargs)
+            budget = settings.get('memory_budget')
+            if budget is not None:
+                budget.track(self)
         return self.cache
 
+    def value_kwargs(self):
+        """
+        The attributes of this parameter that generators attach to the values they return.
+        """
+        return {'name': self.name, 'unit': self.unit, 'tags': self.tags, 'scenario': self.scenario}
+
+    def create_generator(self, settings, times=None, **generator_args):
+        """
+        Instantiate the generator that samples this parameter for the given settings.
+
+        :param settings: the settings dict as passed to __call__
+        :param times: overrides the time axis from the settings
+        :param generator_args: additional args for the generator, e.g. a random_state
+        :return: a DistributionFunctionGenerator
+        """
+        common_args = {'size': settings.get('sample_size', 1),
+                       'sample_mean_value': settings.get('sample_mean_value', False),
+                       'profiler': settings.get('profiler')}
+        common_args.update(**self.kwargs)
+        common_args.update(**generator_args)
+
+        if settings.get('use_time_series', False):
+            common_args['layout'] = settings.get('layout', 'long')
+            if times is None:
+                times = settings['times']
+                if settings.get('time_resolution'):
+                    times = coarsen_times(times, settings['time_resolution'])
+
+            if self.version == 2:
+                return GrowthTimeSeriesGenerator(**common_args, times=times)
+            return ConstantUncertaintyExponentialGrowthTimeSeriesGenerator(**common_args, times=times)
+
+        return DistributionFunctionGenerator(**common_args)
+
     def add_usage(self, process_name, variable_name):
         # add the name of a variable of a process model that is backed by this parameter
         self.processes[process_name].append(variable_name)
@@ -228,16 +369,16 @@ class GrowthTimeSeriesGenerator(DistributionFunctionGenerator):
     # error function growth rate
     ef_growth_factor: str
 
-    def __init__(self, times=None, size=None, index_names=None, ref_date=None, *args, **kwargs):
+    def __init__(self, times=None, size=None, index_names=None, ref_date=None, layout='long', *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.ref_date = ref_date if ref_date else None
 
         self.times = times
         self.size = size
-        iterables = [times, range(0, size)]
-        self._multi_index = pd.MultiIndex.from_product(iterables, names=index_names)
-        assert type(times.freq) == pd.tseries.offsets.MonthBegin, 'Time index must have monthly frequency'
+        self.layout = layout
+        self.months_per_step = months_per_step(times)
+        assert self.months_per_step, 'Time index must have monthly, quarterly or annual frequency'
 
     def generate_values(self, *args, **kwargs):
         """
@@ -254,7 +395,8 @@ class GrowthTimeSeriesGenerator(DistributionFunctionGenerator):
         if not ref_date:
             raise Exception(f"Ref date not set for variable {kwargs['name']}")
 
-        mu = self.generate_mu(end_date, ref_date, start_date)
+        with self.stage('growth'):
+            mu = self.generate_mu(end_date, ref_date, start_date)
 
         # 3. Generate $\sigma$
         ## Prepare array with growth values $\sigma$
@@ -273,44 +415,54 @@ class GrowthTimeSeriesGenerator(DistributionFunctionGenerator):
                 intial_value = float(self.kwargs['ref value'])
 
             variability_ = intial_value * self.kwargs['initial_value_proportional_variation']
-            logger.debug(f'sampling random distribution with parameters -{variability_}, 0, {variability_}')
-            sigma = np.random.triangular(-1 * variability_, 0, variability_, (len(self.times), self.size))
+            logger.debug('sampling random distribution with parameters -%s, 0, %s', variability_, variability_)
+            random_state = self.random_state if self.random_state is not None else np.random
+            with self.stage('draw'):
+                sigma = random_state.triangular(-1 * variability_, 0, variability_, (len(self.times), self.size))
         # logger.debug(ref_date.strftime("%b %d %Y"))
 
         ## 4. Prepare growth array for $\alpha_{sigma}$
-        alpha_sigma = growth_coefficients(start_date,
-                                          end_date,
-                                          ref_date,
-                                          self.kwargs['ef_growth_factor'], 1)
-
-        ### 5. Prepare DataFrame
-        iterables = [self.times, range(self.size)]
-        index_names = ['time', 'samples']
-        _multi_index = pd.MultiIndex.from_product(iterables, names=index_names)
+        with self.stage('growth'):
+            alpha_sigma = growth_coefficients(start_date,
+                                              end_date,
+                                              ref_date,
+                                              self.kwargs['ef_growth_factor'], 1, self.months_per_step)
 
         # logger.debug(start_date)
         # logger.debug(end_date)
-        from dateutil import relativedelta
-        r = relativedelta.relativedelta(end_date, start_date)
-        months = r.years * 12 + r.months + 1
+        steps = len(self.times)
         name = kwargs['name']
         ## Apply growth to $\sigma$ and add $\sigma$ to $\mu$
         # logger.debug(sigma.size)
         # logger.debug(alpha_sigma.shape)
         # logger.debug(months)
-        unit_ = kwargs["unit"]
-        if not unit_:
-            unit_ = 'dimensionless'
+        with self.stage('growth'):
+            values = (sigma * alpha_sigma) + mu.reshape(steps, 1)
 
-        series = pd.Series(((sigma * alpha_sigma) + mu.reshape(months, 1)).ravel(), index=_multi_index,
-                           dtype=f'pint[{unit_}]')
+        ## test if values has sub-zero values
+        with self.stage('negative_check'):
+            negative_steps = (values < 0).any(axis=1)
+            if negative_steps.any():
+                events.emit(events.negative_values,
+                            lambda: {'name': name, 'scenario': kwargs.get('scenario'),
+                                     'time': self.times[negative_steps.argmax()], 'steps': int(negative_steps.sum())})
 
-        ## test if df has sub-zero values
-        df_sigma__dropna = series.where(series < 0).dropna()
-        if not df_sigma__dropna.pint.m.empty:
-            logger.warning(f"Negative values for parameter {name} from {df_sigma__dropna.index[0][0]}")
+        ### 5. Prepare DataFrame
+        with self.stage('wrap'):
+            return time_series_values(values, self.times, kwargs["unit"], self.layout,
+                                      index_names=['time', 'samples'])
 
-        return series
+    def skip(self, steps, chunk_size=2 ** 20):
+        """
+        Advance the random state past the draws of `steps` time steps without computing values.
+        The spread of the triangular distribution does not change the number of draws.
+        """
+        if self.sample_mean_value:
+            return
+        random_state = self.random_state if self.random_state is not None else np.random
+        chunk_steps = max(1, chunk_size // self.size)
+        for offset in range(0, steps, chunk_steps):
+            random_state.triangular(-1, 0, 1, (min(chunk_steps, steps - offset), self.size))
 
     def generate_mu(self, end_date, ref_date, start_date):
 
@@ -320,7 +472,7 @@ class GrowthTimeSeriesGenerator(DistributionFunctionGenerator):
             alpha_mu = growth_coefficients(start_date,
                                            end_date,
                                            ref_date,
-                                           self.kwargs['growth_factor'], 1)
+                                           self.kwargs['growth_factor'], 1, self.months_per_step)
             mu = mu_bar * alpha_mu.ravel()
             mu = mu.reshape(len(self.times), 1)
             return mu
@@ -344,7 +496,8 @@ class ConstantUncertaintyExponentialGrowthTimeSeriesGenerator(DistributionFuncti
     cagr: str
     ref_date: str
 
-    def __init__(self, cagr=None, times=None, size=None, index_names=None, ref_date=None, *args, **kwargs):
+    def __init__(self, cagr=None, times=None, size=None, index_names=None, ref_date=None, layout='long', *args,
+                 **kwargs):
         super().__init__(*args, **kwargs)
         self.cagr = cagr if cagr else 0
 
@@ -352,9 +505,10 @@ class ConstantUncertaintyExponentialGrowthTimeSeriesGenerator(DistributionFuncti
 
         self.times = times
         self.size = size
-        iterables = [times, range(0, size)]
-        self._multi_index = pd.MultiIndex.from_product(iterables, names=index_names)
-        assert type(times.freq) == pd.tseries.offsets.MonthBegin, 'Time index must have monthly frequency'
+        self.index_names = index_names
+        self.layout = layout
+        self.months_per_step = months_per_step(times)
+        assert self.months_per_step, 'Time index must have monthly, quarterly or annual frequency'
 
     def generate_values(self, *args, **kwargs):
         """
@@ -373,27 +527,33 @@ class ConstantUncertaintyExponentialGrowthTimeSeriesGenerator(DistributionFuncti
         start_date = self.times[0].to_pydatetime()
         end_date = self.times[-1].to_pydatetime()
 
-        a = growth_coefficients(start_date, end_date, ref_date, alpha, self.size)
+        with self.stage('growth'):
+            a = growth_coefficients(start_date, end_date, ref_date, alpha, self.size, self.months_per_step)
 
-        values *= a.ravel()
+            values *= a.ravel()
 
-        # df = pd.DataFrame(values)
-        # df.columns = [kwargs['name']]
-        # df.set_index(self._multi_index, inplace=True)
-        # # @todo this is a hack to return a series with index as I don't know how to set an index and rename a series
-        # data_series = df.iloc[:, 0]
-        # data_series._metadata = kwargs
-        # data_series.index.rename(['time', 'samples'], inplace=True)
-        #
-        if not kwargs["unit"]:
-            series = pd.Series(values, index=self._multi_index, dtype='pint[dimensionless]')
-        else:
-            series = pd.Series(values, index=self._multi_index, dtype=f'pint[{kwargs["unit"]}]')
+        with self.stage('wrap'):
+            return time_series_values(values.reshape(len(self.times), self.size), self.times, kwargs["unit"],
+                                      self.layout, index_names=self.index_names)
 
-        return series
+    def skip(self, steps, chunk_size=2 ** 20):
+        """
+        Advance the random state past the draws of `steps` time steps without computing values.
+        """
+        super().skip(steps * self.size, chunk_size=chunk_size)
 
 
-def growth_coefficients(start_date, end_date, ref_date, alpha, samples):
+def month_delta(later, earlier) -> int:
+    """
+    Number of whole months from `earlier` to `later`. Negative if `later` is before `earlier`.
+    """
+    if later < earlier:
+        return -month_delta(earlier, later)
+    delta = rdelta.relativedelta(later, earlier)
+    return delta.months + 12 * delta.years
+
+
+def growth_coefficients(start_date, end_date, ref_date, alpha, samples, months_per_step=1):
     """
     Build a matrix of growth factors according to the CAGR formula  y'=y0 (1+a)^(t'-t0).
 
@@ -403,40 +563,369 @@ def growth_coefficients(start_date, end_date, ref_date, alpha, samples):
     y' output
     y0 start value
 
+    The time axis runs from start to end date in steps of `months_per_step` months (1 - monthly, 3 - quarterly,
+    12 - annual). The exponent of every step is its distance to the ref date in years, so that annual and quarterly
+    axes carry the same growth as the monthly axis at the dates they share.
+
+    :return: array of shape (steps, samples)
+    """
+    # the ref point has offset 0, dates before it are discounted with (1 - a), dates after it grow with (1 + a)
+    steps = month_delta(end_date, start_date) // months_per_step + 1
+    offsets = np.arange(steps) * months_per_step - month_delta(ref_date, start_date)
+
+    exponents = np.abs(offsets) / 12
+    coefficients = np.where(offsets > 0, np.power(1 + alpha, exponents), np.power(1 - alpha, exponents))
+
+    return np.repeat(coefficients.reshape(steps, 1), samples, axis=1)
+
+
+time_resolutions = {'monthly': 1, 'quarterly': 3, 'annual': 12}
+
+
+def months_per_step(times):
+    """
+    Number of months between two steps of a time index with month, quarter or year start frequency
+    (e.g. 'MS', 'QS', 'AS' or multiples such as '3MS').
+
+    :param times: a pd.DatetimeIndex
+    :return: the step length in months or None if the frequency is not supported
+    """
+    freq = times.freq
+    for offset, months in [(pd.tseries.offsets.MonthBegin, 1),
+                           (pd.tseries.offsets.QuarterBegin, 3),
+                           (pd.tseries.offsets.YearBegin, 12)]:
+        if isinstance(freq, offset):
+            return months * freq.n
+    return None
+
+
+def coarsen_times(times, resolution):
+    """
+    Aggregate a time index to a coarser resolution. The coarse axis starts at the first date of `times` and steps by
+    the number of months of the resolution, so that every step falls on a date of the original index.
+
+    Generating values on the coarse axis is cheaper in proportion to the number of steps dropped.
+
+    :param times: a pd.DatetimeIndex with month, quarter or year start frequency
+    :param resolution: one of 'monthly', 'quarterly', 'annual'
+    :return: a pd.DatetimeIndex
+    """
+    step_months = time_resolutions[resolution]
+    source_months = months_per_step(times)
+    assert source_months, 'Time index must have monthly, quarterly or annual frequency'
+    if step_months % source_months:
+        raise ValueError(f'Cannot aggregate a time index with {source_months} month steps to {resolution} resolution')
+
+    step = step_months // source_months
+    return pd.date_range(times[0], periods=(len(times) - 1) // step + 1, freq=f'{step_months}MS')
+
+
+def time_series_values(values, times, unit, layout='long', index_names=None):
+    """
+    Wrap a matrix of time series values in the requested layout.
+
+    :param values: array of shape (steps, samples)
+    :param times: the time index of the steps
+    :param unit: the unit of the values, None for dimensionless values
+    :param layout: 'long' - a pint series with a (time, samples) MultiIndex.
+        'wide' - a DataFrame with the time index and one column per sample. It shares memory with `values`, so
+        `to_numpy()` returns the C-contiguous matrix and reductions over samples are single numpy calls. The unit is
+        kept in `DataFrame.attrs['unit']`.
+    :param index_names: names of the levels of the MultiIndex of the long layout
+    :return: a pd.Series or a pd.DataFrame
+    """
+    unit = unit if unit else 'dimensionless'
+
+    if layout == 'wide':
+        df = pd.DataFrame(values, index=times, copy=False)
+        df.index.name = 'time'
+        df.columns.name = 'samples'
+        df.attrs['unit'] = unit
+        return df
+
+    if layout != 'long':
+        raise ValueError(f'Unknown time series layout {layout}')
+
+    multi_index = pd.MultiIndex.from_product([times, range(values.shape[1])], names=index_names)
+    return pd.Series(values.ravel(), index=multi_index, dtype=f'pint[{unit}]')
+
+
+class LazyTimeSeriesParameter(object):
+    """
+    A time series parameter that is only evaluated for the windows of the time axis that are requested.
+
+    The values of a window are identical to the values for the same dates of a full evaluation
+    (`Parameter.__call__` with the same settings) that starts from the same random state.
+
+    Computed windows are cached. The random state at the end of every computed window is kept as a checkpoint, so that
+    a later window only skips the draws between the nearest checkpoint and its first date.
+
+    Only draws of numpy.random distributions go through the checkpointed random state. Version 1 parameters with
+    distributions of other modules draw from streams that cannot be checkpointed and raise a ValueError.
+
+    Usage:
+
+        np.random.seed(123)
+        lazy = LazyTimeSeriesParameter(repository['a'], settings)
+        next_two_years = lazy['2020-01-01':'2021-12-01']
+
+    """
+    parameter: Parameter
+    times: pd.DatetimeIndex
+
+    def __init__(self, parameter: Parameter, settings, random_state: np.random.RandomState = None):
+        """
+        :param parameter: the parameter to evaluate
+        :param settings: as for `Parameter.__call__`, 'use_time_series' is implied
+        :param random_state: the random stream of the full evaluation. Defaults to the global numpy random state at
+        the time of instantiation.
+        :raises ValueError: for a version 1 parameter with a distribution of another module than numpy.random
+        """
+        module_name = parameter.kwargs.get('module_name')
+        if parameter.version != 2 and module_name != 'numpy.random':
+            raise ValueError(f'Parameter {parameter.name} draws from {module_name}, only numpy.random distributions '
+                             f'can be evaluated lazily')
+        self.parameter = parameter
+        self.settings = dict(settings, use_time_series=True)
+        self.size = self.settings.get('sample_size', 1)
+
+        times = settings['times']
+        if settings.get('time_resolution'):
+            times = coarsen_times(times, settings['time_resolution'])
+        self.times = times
+
+        state = random_state.get_state() if random_state is not None else np.random.get_state()
+        # the random state at the start of a time step, by step index
+        self._checkpoints = {0: state}
+        # computed values by (first step, last step)
+        self._windows = {}
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return self.window(item.start, item.stop)
+        return self.window(item, item)
+
+    def window(self, start=None, end=None) -> pd.Series:
+        """
+        Values for all dates of the time axis from start to end (inclusive).
+
+        :param start: first date, defaults to the start of the time axis
+        :param end: last date, defaults to the end of the time axis
+        :return: values in the layout of the settings
+        """
+        first = 0 if start is None else int(self.times.searchsorted(pd.Timestamp(start)))
+        last = len(self.times) - 1 if end is None else int(
+            self.times.searchsorted(pd.Timestamp(end), side='right')) - 1
+        if first > last:
+            raise KeyError(f'No dates between {start} and {end} in time axis of parameter {self.parameter.name}')
+
+        # rows per time step
+        rows = 1 if self.settings.get('layout') == 'wide' else self.size
+        for (cached_first, cached_last), values in self._windows.items():
+            if cached_first <= first and last <= cached_last:
+                return values.iloc[(first - cached_first) * rows:(last - cached_first + 1) * rows]
+
+        checkpoint = max(step for step in self._checkpoints if step <= first)
+        random_state = np.random.RandomState()
+        random_state.set_state(self._checkpoints[checkpoint])
+
+        generator_args = {'random_state': random_state}
+        if self.parameter.version != 2 and not self.parameter.kwargs.get('ref_date'):
+            # without ref date, a full evaluation grows from the start of the whole time axis
+            generator_args['ref_date'] = self.times[0].to_pydatetime()
+
+        generator = self.parameter.create_generator(self.settings, times=self.times[first:last + 1],
+                                                    **generator_args)
+        generator.skip(first - checkpoint)
+        values = generator.generate_values(**self.parameter.value_kwargs())
+
+        self._checkpoints[last + 1] = random_state.get_state()
+        self._windows[(first, last)] = values
+        return values
+
+
+class TagQuery(ABC):
+    """
+    A boolean query over the tags of parameters. Queries are combined with `&` (and), `|` (or) and `~` (not).
+
+    Usage:
+
+        repository.find_by_tag(Tag('UD') & (Tag('TV') | ~Tag('legacy')))
+    """
+
+    def __and__(self, other):
+        return TagExpression('and', [self, tag_query(other)])
+
+    def __or__(self, other):
+        return TagExpression('or', [self, tag_query(other)])
+
+    def __invert__(self):
+        return TagExpression('not', [self])
+
+    @abstractmethod
+    def bitset(self, index: 'TagIndex') -> int:
+        """
+        :return: the set of the ids of all matching parameters, as an int with bit i set for parameter id i
+        """
+
+    @abstractmethod
+    def matches(self, tags: Set[str]) -> bool:
+        """
+        :return: whether a parameter with these tags matches the query
+        """
+
+
+class Tag(TagQuery):
+    def __init__(self, name: str):
+        self.name = name.strip()
+
+    def bitset(self, index: 'TagIndex') -> int:
+        return index.bitsets.get(self.name, 0)
+
+    def matches(self, tags: Set[str]) -> bool:
+        return self.name in tags
+
+    def __repr__(self):
+        return f'Tag({self.name!r})'
+
+
+class TagExpression(TagQuery):
+    def __init__(self, operator: str, operands: List[TagQuery]):
+        self.operator = operator
+        self.operands = operands
+
+    def bitset(self, index: 'TagIndex') -> int:
+        bitsets = [operand.bitset(index) for operand in self.operands]
+        if self.operator == 'not':
+            return index.live & ~bitsets[0]
+        if self.operator == 'and':
+            return bitsets[0] & bitsets[1]
+        return bitsets[0] | bitsets[1]
+
+    def matches(self, tags: Set[str]) -> bool:
+        if self.operator == 'not':
+            return not self.operands[0].matches(tags)
+        if self.operator == 'and':
+            return self.operands[0].matches(tags) and self.operands[1].matches(tags)
+        return self.operands[0].matches(tags) or self.operands[1].matches(tags)
+
+    def __repr__(self):
+        if self.operator == 'not':
+            return f'~{self.operands[0]!r}'
+        return f'({self.operands[0]!r} {"&" if self.operator == "and" else "|"} {self.operands[1]!r})'
+
+
+def tag_query(query) -> TagQuery:
     """
+    :param query: a TagQuery or the name of a single tag
+    """
+    return query if isinstance(query, TagQuery) else Tag(query)
 
-    start_offset = 0
-    if ref_date < start_date:
-        offset_delta = rdelta.relativedelta(start_date, ref_date)
-        start_offset = offset_delta.months + 12 * offset_delta.years
-        start_date = ref_date
 
-    end_offset = 0
-    if ref_date > end_date:
-        offset_delta = rdelta.relativedelta(ref_date, end_date)
-        end_offset = offset_delta.months + 12 * offset_delta.years
-        end_date = ref_date
+class TagIndex(object):
+    """
+    Index of parameter tags. Each indexed parameter gets an integer id, and each tag maps to a bitset (a python int)
+    of the ids of its parameters, so compound queries are evaluated with integer bit operations.
 
-    delta_ar = rdelta.relativedelta(ref_date, start_date)
-    ar = delta_ar.months + 12 * delta_ar.years
-    delta_br = rdelta.relativedelta(end_date, ref_date)
-    br = delta_br.months + 12 * delta_br.years
+    Removed parameters leave holes in the ids. When there are more than `max_holes` holes and more holes than indexed
+    parameters, the ids are renumbered in the order the parameters were indexed.
+    """
+    parameters: List[Parameter]
+    bitsets: Dict[str, int]
 
-    # we place the ref point on the lower interval (delta_ar + 1) but let it start from 0
-    # in turn we let the upper interval start from 1
-    g = np.fromfunction(lambda i, j: np.power(1 - alpha, np.abs(i) / 12), (ar + 1, samples), dtype=float)
-    h = np.fromfunction(lambda i, j: np.power(1 + alpha, np.abs(i + 1) / 12), (br, samples), dtype=float)
-    g = np.flipud(g)
+    "the bitset of all indexed parameters"
+    live: int
 
-    # now join the two arrays
-    a = np.vstack((g, h))
+    "the number of removed ids that are kept before the index is compacted"
+    max_holes = 64
+
+    def __init__(self):
+        # parameters by id, None for removed parameters
+        self.parameters = []
+        self.bitsets = {}
+        self.live = 0
+        self._ids = {}
+        # the tags of the parameters at the time they were indexed
+        self._tags = []
+
+    def add(self, parameter: Parameter):
+        if id(parameter) in self._ids:
+            self.remove(parameter)
+        parameter_id = len(self.parameters)
+        self.parameters.append(parameter)
+        self._tags.append(self.parse_tags(parameter.tags))
+        self._ids[id(parameter)] = parameter_id
+        bit = 1 << parameter_id
+        self.live |= bit
+        for tag in self._tags[parameter_id]:
+            self.bitsets[tag] = self.bitsets.get(tag, 0) | bit
+
+    def remove(self, parameter: Parameter):
+        parameter_id = self._ids.pop(id(parameter), None)
+        if parameter_id is None:
+            return
+        self.parameters[parameter_id] = None
+        mask = ~(1 << parameter_id)
+        self.live &= mask
+        for tag in self._tags[parameter_id]:
+            self.bitsets[tag] &= mask
+            if not self.bitsets[tag]:
+                del self.bitsets[tag]
+        self._tags[parameter_id] = []
+        holes = len(self.parameters) - len(self._ids)
+        if holes > self.max_holes and holes > len(self._ids):
+            self.compact()
+
+    def compact(self):
+        """
+        Renumber the indexed parameters without the ids of removed parameters.
+        """
+        kept = [i for i, parameter in enumerate(self.parameters) if parameter is not None]
+        self.parameters = [self.parameters[i] for i in kept]
+        self._tags = [self._tags[i] for i in kept]
+        self._ids = {id(p): i for i, p in enumerate(self.parameters)}
+        self.live = (1 << len(self.parameters)) - 1
+        self.bitsets = {}
+        for parameter_id, tags in enumerate(self._tags):
+            bit = 1 << parameter_id
+            for tag in tags:
+                self.bitsets[tag] = self.bitsets.get(tag, 0) | bit
+
+    def find(self, query) -> List[Parameter]:
+        """
+        :param query: a TagQuery or the name of a single tag
+        :return: the matching parameters in the order they were indexed
+        """
+        bitset = tag_query(query).bitset(self)
+        if not bitset:
+            return []
+        bits = np.unpackbits(np.frombuffer(bitset.to_bytes((bitset.bit_length() + 7) // 8, 'little'), np.uint8),
+                             bitorder='little')
+        return [self.parameters[i] for i in np.flatnonzero(bits)]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # ids are object addresses, they are rebuilt on unpickling
+        del state['_ids']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._ids = {id(p): i for i, p in enumerate(self.parameters) if p is not None}
+
+    def indexed_tags(self, parameter: Parameter) -> List[str]:
+        """
+        :return: the tags of a parameter at the time it was indexed
+        """
+        parameter_id = self._ids.get(id(parameter))
+        return self._tags[parameter_id] if parameter_id is not None else []
 
-    if start_offset > 0:
-        a = a[start_offset:]
-    if end_offset > 0:
-        a = a[:-end_offset]
+    def tag_names(self) -> List[str]:
+        return sorted(self.bitsets)
 
-    return a
+    @staticmethod
+    def parse_tags(tags) -> List[str]:
+        return [i.strip() for i in tags.split(',')] if tags else []
 
 
 class ParameterScenarioSet(object):
@@ -469,6 +958,35 @@ class ParameterScenarioSet(object):
         return self.scenarios.__setitem__(key, value)
 
 
+# attributes of scenario variants that are populated from the default parameter when empty
+inherited_attributes = ['unit', 'label', 'comment', 'source', 'tags']
+
+
+class ScenarioView(dict):
+    """
+    A read-only dict of {param name: Parameter} for a scenario, with the default scenario parameter for names that have
+    no variant in the scenario. Lookups are plain dict lookups.
+
+    Views are created with `ParameterRepository.view` and kept up to date by the repository when parameters are added
+    or replaced.
+    """
+
+    def __init__(self, scenario: str):
+        super().__init__()
+        self.scenario = scenario
+
+    def _resolve(self, param_name, parameter_set: 'ParameterScenarioSet'):
+        scenarios = parameter_set.scenarios
+        parameter = scenarios.get(self.scenario, scenarios.get(ParameterScenarioSet.default_scenario))
+        if parameter is not None:
+            dict.__setitem__(self, param_name, parameter)
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('ScenarioView is read only, add parameters to the repository')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+
+
 class ParameterRepository(object):
     """
     Contains all known parameter definitions (so that it is not necessary to re-read the excel file for repeat param accesses).
@@ -479,24 +997,43 @@ class ParameterRepository(object):
 
     """
     parameter_sets: Dict[str, ParameterScenarioSet]
-    tags: Dict[str, Dict[str, Set[Parameter]]]
+    tag_index: TagIndex
+
+    "incremented on every change of the parameter definitions"
+    revision: int
 
     def __init__(self):
         self.parameter_sets = defaultdict(ParameterScenarioSet)
-        self.tags = defaultdict(lambda: defaultdict(set))
+        self.tag_index = TagIndex()
+        self.revision = 0
+        # {scenario: ScenarioView} of the views in use
+        self._views = weakref.WeakValueDictionary()
 
     def add_all(self, parameters: List[Parameter]):
+        """
+        Add parameters and populate empty fields of scenario variants from their default parameters in a single pass
+        after all parameters are added, so the order of the rows does not matter.
+        """
+        names = {}
         for p in parameters:
-            self.add_parameter(p)
+            self.add_parameter(p, resolve_defaults=False)
+            names[p.name] = None
+        self.resolve_defaults(list(names))
 
     def clear_cache(self):
         for p_sets in self.parameter_sets.values():
             for param_name, param in p_sets.scenarios.items():
                 param.cache = None
 
-    def add_parameter(self, parameter: Parameter):
+    def add_parameter(self, parameter: Parameter, resolve_defaults=True):
         """
         A parameter can have several scenarios. They are specified as a comma-separated list in a string.
+
+        Empty fields of scenario variants are populated from the default parameter of the same name, see
+        `resolve_defaults`. With `resolve_defaults=False` this is left to a later call of `resolve_defaults`.
+
+        If the parameter replaces an existing definition, it takes over the usages of the previous definition and the
+        caches of all parameters that depend on it are invalidated.
         :param parameter:
         :return:
         """
@@ -505,20 +1042,91 @@ class ParameterRepository(object):
         scenario_string = parameter.source_scenarios_string
         if scenario_string:
             _scenarios = [i.strip() for i in scenario_string.split(',')]
-            self.fill_missing_attributes_from_default_parameter(parameter)
-
         else:
             _scenarios = [ParameterScenarioSet.default_scenario]
 
+        replaced = []
         for scenario in _scenarios:
             parameter.scenario = scenario
+            previous = self.parameter_sets[parameter.name].scenarios.get(scenario)
+            if previous is not None and previous is not parameter:
+                replaced.append(previous)
             self.parameter_sets[parameter.name][scenario] = parameter
 
+        for previous in replaced:
+            for process_name, variable_names in (previous._processes or {}).items():
+                for variable_name in variable_names:
+                    if variable_name not in parameter.processes[process_name]:
+                        parameter.add_usage(process_name, variable_name)
+            if previous not in self.parameter_sets[parameter.name].scenarios.values():
+                self.tag_index.remove(previous)
+        if replaced:
+            self._invalidate_parameters(replaced)
+
+        self.revision += 1
+        for view in list(self._views.values()):
+            view._resolve(parameter.name, self.parameter_sets[parameter.name])
+
         # record all tags for this parameter
-        if parameter.tags:
-            _tags = [i.strip() for i in parameter.tags.split(',')]
-            for tag in _tags:
-                self.tags[tag][parameter.name].add(parameter)
+        self.tag_index.add(parameter)
+
+        if resolve_defaults:
+            self.resolve_defaults([parameter.name])
+
+    def dependents(self, param_name, scenario=None) -> Set[str]:
+        """
+        Names of all processes that depend on a parameter, directly or via other parameters. Dependencies are
+        tracked with `Parameter.add_usage` (e.g. by derived variables in excel_helper.expressions).
+
+        :param param_name:
+        :param scenario: the scenario variant of the parameter, all variants if None
+        :return: set of process names
+        """
+        return self._dependents(self._scenario_variants(param_name, scenario))[0]
+
+    def invalidate(self, param_name, scenario=None) -> Set[str]:
+        """
+        Clear the cache of a parameter and of all parameters that depend on it. Processes that are not parameters
+        are returned so that their results can be recomputed. Caches of unrelated parameters are kept.
+
+        :param param_name:
+        :param scenario: the scenario variant of the parameter, all variants if None
+        :return: the names of all dependent processes
+        """
+        return self._invalidate_parameters(self._scenario_variants(param_name, scenario))
+
+    def _scenario_variants(self, param_name, scenario=None) -> List[Parameter]:
+        if param_name not in self.parameter_sets:
+            raise KeyError(f"{param_name} not found")
+        if scenario is None:
+            return list(self.parameter_sets[param_name].scenarios.values())
+        return [self.get_parameter(param_name, scenario)]
+
+    def _invalidate_parameters(self, parameters: List[Parameter]) -> Set[str]:
+        process_names, dependent_parameters = self._dependents(parameters)
+        for param in parameters + dependent_parameters:
+            param.cache = None
+        return process_names
+
+    def _dependents(self, parameters: List[Parameter]):
+        process_names = set()
+        dependent_parameters = []
+        visited = {id(p) for p in parameters}
+        stack = list(parameters)
+        while stack:
+            param = stack.pop()
+            for process_name, variable_names in (param._processes or {}).items():
+                if not variable_names:
+                    continue
+                process_names.add(process_name)
+                # processes that are parameters themselves (e.g. derived variables) propagate to their dependents
+                if process_name in self.parameter_sets:
+                    for dependent in self.parameter_sets[process_name].scenarios.values():
+                        if id(dependent) not in visited:
+                            visited.add(id(dependent))
+                            dependent_parameters.append(dependent)
+                            stack.append(dependent)
+        return process_names, dependent_parameters
 
     def fill_missing_attributes_from_default_parameter(self, param):
         """
@@ -537,25 +1145,58 @@ class ParameterRepository(object):
         :param param:
         :return:
         """
-        if not self.exists(param.name) or not ParameterScenarioSet.default_scenario in self.parameter_sets[
-            param.name].scenarios.keys():
+        default = self.parameter_sets[param.name].scenarios.get(
+            ParameterScenarioSet.default_scenario) if param.name in self.parameter_sets else None
+        if default is None:
             logger.warning(
                 f'No default value for param {param.name} found.')
             return
-        default = self.parameter_sets[param.name][ParameterScenarioSet.default_scenario]
-        for att_name, att_value in default.__dict__.items():
-            if att_name in ['unit', 'label', 'comment', 'source', 'tags']:
+        self._inherit_defaults(param, default)
+
+    def resolve_defaults(self, names=None):
+        """
+        Populate empty fields of all scenario variants from the default parameter of the same name, as
+        `fill_missing_attributes_from_default_parameter`. Independent of the order in which the variants and the default
+        parameter were added.
+
+        :param names: the names of the parameters to resolve, defaults to all
+        """
+        names = names if names is not None else list(self.parameter_sets)
+        # the attributes live on the Parameter objects, so each changed variant is written one at a time
+        for name in names:
+            scenarios = self.parameter_sets[name].scenarios
+            default = scenarios.get(ParameterScenarioSet.default_scenario)
+            # a variant that is defined for several scenarios is resolved once
+            variants = {id(p): p for p in scenarios.values() if p is not default}.values()
+            if default is None:
+                if variants:
+                    logger.warning('No default value for param %s found.', name)
+                continue
+            for param in variants:
+                self._inherit_defaults(param, default)
+
+    def _inherit_defaults(self, param, default):
+        for att_name in inherited_attributes:
+            if att_name == 'label':
+                # label is a definition column
+                if not param.kwargs.get('label') and default.kwargs.get('label'):
+                    param.kwargs = dict(param.kwargs, label=default.kwargs['label'])
+                continue
+
+            att_value = getattr(default, att_name)
 
-                if att_name == 'tags' and default.tags != param.tags:
-                    logger.warning(
-                        f'For param {param.name} for scenarios {param.source_scenarios_string}, tags is different from default parameter tags. Overwriting with default values.')
-                    setattr(param, att_name, att_value)
+            if att_name == 'tags' and param.tags and default.tags != param.tags:
+                logger.warning('For param %s for scenarios %s, tags is different from default parameter tags. '
+                               'Overwriting with default values.', param.name, param.source_scenarios_string)
+                setattr(param, att_name, att_value)
 
-                if not getattr(param, att_name):
-                    logger.debug(
-                        f'For param {param.name} for scenarios {param.source_scenarios_string}, populating attribute {att_name} with value {att_value} from default parameter.')
+            if not getattr(param, att_name) and att_value:
+                logger.debug('For param %s for scenarios %s, populating attribute %s with value %s from default '
+                             'parameter.', param.name, param.source_scenarios_string, att_name, att_value)
+                setattr(param, att_name, att_value)
 
-                    setattr(param, att_name, att_value)
+        if self.tag_index.indexed_tags(param) != TagIndex.parse_tags(param.tags):
+            self.tag_index.add(param)
 
     def __getitem__(self, item) -> Parameter:
         """
@@ -566,23 +1207,76 @@ class ParameterRepository(object):
         return self.get_parameter(item, scenario_name=ParameterScenarioSet.default_scenario)
 
     def get_parameter(self, param_name, scenario_name=ParameterScenarioSet.default_scenario) -> Parameter:
-        if self.exists(param_name, scenario=scenario_name):
-            return self.parameter_sets[param_name][scenario_name]
+        parameter_set = self.parameter_sets.get(param_name)
+        if parameter_set is not None:
+            scenarios = parameter_set.scenarios
+            if scenario_name in scenarios:
+                return scenarios[scenario_name]
+            if ParameterScenarioSet.default_scenario in scenarios:
+                return scenarios[ParameterScenarioSet.default_scenario]
+        raise KeyError(f"{param_name} not found")
+
+    def view(self, scenario=ParameterScenarioSet.default_scenario) -> ScenarioView:
+        """
+        A dict of all parameters resolved for a scenario as with `get_parameter`, for fast lookups in model code.
+        The view is updated when parameters are added to the repository.
 
-        try:
-            return self.parameter_sets[param_name][ParameterScenarioSet.default_scenario]
-        except KeyError:
-            raise KeyError(f"{param_name} not found")
+        Usage:
+
+            params = repository.view('s1')
+            for i in range(iterations):
+                params['a'](settings)
+
+        :param scenario:
+        :return: a ScenarioView, shared by all callers for the same scenario
+        """
+        view = self._views.get(scenario)
+        if view is None:
+            view = ScenarioView(scenario)
+            for param_name, parameter_set in self.parameter_sets.items():
+                view._resolve(param_name, parameter_set)
+            self._views[scenario] = view
+        return view
+
+    @property
+    def tags(self) -> Dict[str, Dict[str, Set[Parameter]]]:
+        """
+        {tag: {param name: set[Parameter]}} for all tags
+        """
+        return {tag: self.find_by_tag(tag) for tag in self.tag_index.tag_names()}
 
     def find_by_tag(self, tag) -> Dict[str, Set[Parameter]]:
         """
-        Get all registered dicts that are registered for a tag
+        Get all registered dicts that are registered for a tag or a query over tags. The index is not modified by
+        queries for unknown tags.
 
-        :param tag: str - single tag
+        :param tag: str - single tag, or a TagQuery, e.g. Tag('t1') & ~Tag('t2')
         :return: a dict of {param name: set[Parameter]} that contains all ParameterScenarioSets for
         all parameter names with a given tag
         """
-        return self.tags[tag]
+        result = defaultdict(set)
+        for param in self.tag_index.find(tag):
+            result[param.name].add(param)
+        return dict(result)
+
+    def names(self, query=None) -> List[str]:
+        """
+        :param query: a tag or TagQuery, None for all parameters
+        :return: the names of the parameters with at least one scenario variant that matches the query
+        """
+        if query is None:
+            return list(self.parameter_sets)
+        return list(dict.fromkeys(param.name for param in self.tag_index.find(query)))
+
+    def select(self, query=None, scenario=ParameterScenarioSet.default_scenario) -> Dict[str, Parameter]:
+        """
+        The parameters that match a tag query, in a scenario.
+
+        :param query: a tag or TagQuery, None for all parameters
+        :param scenario: the scenario, parameters without a variant for it are returned in the default scenario
+        :return: dict of {param name: Parameter}
+        """
+        return {name: self.get_parameter(name, scenario) for name in self.names(query)}
 
     def exists(self, param, scenario=None) -> bool:
         # if scenario is not None:
@@ -594,47 +1288,282 @@ class ParameterRepository(object):
 
         return scenario in self.parameter_sets[param].scenarios.keys()
 
+    def save(self, path, include_cache=False):
+        """
+        Write the parameter definitions, and optionally the cached samples, to a versioned binary file.
+        See excel_helper.serialization.
+
+        :param path:
+        :param include_cache: also write the cached samples
+        """
+        from excel_helper.serialization import save_repository
+        save_repository(self, path, include_cache=include_cache)
+
+    @staticmethod
+    def load(path, mmap_mode='r') -> 'ParameterRepository':
+        """
+        Read a repository written with `save`. Cached samples are memory-mapped unless mmap_mode is None.
+
+        :param path:
+        :param mmap_mode: 'r', 'c' or None, see numpy.memmap
+        :return: a new ParameterRepository
+        """
+        from excel_helper.serialization import load_repository
+        return load_repository(path, mmap_mode=mmap_mode)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # views are recreated on demand
+        del state['_views']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._views = weakref.WeakValueDictionary()
+
+    def memory_usage(self):
+        """
+        :return: the bytes held by the cached samples, the definitions and the indexes, see
+            excel_helper.memory.MemoryUsage
+        """
+        from excel_helper.memory import memory_usage
+        return memory_usage(self)
+
+    def memory_budget(self, limit, policy='evict', directory=None):
+        """
+        A soft limit on the resident bytes of the caches of this repository, enforced for the parameter calls with the
+        budget as 'memory_budget' in the settings.
+
+        :param limit: bytes
+        :param policy: 'evict' to drop caches, 'spill' to move them to memory-mapped files
+        :param directory: the directory of spilled caches
+        :return: an excel_helper.memory.MemoryBudget
+        """
+        from excel_helper.memory import MemoryBudget
+        return MemoryBudget(self, limit, policy, directory)
+
+    def freeze(self):
+        """
+        An immutable columnar snapshot of all parameter definitions for vectorized queries and batched sampling.
+
+        :return: excel_helper.frozen.FrozenRepository
+        """
+        from excel_helper.frozen import FrozenRepository
+        return FrozenRepository.from_repository(self)
+
     def list_scenarios(self, param):
         if param in self.parameter_sets.keys():
             return self.parameter_sets[param].scenarios.keys()
 
 
+class DefinitionFilter(object):
+    """
+    Selects the definition rows of some parameters while a handler reads a sheet, so that the rows of other parameters
+    are skipped before they are converted to definition dicts and Parameters.
+
+    Default rows are kept for all scenarios, they are the fallback of `ParameterRepository.get_parameter`. Scenario
+    variants inherit the tags of the default row of their variable, so with a tag query a variant is kept if the default
+    row of its variable is kept, or if there is no default row and its own tags match (see `resolve`).
+
+    Usage:
+
+        loader.load_into_repo(repository, tags=Tag('UD') & ~Tag('legacy'), scenarios=['8K'])
+    """
+    names: Set[str]
+    tags: TagQuery
+    scenarios: Set[str]
+
+    def __init__(self, names=None, tags=None, scenarios=None):
+        """
+        :param names: the variable names to load, defaults to all
+        :param tags: a TagQuery or the name of a single tag, defaults to all
+        :param scenarios: the scenarios to load in addition to the default scenario, defaults to all
+        """
+        self.names = set(names) if names is not None else None
+        self.tags = tag_query(tags) if tags is not None else None
+        self.scenarios = set(scenarios) if scenarios is not None else None
+        # {variable: kept} of the default rows that were read
+        self._defaults = {}
+
+    def accept(self, variable, scenario, tags) -> bool:
+        """
+        :return: whether to keep a row with these cell values
+        """
+        if self.names is not None and variable not in self.names:
+            return False
+        if scenario not in (None, ''):
+            if self.scenarios is None:
+                return True
+            return any(s.strip() in self.scenarios for s in str(scenario).split(','))
+        kept = self.match_tags(tags)
+        self._defaults[variable] = kept
+        return kept
+
+    def match_tags(self, tags) -> bool:
+        return self.tags is None or self.tags.matches(set(TagIndex.parse_tags(tags if isinstance(tags, str) else '')))
+
+    def resolve(self, definitions: List[Dict]) -> List[Dict]:
+        """
+        Drop the scenario variants of the default rows that were not kept, once all sheets are read.
+        """
+        if self.tags is not None:
+            definitions = [d for d in definitions if not d.get('scenario') or self._defaults.get(
+                d['variable'], self.match_tags(d.get('tags')))]
+        self._defaults = {}
+        return definitions
+
+    def accept_definition(self, definition: Dict) -> bool:
+        return self.accept(definition.get('variable'), definition.get('scenario'), definition.get('tags'))
+
+
 class ExcelHandler(object):
     version: int
 
+    "raise on the first duplicate or invalid ref date, otherwise keep the rows for excel_helper.validation"
+    strict: bool
+
+    "the (sheet, row) of each definition returned by definition_rows"
+    locations: List[Tuple[str, int]]
+
     def __init__(self):
         self.version = 1
+        self.strict = True
+        self.locations = []
 
     @abstractmethod
-    def load_definitions(self, sheet_name, filename=None):
+    def load_definitions(self, sheet_name, filename=None, row_filter: DefinitionFilter = None):
+        """
+        :param sheet_name: the sheet to read, defaults to all sheets
+        :param filename: the file to read
+        :param row_filter: selects the rows to read, defaults to all
+        :return: list of dicts of {header: cell value}
+        """
         raise NotImplementedError()
 
+    @staticmethod
+    def cell_value(value):
+        # as xlrd: empty cells are '' and numbers are floats
+        if value is None:
+            return ''
+        if type(value) is int:
+            return float(value)
+        return value
+
+    @classmethod
+    def key_cells(cls, header):
+        """
+        :return: a function that returns the (variable, scenario, tags) values of a row of a sheet with this header
+        """
+        positions = [header.index(key) if key in header else None for key in ('variable', 'scenario', 'tags')]
+
+        def cells(row):
+            return tuple(cls.cell_value(row[j]) if j is not None and j < len(row) else '' for j in positions)
+
+        return cells
+
+    def read_version(self, rows):
+        """
+        Set the definition version from the rows of a 'metadata' sheet with a ('version', value) row.
+        """
+        for row in rows:
+            if len(row) > 1 and row[0] == 'version':
+                self.version = self.cell_value(row[1])
+
+    def definition_rows(self, sheet_name, header, rows, tracking, convert_date=None,
+                        row_filter: DefinitionFilter = None) -> List[Dict]:
+        """
+        Convert the cell values of a definition sheet to definition dicts, so that all workbook handlers return the
+        same definitions. Rows without a variable and columns without a header are skipped and ref dates are truncated
+        to the first of their month.
+
+        :param sheet_name: the name of the sheet
+        :param header: the cell values of the first row
+        :param rows: iterable of the lists of cell values of the following rows
+        :param tracking: {variable: {scenario: 1}} of the rows of previous sheets, duplicates raise a ValueError
+        :param convert_date: converts numeric ref dates to datetime, numeric ref dates are errors without it
+        :param row_filter: skips the rows it does not accept before their values are read
+        :return: list of dicts of {header: cell value}, their sheets and rows are appended to `locations`
+        """
+        columns = [(i, key) for i, key in enumerate(header) if key not in (None, '')]
+        key_cells = self.key_cells(header)
+        definitions = []
+        for i, row in enumerate(rows, start=2):
+            if row_filter is not None and not row_filter.accept(*key_cells(row)):
+                continue
+            values = {key: self.cell_value(row[j]) if j < len(row) else '' for j, key in columns}
+
+            if not values['variable']:
+                continue
+
+            if 'ref date' in values and values['ref date']:
+                if isinstance(values['ref date'], float) and convert_date is not None:
+                    values['ref date'] = convert_date(values['ref date'])
+                if isinstance(values['ref date'], datetime.datetime):
+                    if values['ref date'].day != 1:
+                        events.emit(events.ref_date_truncated,
+                                    lambda variable=values['variable'], sheet=sheet_name,
+                                           ref_date=values['ref date']: {
+                                        'variable': variable, 'sheet': sheet, 'ref_date': ref_date})
+                        values['ref date'] = values['ref date'].replace(day=1)
+                elif self.strict:
+                    raise Exception(
+                        f"{values['ref date']} for variable {values['variable']} is not a date - "
+                        f"check spreadsheet value is a valid day of a month")
+            events.emit(events.row_loaded,
+                        lambda values=values, sheet=sheet_name, row=i: {
+                            'variable': values['variable'], 'sheet': sheet, 'row': row, 'values': values})
+            definitions.append(values)
+            self.locations.append((sheet_name, i))
+            scenario = values.get('scenario') if values.get('scenario') else "n/a"
+
+            if scenario in tracking[values['variable']]:
+
+                events.emit(events.duplicate_found,
+                            lambda variable=values['variable'], scenario=scenario, sheet=sheet_name: {
+                                'variable': variable, 'scenario': scenario, 'sheet': sheet})
+                if not self.strict:
+                    continue
+                raise ValueError(
+                    f"Duplicate entry for parameter "
+                    f"with name <{values['variable']}> and <{scenario}> scenario in sheet {sheet_name}")
+
+            else:
+                tracking[values['variable']][scenario] = 1
+        return definitions
+
 
 class OpenpyxlExcelHandler(ExcelHandler):
-    def load_definitions(self, sheet_name, filename=None):
+    def load_definitions(self, sheet_name, filename=None, row_filter: DefinitionFilter = None):
         definitions = []
+        _definition_tracking = defaultdict(dict)
 
         from openpyxl import load_workbook
-        wb = load_workbook(filename=filename, data_only=True)
-        _sheet_names = [sheet_name] if sheet_name else wb.sheetnames
-        for _sheet_name in _sheet_names:
-            sheet = wb.get_sheet_by_name(_sheet_name)
-            rows = list(sheet.rows)
-            header = [cell.value for cell in rows[0]]
+        wb = load_workbook(filename=filename, read_only=True, data_only=True)
+        try:
+            if 'metadata' in wb.sheetnames:
+                self.read_version(wb['metadata'].iter_rows(values_only=True))
+            else:
+                logger.info(f'could not find a sheet with name "metadata" in workbook. defaulting to v2')
 
-            if header[0] != 'variable':
-                continue
+            _sheet_names = [sheet_name] if sheet_name else wb.sheetnames
+            for _sheet_name in _sheet_names:
+                if _sheet_name == 'metadata':
+                    continue
+                rows = wb[_sheet_name].iter_rows(values_only=True)
+                header = next(rows, None)
 
-            for row in rows[1:]:
-                values = {}
-                for key, cell in zip(header, row):
-                    values[key] = cell.value
-                definitions.append(values)
+                if not header or header[0] != 'variable':
+                    continue
+
+                definitions.extend(self.definition_rows(_sheet_name, header, rows, _definition_tracking,
+                                                        row_filter=row_filter))
+        finally:
+            wb.close()
         return definitions
 
 
 class Xlsx2CsvHandler(ExcelHandler):
-    def load_definitions(self, sheet_name, filename=None):
+    def load_definitions(self, sheet_name, filename=None, row_filter: DefinitionFilter = None):
         from xlsx2csv import Xlsx2csv
         data = Xlsx2csv(filename, inmemory=True).convert(None, sheetid=0)
 
@@ -649,7 +1578,10 @@ class Xlsx2CsvHandler(ExcelHandler):
             if header[0] != 'variable':
                 continue
 
+            key_cells = self.key_cells(header)
             for row in sheet.rows:
+                if row_filter is not None and not row_filter.accept(*key_cells(row)):
+                    continue
                 values = {}
                 for key, cell in zip(header, row):
                     values[key] = cell
@@ -658,25 +1590,70 @@ class Xlsx2CsvHandler(ExcelHandler):
 
 
 class CSVHandler(ExcelHandler):
-    def load_definitions(self, sheet_name, filename=None):
-        return csv.DictReader(open(filename), delimiter=',')
+    """
+    Reads a CSV file with a header row. The version is 2 if the header has a 'type' column. Cells are converted as in
+    the workbooks: numbers in the value columns to floats and dates (day first) to datetime.
+    """
+    "columns that are kept as text"
+    text_columns = {'variable', 'scenario', 'module', 'distribution', 'unit', 'label', 'comment', 'source', 'tags',
+                    'type', 'param', 'expression'}
 
+    date_columns = {'ref date', 'start date', 'end date'}
 
-class PandasCSVHandler(ExcelHandler):
+    def load_definitions(self, sheet_name, filename=None, row_filter: DefinitionFilter = None):
+        with open(filename, newline='') as f:
+            rows = csv.reader(f, delimiter=',')
+            header = next(rows, None)
+            return self.csv_definitions(filename, header, rows, row_filter)
 
-    def load_definitions(self, sheet_name, filename=None):
-        self.version = 2
+    def csv_definitions(self, filename, header, rows, row_filter: DefinitionFilter = None) -> List[Dict]:
+        """
+        :param header: the cells of the first row
+        :param rows: iterable of the lists of cells of the following rows, as strings
+        """
+        if not header or header[0] != 'variable':
+            return []
+        self.version = 2 if 'type' in header else 1
+        converters = [self.convert_date if key in self.date_columns else
+                      self.convert_number if key not in self.text_columns else None for key in header]
 
-        import pandas as pd
-        df = pd.read_csv(filename, usecols=range(15), index_col=False, parse_dates=['ref date'],
-                         dtype={'initial_value_proportional_variation': 'float64'},
-                         dayfirst=True
-                         # date_parser=lambda x: pd.datetime.strptime(x, '%d-%m-%Y')
-                         )
-        df = df.dropna(subset=['variable', 'ref value'])
-        df.fillna("", inplace=True)
+        def cells(row):
+            return [convert(cell) if convert is not None and cell else cell
+                    for convert, cell in zip(converters, row)]
 
-        return df.to_dict(orient='records')
+        return self.definition_rows(os.path.basename(filename), header, (cells(row) for row in rows),
+                                    defaultdict(dict), row_filter=row_filter)
+
+    @staticmethod
+    def convert_number(cell):
+        try:
+            return float(cell)
+        except ValueError:
+            return cell
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def convert_date(cell):
+        # definitions share few distinct dates
+        from dateutil import parser
+        try:
+            return parser.parse(cell, dayfirst=True)
+        except (ValueError, OverflowError):
+            return cell
+
+
+class PandasCSVHandler(CSVHandler):
+    """
+    Reads a CSV file with the C parser of pandas, the definitions are the same as those of CSVHandler.
+    """
+
+    def load_definitions(self, sheet_name, filename=None, row_filter: DefinitionFilter = None):
+        import pandas as pd
+        df = pd.read_csv(filename, header=None, dtype=str, keep_default_na=False, index_col=False)
+        rows = df.fillna('').values.tolist()
+        if not rows:
+            return []
+        return self.csv_definitions(filename, rows[0], rows[1:], row_filter)
 
 
 class XLRDExcelHandler(ExcelHandler):
@@ -690,10 +1667,9 @@ class XLRDExcelHandler(ExcelHandler):
         rows = list(sheet.get_rows())
         return len(rows)
 
-    def load_definitions(self, sheet_name, filename=None):
+    def load_definitions(self, sheet_name, filename=None, row_filter: DefinitionFilter = None):
         import xlrd
         wb = xlrd.open_workbook(filename)
-        sh = None
 
         definitions = []
 
@@ -701,67 +1677,37 @@ class XLRDExcelHandler(ExcelHandler):
 
         _sheet_names = [sheet_name] if sheet_name else [sh.name for sh in wb.sheets()]
 
-        version = 1
-
-        try:
-            sheet = wb.sheet_by_name('metadata')
-            rows = list(sheet.get_rows())
-            for row in rows:
-                if row[0].value == 'version':
-                    version = row[1].value
-            self.version = version
-        except:
+        if 'metadata' in wb.sheet_names():
+            self.read_version([cell.value for cell in row] for row in wb.sheet_by_name('metadata').get_rows())
+        else:
             logger.info(f'could not find a sheet with name "metadata" in workbook. defaulting to v2')
 
+        def convert_date(value):
+            return datetime.datetime(*xlrd.xldate_as_tuple(value, wb.datemode))
+
+        def row_values(row):
+            # date cells as datetime, as the other handlers return them
+            return [convert_date(cell.value) if cell.ctype == xlrd.XL_CELL_DATE else cell.value for cell in row]
+
         for _sheet_name in _sheet_names:
             if _sheet_name == 'metadata':
                 continue
             sheet = wb.sheet_by_name(_sheet_name)
-            rows = list(sheet.get_rows())
-            header = [cell.value for cell in rows[0]]
+            if not sheet.nrows:
+                continue
+            header = sheet.row_values(0)
 
             if header[0] != 'variable':
                 continue
 
-            for i, row in enumerate(rows[1:]):
-                values = {}
-                for key, cell in zip(header, row):
-                    values[key] = cell.value
-
-                if not values['variable']:
-                    # logger.debug(f'ignoring row {i}: {row}')
-                    continue
-
-                if 'ref date' in values and values['ref date']:
-                    if isinstance(values['ref date'], float):
-                        values['ref date'] = datetime.datetime(*xldate_as_tuple(values['ref date'], wb.datemode))
-                        if values['ref date'].day != 1:
-                            logger.warning(f'ref date truncated to first of month for variable {values["variable"]}')
-                            values['ref date'] = values['ref date'].replace(day=1)
-                    else:
-                        raise Exception(
-                            f"{values['ref date']} for variable {values['variable']} is not a date - "
-                            f"check spreadsheet value is a valid day of a month")
-                logger.debug(f'values for {values["variable"]}: {values}')
-                definitions.append(values)
-                scenario = values['scenario'] if values['scenario'] else "n/a"
-
-                if scenario in _definition_tracking[values['variable']]:
-
-                    logger.error(
-                        f"Duplicate entry for parameter "
-                        f"with name <{values['variable']}> and <{scenario}> scenario in sheet {_sheet_name}")
-                    raise ValueError(
-                        f"Duplicate entry for parameter "
-                        f"with name <{values['variable']}> and <{scenario}> scenario in sheet {_sheet_name}")
-
-                else:
-                    _definition_tracking[values['variable']][scenario] = 1
+            rows = (row_values(sheet.row(i)) for i in range(1, sheet.nrows))
+            definitions.extend(self.definition_rows(_sheet_name, header, rows, _definition_tracking, convert_date,
+                                                    row_filter))
         return definitions
 
 
 class XLWingsExcelHandler(ExcelHandler):
-    def load_definitions(self, sheet_name, filename=None):
+    def load_definitions(self, sheet_name, filename=None, row_filter: DefinitionFilter = None):
         import xlwings as xw
         definitions = []
         wb = xw.Book(fullname=filename)
@@ -780,6 +1726,9 @@ class XLWingsExcelHandler(ExcelHandler):
             range = sheet.range((1, 1), (total_rows, len(header)))
             rows = range.rows
             for row in rows[1:]:
+                if row_filter is not None and not row_filter.accept_definition(
+                        {key: cell.value for key, cell in zip(header, row) if key in ('variable', 'scenario', 'tags')}):
+                    continue
                 values = {}
                 for key, cell in zip(header, row):
                     values[key] = cell.value
@@ -787,6 +1736,73 @@ class XLWingsExcelHandler(ExcelHandler):
         return definitions
 
 
+class AutoExcelHandler(ExcelHandler):
+    """
+    Reads a file with the fastest available handler for its type and falls back to the next handler if a library is
+    not installed or cannot read the file (e.g. xlrd 2 and .xlsx files). The handler that read a file is remembered
+    and tried first for the same file.
+
+    The workbook handlers return the same definitions, see `ExcelHandler.definition_rows`, and so do the CSV handlers,
+    which detect the version of a file from its header.
+    """
+    "handlers by file type, fastest first"
+    candidates = {'xls': ['xlrd'], 'xlsx': ['xlrd', 'openpyxl'], 'csv': ['csv', 'pandas']}
+
+    "{absolute file path: handler name}"
+    choices = {}
+
+    handler_name: str
+
+    def __init__(self):
+        super().__init__()
+        self.handler_name = None
+
+    @staticmethod
+    def file_type(filename) -> str:
+        with open(filename, 'rb') as f:
+            head = f.read(8)
+        if head.startswith(b'PK\x03\x04'):
+            return 'xlsx'
+        if head.startswith(b'\xd0\xcf\x11\xe0'):
+            return 'xls'
+        return 'csv'
+
+    @staticmethod
+    def unsupported(error) -> bool:
+        # the library is missing or cannot read the file, as opposed to errors in the definitions
+        return isinstance(error, ImportError) or type(error).__module__.split('.')[0] in ('xlrd', 'openpyxl',
+                                                                                          'zipfile', 'pandas')
+
+    def load_definitions(self, sheet_name, filename=None, row_filter: DefinitionFilter = None):
+        path = os.path.abspath(filename)
+        candidates = self.candidates[self.file_type(filename)]
+        if path in self.choices:
+            candidates = [self.choices[path]] + [c for c in candidates if c != self.choices[path]]
+
+        errors = []
+        for name in candidates:
+            handler = excel_handlers[name]()
+            handler.strict = self.strict
+            try:
+                definitions = handler.load_definitions(sheet_name, filename=filename, row_filter=row_filter)
+            except Exception as e:
+                if not self.unsupported(e):
+                    raise
+                logger.info('%s handler cannot read %s: %s', name, filename, e)
+                errors.append(f'{name}: {e}')
+                continue
+            self.version = handler.version
+            self.locations = handler.locations
+            self.handler_name = self.choices[path] = name
+            return definitions
+        raise ValueError(f'No handler could read {filename}: {"; ".join(errors)}')
+
+
+excel_handlers = {'xlrd': XLRDExcelHandler, 'openpyxl': OpenpyxlExcelHandler, 'xlsx2csv': Xlsx2CsvHandler,
+                  'xlwings': XLWingsExcelHandler, 'csv': CSVHandler, 'pandas': PandasCSVHandler,
+                  'auto': AutoExcelHandler}
+
+
 class ExcelParameterLoader(object):
     definition_version: int
     """Utility to populate ParameterRepository from spreadsheets.
@@ -801,28 +1817,27 @@ class ExcelParameterLoader(object):
 
        """
 
-    def __init__(self, filename, excel_handler='xlrd', **kwargs):
+    def __init__(self, filename, excel_handler='xlrd', validate=False, **kwargs):
+        """
+        :param filename: the workbook or CSV file
+        :param excel_handler: one of 'xlrd', 'openpyxl', 'xlsx2csv', 'xlwings', 'csv', 'pandas' or 'auto' to pick the
+            fastest available handler for the type of the file (see AutoExcelHandler)
+        :param validate: check the definitions before the parameters are created and raise an
+            excel_helper.validation.DefinitionError with all errors
+        """
         self.filename = filename
         self.definition_version = 2
+        self.validate = validate
 
         logger.info(f'Using {excel_handler} excel handler')
-        excel_handler_instance = None
-        if excel_handler == 'csv':
-            excel_handler_instance = CSVHandler()
-        if excel_handler == 'pandas':
-            excel_handler_instance = PandasCSVHandler()
-        if excel_handler == 'openpyxl':
-            excel_handler_instance = OpenpyxlExcelHandler()
-        if excel_handler == 'xlsx2csv':
-            excel_handler_instance = Xlsx2CsvHandler()
-        if excel_handler == 'xlwings':
-            excel_handler_instance = XLWingsExcelHandler()
-        if excel_handler == 'xlrd':
-            excel_handler_instance = XLRDExcelHandler()
-
-        self.excel_handler: ExcelHandler = excel_handler_instance
-
-    def load_parameter_definitions(self, sheet_name: str = None):
+        if excel_handler not in excel_handlers:
+            raise ValueError(f'Unknown excel handler {excel_handler}, use one of {list(excel_handlers)}')
+
+        self.excel_handler: ExcelHandler = excel_handlers[excel_handler]()
+        # with validation, duplicates and invalid ref dates are reported with all other errors
+        self.excel_handler.strict = not validate
+
+    def load_parameter_definitions(self, sheet_name: str = None, row_filter: DefinitionFilter = None):
         """
         Load variable text from rows in excel file.
         If no spreadsheet arg is given, all spreadsheets are loaded.
@@ -843,26 +1858,58 @@ class ExcelParameterLoader(object):
         ]
 
         :param sheet_name:
+        :param row_filter: selects the rows of some parameters while the rows are read, defaults to all rows
         :return: list of dicts with {header col name : cell value} pairs
         """
-        definitions = self.excel_handler.load_definitions(sheet_name, filename=self.filename)
+        self.excel_handler.locations = []
+        definitions = self.excel_handler.load_definitions(sheet_name, filename=self.filename, row_filter=row_filter)
         self.definition_version = self.excel_handler.version
+        if row_filter is not None:
+            definitions = list(definitions)
+            kept = row_filter.resolve(definitions)
+            if len(self.excel_handler.locations) == len(definitions):
+                ids = {id(d) for d in kept}
+                self.excel_handler.locations = [location for d, location in
+                                                zip(definitions, self.excel_handler.locations) if id(d) in ids]
+            definitions = kept
         return definitions
 
-    def load_into_repo(self, repository: ParameterRepository = None, sheet_name: str = None):
+    def load_into_repo(self, repository: ParameterRepository = None, sheet_name: str = None, names=None, tags=None,
+                       scenarios=None):
         """
         Create a Repo from an excel file.
+        The filters are applied while the rows are read, the rows of other parameters are not converted to Parameters.
+
         :param repository: the repository to load into
         :param sheet_name:
+        :param names: the variable names to load, defaults to all
+        :param tags: a TagQuery or the name of a single tag, defaults to all
+        :param scenarios: the scenarios to load in addition to the default scenario, defaults to all
         :return:
         """
-        repository.add_all(self.load_parameters(sheet_name))
+        row_filter = None
+        if names is not None or tags is not None or scenarios is not None:
+            row_filter = DefinitionFilter(names=names, tags=tags, scenarios=scenarios)
+        repository.add_all(self.load_parameters(sheet_name, row_filter=row_filter))
 
-    def load_parameters(self, sheet_name):
-
-        parameter_definitions = self.load_parameter_definitions(sheet_name=sheet_name)
+    def load_parameters(self, sheet_name, definitions=None, row_filter: DefinitionFilter = None):
+        """
+        :param sheet_name:
+        :param definitions: definition rows from `load_parameter_definitions`, read from the file if not given
+        :param row_filter: selects the rows to load, see DefinitionFilter
+        :return: list of Parameters
+        """
+        parameter_definitions = definitions if definitions is not None else \
+            self.load_parameter_definitions(sheet_name=sheet_name, row_filter=row_filter)
         params = []
 
+        if self.validate:
+            from excel_helper import validation
+            parameter_definitions = list(parameter_definitions)
+            locations = self.excel_handler.locations if definitions is None else None
+            for message in validation.check(parameter_definitions, self.definition_version, locations):
+                logger.warning('%s: %s', self.filename, message)
+
         param_name_map = param_name_maps[int(self.definition_version)]
 
         for _def in parameter_definitions:
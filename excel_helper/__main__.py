@@ -0,0 +1,5 @@
+import sys
+
+from excel_helper.cli import main
+
+sys.exit(main())
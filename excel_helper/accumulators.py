@@ -0,0 +1,325 @@
+"""
+Online statistics of samples per time step.
+
+Accumulators are updated with blocks of samples of shape (steps, samples), e.g. the wide layout of time series values,
+and only keep a summary of fixed size per time step. Accumulators of the same kind can be merged, so that the samples
+of a run can be summarised in chunks or in several processes.
+
+Usage:
+
+    summary = SummaryStatistics(quantiles=(0.05, 0.5, 0.95))
+    for block in blocks:
+        summary.update(block)
+    summary.to_frame()
+
+"""
+from abc import ABC, abstractmethod
+from typing import List, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+def sample_matrix(values):
+    """
+    Convert samples to a matrix of shape (steps, samples).
+
+    :param values: a numpy array of samples (1-D for a single step, 2-D as (steps, samples)), a pint series with
+        (time, samples) MultiIndex or a wide DataFrame
+    :return: tuple of (matrix, time index or None, unit or None)
+    """
+    if isinstance(values, pd.DataFrame):
+        return values.to_numpy(), values.index, values.attrs.get('unit')
+    if isinstance(values, pd.Series):
+        unit = None
+        magnitude = values.values
+        if hasattr(magnitude, 'quantity'):
+            unit = str(values.pint.u)
+            magnitude = magnitude.quantity.magnitude
+        if isinstance(values.index, pd.MultiIndex):
+            # slices keep the unused values of the levels of their index
+            times = values.index.get_level_values(0).unique()
+            return np.asarray(magnitude).reshape(len(times), -1), times, unit
+        return np.asarray(magnitude).reshape(1, -1), None, unit
+    values = np.asarray(values, dtype=float)
+    return (values if values.ndim == 2 else values.reshape(1, -1)), None, None
+
+
+class Accumulator(ABC):
+    """
+    Statistics of samples per time step that are updated with blocks of samples and can be merged.
+    """
+
+    @abstractmethod
+    def update(self, values):
+        """
+        Add a block of samples.
+
+        :param values: array of shape (steps, samples)
+        :return: self
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def merge(self, other: 'Accumulator'):
+        """
+        Add the samples summarised by another accumulator of the same kind.
+
+        :return: self
+        """
+        raise NotImplementedError()
+
+
+class MeanVariance(Accumulator):
+    """
+    Count, mean and variance with Welford's algorithm, generalised to blocks of samples (Chan et al.).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        block = MeanVariance()
+        block.count = values.shape[1]
+        block.mean = values.mean(axis=1)
+        block.m2 = ((values - block.mean.reshape(-1, 1)) ** 2).sum(axis=1)
+        return self.merge(block)
+
+    def merge(self, other: 'MeanVariance'):
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean.copy(), other.m2.copy()
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / count)
+        self.m2 = self.m2 + other.m2 + delta ** 2 * (self.count * other.count / count)
+        self.count = count
+        return self
+
+    @property
+    def variance(self):
+        """
+        The sample variance (ddof=1)
+        """
+        if self.count < 2:
+            return np.full_like(self.mean, np.nan)
+        return self.m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+
+class MinMax(Accumulator):
+
+    def __init__(self):
+        self.min = None
+        self.max = None
+
+    def update(self, values):
+        block = MinMax()
+        block.min, block.max = np.min(values, axis=1), np.max(values, axis=1)
+        return self.merge(block)
+
+    def merge(self, other: 'MinMax'):
+        if other.min is None:
+            return self
+        if self.min is None:
+            self.min, self.max = other.min.copy(), other.max.copy()
+        else:
+            self.min, self.max = np.minimum(self.min, other.min), np.maximum(self.max, other.max)
+        return self
+
+
+class Histogram(Accumulator):
+    """
+    Counts of samples per time step in fixed bins. Samples below the first or above the last edge are counted in
+    `underflow` and `overflow`.
+    """
+
+    def __init__(self, edges: Sequence[float]):
+        """
+        :param edges: monotonically increasing bin edges, shared by all accumulators that are merged
+        """
+        self.edges = np.asarray(edges, dtype=float)
+        self.counts = None
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        steps = values.shape[0]
+        # bin 0 is the underflow, bin len(edges) the overflow
+        bins = np.searchsorted(self.edges, values, side='right')
+        bins[values == self.edges[-1]] = len(self.edges) - 1
+        offsets = (np.arange(steps) * (len(self.edges) + 1)).reshape(-1, 1)
+        counts = np.bincount((bins + offsets).ravel(), minlength=steps * (len(self.edges) + 1))
+        block = Histogram(self.edges)
+        block.counts = counts.reshape(steps, len(self.edges) + 1)
+        return self.merge(block)
+
+    def merge(self, other: 'Histogram'):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError('Cannot merge histograms with different bin edges')
+        if other.counts is None:
+            return self
+        self.counts = other.counts.copy() if self.counts is None else self.counts + other.counts
+        return self
+
+    @property
+    def bin_counts(self):
+        """
+        Counts per time step and bin, shape (steps, len(edges) - 1)
+        """
+        return self.counts[:, 1:-1]
+
+    @property
+    def underflow(self):
+        return self.counts[:, 0]
+
+    @property
+    def overflow(self):
+        return self.counts[:, -1]
+
+
+class QuantileSketch(Accumulator):
+    """
+    A mergeable streaming quantile sketch (a KLL-style hierarchy of compactors) per time step.
+
+    Level `i` holds samples that each represent 2^i samples of the input. A level that grows beyond `2k` samples is
+    sorted and every other sample (starting from a random offset) is promoted to the next level. Memory per time step
+    is O(k log(n/k)) and the rank error is O(log(n/k) / k). Until 2k samples have been added, quantiles are exact.
+
+    All time steps receive the same number of samples, so the compactors of all time steps are processed together as
+    2-D arrays.
+    """
+    levels: List[np.ndarray]
+
+    def __init__(self, k: int = 200, seed: int = None):
+        """
+        :param k: accuracy parameter, higher values give smaller errors
+        :param seed: seed for the choice of the samples that are promoted
+        """
+        self.k = k
+        self.count = 0
+        self.levels = []
+        self._random_state = np.random.RandomState(seed)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        self._add(0, values)
+        self.count += values.shape[1]
+        self._compress()
+        return self
+
+    def merge(self, other: 'QuantileSketch'):
+        for level, samples in enumerate(other.levels):
+            self._add(level, samples)
+        self.count += other.count
+        self._compress()
+        return self
+
+    def _add(self, level, samples):
+        while len(self.levels) <= level:
+            self.levels.append(np.empty((samples.shape[0], 0)))
+        self.levels[level] = np.hstack([self.levels[level], samples])
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            samples = self.levels[level]
+            if samples.shape[1] >= 2 * self.k:
+                samples = np.sort(samples, axis=1)
+                compacted = samples.shape[1] - samples.shape[1] % 2
+                offset = self._random_state.randint(2)
+                self.levels[level] = samples[:, compacted:]
+                self._add(level + 1, samples[:, offset:compacted:2])
+            level += 1
+
+    def quantile(self, q):
+        """
+        Estimate quantiles per time step.
+
+        :param q: a quantile or a sequence of quantiles in [0, 1]
+        :return: array of shape (steps,) for a single quantile or (len(q), steps)
+        """
+        samples = np.hstack(self.levels)
+        weights = np.concatenate([np.full(level.shape[1], 2 ** i) for i, level in enumerate(self.levels)])
+        order = np.argsort(samples, axis=1)
+        samples = np.take_along_axis(samples, order, axis=1)
+        cumulative_weights = np.cumsum(weights[order], axis=1)
+        total = cumulative_weights[:, -1:]
+
+        result = []
+        for quantile in np.atleast_1d(q):
+            # the first sample with a cumulative weight that reaches the rank of the quantile
+            index = (cumulative_weights < np.maximum(quantile * total, 1)).sum(axis=1)
+            index = np.minimum(index, samples.shape[1] - 1)
+            result.append(samples[np.arange(samples.shape[0]), index])
+        return result[0] if np.ndim(q) == 0 else np.array(result)
+
+
+class SummaryStatistics(Accumulator):
+    """
+    Count, mean, variance, min, max, quantiles and optionally a histogram per time step.
+    """
+
+    def __init__(self, quantiles: Sequence[float] = (0.05, 0.5, 0.95), histogram_edges: Sequence[float] = None,
+                 k: int = 200, seed: int = None):
+        """
+        :param quantiles: the quantiles for `to_frame`
+        :param histogram_edges: bin edges to also count samples in a histogram
+        :param k: accuracy of the quantile sketch
+        :param seed: seed of the quantile sketch
+        """
+        self.quantiles = tuple(quantiles)
+        self.moments = MeanVariance()
+        self.extremes = MinMax()
+        self.sketch = QuantileSketch(k=k, seed=seed)
+        self.histogram = Histogram(histogram_edges) if histogram_edges is not None else None
+        self.times = None
+        self.unit = None
+
+    def update(self, values):
+        """
+        :param values: a matrix of shape (steps, samples), a pint series with (time, samples) MultiIndex or a wide
+            DataFrame
+        """
+        matrix, times, unit = sample_matrix(values)
+        if self.times is None:
+            self.times, self.unit = times, unit
+        for accumulator in self._accumulators():
+            accumulator.update(matrix)
+        return self
+
+    def merge(self, other: 'SummaryStatistics'):
+        if self.times is None:
+            self.times, self.unit = other.times, other.unit
+        for accumulator, other_accumulator in zip(self._accumulators(), other._accumulators()):
+            accumulator.merge(other_accumulator)
+        return self
+
+    def _accumulators(self):
+        return [a for a in [self.moments, self.extremes, self.sketch, self.histogram] if a is not None]
+
+    @property
+    def count(self):
+        return self.moments.count
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        :return: a DataFrame with one row per time step and the columns count, mean, var, std, min, max and one
+            column per quantile. The unit is kept in `attrs['unit']`.
+        """
+        data = {'count': np.full(len(self.moments.mean), self.count), 'mean': self.moments.mean,
+                'var': self.moments.variance, 'std': self.moments.std, 'min': self.extremes.min,
+                'max': self.extremes.max}
+        if self.quantiles:
+            for q, values in zip(self.quantiles, self.sketch.quantile(self.quantiles)):
+                data[q] = values
+        df = pd.DataFrame(data, index=pd.Index(self.times, name='time') if self.times is not None else None)
+        df.attrs['unit'] = self.unit
+        return df
@@ -0,0 +1,162 @@
+"""
+Load many workbooks concurrently with asyncio.
+
+The workbooks are read and parsed in an executor (by default a process pool, parsing is CPU bound), so the event loop
+is not blocked and the files are parsed at the same time. The parameters are merged into one repository in the order
+of the files as soon as the files before them are merged, so the result does not depend on which file finished first.
+
+    repository = await load_workbooks(['uk.xlsx', 'fr.xlsx', 'de.xlsx'], namespace='file')
+    repository['uk__energy']
+
+    # from synchronous code
+    repository = asyncio.run(load_workbooks(files))
+
+Conflicts are definitions of the same (name, scenario) in several files. With `on_conflict='error'` they raise a
+ValueError, with 'first' the definition of the earlier file in the list is kept and with 'last' the later file
+replaces it. Namespaces prefix the names of the parameters of a file, so files do not conflict. References in the
+expressions of a file to parameters of the same file are prefixed as well, references to other names are kept. The
+prefixed names must be valid identifiers to be referenced in expressions, so the default separator is '__'.
+"""
+import ast
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from typing import Callable, List, Union
+
+from excel_helper import ExcelParameterLoader, ParameterRepository, Parameter, ParameterScenarioSet
+from excel_helper.store import parameter_scenarios
+
+
+def read_definitions(filename, excel_handler='xlrd', sheet_name=None):
+    """
+    Read the definition rows of a workbook, in a worker.
+
+    :return: tuple of (definition version, list of definition rows)
+    """
+    loader = ExcelParameterLoader(filename=filename, excel_handler=excel_handler)
+    definitions = list(loader.load_parameter_definitions(sheet_name=sheet_name))
+    return loader.definition_version, definitions
+
+
+def file_namespace(filename) -> str:
+    """
+    :return: the file name without directory and extension
+    """
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+class _Prefix(ast.NodeTransformer):
+
+    def __init__(self, names, prefix):
+        self.names = names
+        self.prefix = prefix
+
+    def visit_Call(self, node):
+        # function names are not parameters
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def visit_Name(self, node):
+        if node.id in self.names:
+            node.id = self.prefix + node.id
+        return node
+
+
+def prefix_names(parameters: List[Parameter], prefix) -> List[Parameter]:
+    """
+    Prefix the names of parameters and the references to them in their expressions.
+
+    :param prefix: the namespace and the separator
+    """
+    names = {parameter.name for parameter in parameters}
+    if any(parameter.kwargs.get('expression') for parameter in parameters) and not f'{prefix}x'.isidentifier():
+        raise ValueError(f'The names prefixed with "{prefix}" cannot be referenced in expressions, use a separator '
+                         f'such as "__"')
+    transformer = _Prefix(names, prefix)
+    for parameter in parameters:
+        expression = parameter.kwargs.get('expression')
+        if expression:
+            tree = transformer.visit(ast.parse(expression.strip(), mode='eval'))
+            parameter.kwargs = dict(parameter.kwargs, expression=ast.unparse(tree))
+        parameter.name = prefix + parameter.name
+    return parameters
+
+
+def merge_parameters(repository: ParameterRepository, parameters: List[Parameter], filename,
+                     on_conflict='error') -> List[Parameter]:
+    """
+    Add the parameters of a file to a repository with a conflict rule.
+
+    :param repository: the repository to merge into
+    :param parameters: the parameters of the file
+    :param filename: the file, for error messages
+    :param on_conflict: 'error', 'first' or 'last'
+    :return: the parameters that were added
+    """
+    added = []
+    for parameter in parameters:
+        scenarios = parameter_scenarios(parameter)
+        conflicts = [s for s in scenarios if repository.exists(parameter.name, s)]
+        if conflicts and on_conflict == 'error':
+            raise ValueError(f'{filename} defines parameter <{parameter.name}> for scenarios {conflicts}, which '
+                             f'are already defined')
+        if conflicts and on_conflict == 'first':
+            scenarios = [s for s in scenarios if s not in conflicts]
+            if not scenarios:
+                continue
+            if scenarios != [ParameterScenarioSet.default_scenario]:
+                parameter.source_scenarios_string = ','.join(scenarios)
+        repository.add_parameter(parameter, resolve_defaults=False)
+        added.append(parameter)
+    return added
+
+
+async def load_workbooks(filenames: List[str], repository: ParameterRepository = None, excel_handler='xlrd',
+                         sheet_name: str = None, namespace: Union[str, Callable] = None, separator='__',
+                         on_conflict='error', executor: Executor = None) -> ParameterRepository:
+    """
+    Load workbooks concurrently into one repository.
+
+    :param filenames: the workbooks, conflicts are resolved in this order
+    :param repository: the repository to load into, defaults to a new repository
+    :param excel_handler: the ExcelParameterLoader handler of all files
+    :param sheet_name: the sheet to load, defaults to all sheets
+    :param namespace: None for no namespaces, 'file' to prefix the names with the file name without extension or a
+        callable(filename) that returns the prefix of a file
+    :param separator: between the namespace and the name, names with the separator must be identifiers if the files
+        have expressions
+    :param on_conflict: 'error', 'first' or 'last'
+    :param executor: the executor that parses the files, defaults to a process pool with a worker per file (up to the
+        number of cores)
+    :return: the repository
+    """
+    if on_conflict not in ('error', 'first', 'last'):
+        raise ValueError(f'Unknown conflict rule {on_conflict}')
+    if namespace == 'file':
+        namespace = file_namespace
+    repository = repository if repository is not None else ParameterRepository()
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=max(1, min(len(filenames), os.cpu_count() or 1)))
+    loop = asyncio.get_running_loop()
+    try:
+        futures = [loop.run_in_executor(executor, partial(read_definitions, filename, excel_handler, sheet_name))
+                   for filename in filenames]
+        names = {}
+        for filename, future in zip(filenames, futures):
+            version, definitions = await future
+            loader = ExcelParameterLoader(filename=filename, excel_handler=excel_handler)
+            loader.definition_version = version
+            parameters = loader.load_parameters(sheet_name, definitions=definitions)
+            if namespace is not None:
+                prefix_names(parameters, f'{namespace(filename)}{separator}')
+            for parameter in merge_parameters(repository, parameters, filename, on_conflict):
+                names[parameter.name] = None
+    finally:
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    repository.resolve_defaults(list(names))
+    return repository
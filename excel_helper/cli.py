@@ -0,0 +1,216 @@
+"""
+Command-line tool to precompile, inspect, validate, benchmark and serve parameter workbooks.
+
+    # load a workbook with any handler, validate it and write a definition bundle
+    excel-helper compile params.xlsx -o params.bin --handler openpyxl
+
+    # production workers load the bundle without the workbook libraries
+    repository = ParameterRepository.load('params.bin')
+
+    excel-helper validate params.xlsx
+    excel-helper inspect params.bin
+    excel-helper bench params.xlsx --handlers xlrd openpyxl --samples 1000 --months 120 --top 10
+    excel-helper serve params.bin --port 8765
+
+Bundles are the versioned binary files of `ParameterRepository.save`. The tool is also available as
+`python -m excel_helper`.
+"""
+import argparse
+import sys
+import time
+from collections import Counter
+from typing import List, Tuple
+
+import pandas as pd
+
+from excel_helper import ExcelParameterLoader, ParameterRepository, TagIndex, ParameterScenarioSet, excel_handlers
+from excel_helper.validation import validate_definitions
+
+handlers = list(excel_handlers)
+
+
+def is_bundle(path) -> bool:
+    from excel_helper.serialization import magic
+    with open(path, 'rb') as f:
+        return f.read(len(magic)) == magic
+
+
+def load_definitions(path, handler='auto', sheet_name=None, validate=False) -> Tuple[ExcelParameterLoader, List]:
+    """
+    :param validate: keep duplicates and invalid ref dates for `validate_definitions` instead of raising
+    :return: the loader and the definition rows of a workbook
+    """
+    loader = ExcelParameterLoader(filename=path, excel_handler=handler, validate=validate)
+    return loader, list(loader.load_parameter_definitions(sheet_name=sheet_name))
+
+
+def load(path, handler='auto', sheet_name=None) -> ParameterRepository:
+    """
+    Load a bundle or a workbook into a new repository.
+    """
+    if is_bundle(path):
+        return ParameterRepository.load(path)
+    repository = ParameterRepository()
+    ExcelParameterLoader(filename=path, excel_handler=handler).load_into_repo(repository, sheet_name=sheet_name)
+    return repository
+
+
+def validate(args) -> int:
+    try:
+        loader, definitions = load_definitions(args.workbook, args.handler, args.sheet, validate=True)
+    except ValueError as e:
+        print(f'error: {e}')
+        return 1
+    errors, warnings = validate_definitions(definitions, loader.definition_version, loader.excel_handler.locations)
+    for message in warnings:
+        print(f'warning: {message}')
+    for message in errors:
+        print(f'error: {message}')
+    print(f'{len(definitions)} definitions, {len(errors)} errors, {len(warnings)} warnings')
+    return 1 if errors else 0
+
+
+def compile_workbook(args) -> int:
+    start = time.perf_counter()
+    try:
+        loader, definitions = load_definitions(args.workbook, args.handler, args.sheet, validate=not args.no_validate)
+    except ValueError as e:
+        print(f'error: {e}')
+        return 1
+    if not args.no_validate:
+        errors, _ = validate_definitions(definitions, loader.definition_version, loader.excel_handler.locations)
+        for message in errors:
+            print(f'error: {message}')
+        if errors:
+            return 1
+
+    repository = ParameterRepository()
+    repository.add_all(loader.load_parameters(args.sheet, definitions=definitions))
+    repository.save(args.output)
+    print(f'{len(repository.parameter_sets)} parameters ({len(definitions)} definitions) written to {args.output} in '
+          f'{time.perf_counter() - start:.2f} s')
+    return 0
+
+
+def inspect(args) -> int:
+    repository = load(args.path, args.handler, args.sheet)
+    scenarios = Counter(scenario for parameter_set in repository.parameter_sets.values()
+                        for scenario in parameter_set.scenarios)
+    usage = repository.memory_usage()
+    tags = Counter(tag for tags in usage.parameters['tags'] for tag in TagIndex.parse_tags(tags))
+
+    print(f'{len(repository.parameter_sets)} parameters, {len(usage.parameters)} definitions')
+    print('scenarios:')
+    for scenario, count in scenarios.most_common():
+        print(f'  {scenario:<40} {count:>8}')
+    print('tags:')
+    for tag, count in tags.most_common():
+        print(f'  {tag:<40} {count:>8}')
+    print(f'memory: {usage.total / 2 ** 20:.2f} MiB')
+    return 0
+
+
+def bench(args) -> int:
+    from excel_helper.profiling import SamplingProfiler
+
+    settings = {'sample_size': args.samples}
+    if args.months:
+        # registers the pint dtype of time series values
+        import pint_pandas  # noqa: F401
+        settings.update(use_time_series=True, times=pd.date_range(args.start, periods=args.months, freq='MS'))
+
+    profiler = None
+    for handler in args.handlers:
+        start = time.perf_counter()
+        try:
+            repository = load(args.workbook, handler, args.sheet)
+        except Exception as e:
+            print(f'{handler:<10} failed: {e}')
+            continue
+        seconds = time.perf_counter() - start
+        definitions = sum(len(parameter_set.scenarios) for parameter_set in repository.parameter_sets.values())
+        print(f'{handler:<10} load {seconds:8.3f} s {definitions / seconds:12.0f} definitions/s')
+
+        profiler = SamplingProfiler()
+        parameters = [p for p in repository.select(scenario=args.scenario).values() if not p.kwargs.get('expression')]
+        failed = []
+        start = time.perf_counter()
+        for param in parameters:
+            try:
+                param(dict(settings, profiler=profiler))
+            except Exception as e:
+                failed.append(f'{param.name}: {e}')
+        seconds = time.perf_counter() - start
+        sampled = len(parameters) - len(failed)
+        print(f'{handler:<10} sample {seconds:6.3f} s {sampled / seconds:12.0f} parameters/s '
+              f'{sampled * args.samples / seconds:14.0f} samples/s')
+        for message in failed:
+            print(f'{handler:<10} failed to sample {message}')
+        if args.top:
+            print(f'{handler:<10} slowest {args.top} parameters (seconds):')
+            print(profiler.report(top=args.top).to_string())
+    return 0 if profiler is not None else 1
+
+
+def serve(args) -> int:
+    from excel_helper.server import SamplingServer
+    server = SamplingServer(args.path, host=args.host, port=args.port, excel_handler=args.handler,
+                            poll_interval=args.poll_interval)
+    print(f'serving {args.path} on {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+
+def main(args=None) -> int:
+    parser = argparse.ArgumentParser(prog='excel-helper', description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_workbook_args(subparser):
+        subparser.add_argument('--handler', default='auto', choices=handlers, help='the ExcelParameterLoader handler')
+        subparser.add_argument('--sheet', help='the sheet to load, defaults to all sheets')
+
+    subparser = subparsers.add_parser('compile', help='write a workbook to a definition bundle')
+    subparser.add_argument('workbook')
+    subparser.add_argument('-o', '--output', required=True, help='the path of the bundle')
+    subparser.add_argument('--no-validate', action='store_true', help='skip the validation of the definitions')
+    add_workbook_args(subparser)
+    subparser.set_defaults(function=compile_workbook)
+
+    subparser = subparsers.add_parser('validate', help='check the definitions of a workbook')
+    subparser.add_argument('workbook')
+    add_workbook_args(subparser)
+    subparser.set_defaults(function=validate)
+
+    subparser = subparsers.add_parser('inspect', help='summarise a bundle or a workbook')
+    subparser.add_argument('path')
+    add_workbook_args(subparser)
+    subparser.set_defaults(function=inspect)
+
+    subparser = subparsers.add_parser('bench', help='measure load and sampling throughput per handler')
+    subparser.add_argument('workbook')
+    subparser.add_argument('--handlers', nargs='+', default=['xlrd'], choices=handlers)
+    subparser.add_argument('--sheet', help='the sheet to load, defaults to all sheets')
+    subparser.add_argument('--samples', type=int, default=1000)
+    subparser.add_argument('--months', type=int, default=0, help='sample monthly time series of this length')
+    subparser.add_argument('--start', default='2020-01-01', help='the first month of the time series')
+    subparser.add_argument('--scenario', default=ParameterScenarioSet.default_scenario)
+    subparser.add_argument('--top', type=int, default=10, help='the number of slowest parameters to list')
+    subparser.set_defaults(function=bench)
+
+    subparser = subparsers.add_parser('serve', help='serve samples of a bundle or a workbook on localhost')
+    subparser.add_argument('path')
+    subparser.add_argument('--host', default='127.0.0.1')
+    subparser.add_argument('--port', type=int, default=8765)
+    subparser.add_argument('--poll-interval', type=float, default=1., help='seconds between checks for changes')
+    subparser.add_argument('--handler', default='auto', choices=handlers, help='the ExcelParameterLoader handler')
+    subparser.set_defaults(function=serve)
+
+    args = parser.parse_args(args)
+    return args.function(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
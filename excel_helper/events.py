@@ -0,0 +1,147 @@
+"""
+Structured events of loading and sampling.
+
+Loaders and generators emit typed events with a payload factory instead of formatting log messages. The payload is
+only built if a subscriber reads it or if the logger of the package is enabled for the level of the event, in which
+case the event is logged with the message of its type (as the log messages it replaces).
+
+    from excel_helper import events
+
+    counter = events.EventCounter()
+    with events.subscribed(counter):
+        repository['a'](settings)
+    counter.counts['negative_values']
+
+    with events.subscribed(lambda event: print(event.payload['variable']), events.row_loaded):
+        loader.load_into_repo(repository)
+
+Subscribers are called synchronously in the emitting thread. Events can be kept by subscribers, so payload factories
+bind the values they need instead of closing over loop variables.
+"""
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+# events are logged as the messages they replace, by the logger of the package
+logger = logging.getLogger('excel_helper')
+
+
+class EventType(object):
+    """
+    The name, log level and log message of a kind of event. The message is formatted with the payload.
+    """
+    __slots__ = ('name', 'level', 'message')
+
+    def __init__(self, name: str, level: int, message: str):
+        self.name = name
+        self.level = level
+        self.message = message
+
+    def __repr__(self):
+        return f'EventType({self.name})'
+
+
+row_loaded = EventType('row_loaded', logging.DEBUG, 'values for {variable}: {values}')
+duplicate_found = EventType('duplicate_found', logging.ERROR,
+                            'Duplicate entry for parameter with name <{variable}> and <{scenario}> scenario in sheet '
+                            '{sheet}')
+negative_values = EventType('negative_values', logging.WARNING, 'Negative values for parameter {name} from {time}')
+ref_date_truncated = EventType('ref_date_truncated', logging.WARNING,
+                               'ref date truncated to first of month for variable {variable}')
+
+event_types = {t.name: t for t in [row_loaded, duplicate_found, negative_values, ref_date_truncated]}
+
+
+class Event(object):
+    """
+    An emitted event. The payload dict is built on first access.
+    """
+    __slots__ = ('type', '_factory', '_payload')
+
+    def __init__(self, event_type: EventType, factory: Callable[[], Dict]):
+        self.type = event_type
+        self._factory = factory
+        self._payload = None
+
+    @property
+    def payload(self) -> Dict:
+        if self._factory is not None:
+            self._payload = self._factory()
+            self._factory = None
+        return self._payload
+
+    def __repr__(self):
+        return f'Event({self.type.name}, {self.payload})'
+
+
+# event name -> subscribers, None for the subscribers of all events
+_subscribers: Dict[Optional[str], List[Callable]] = {}
+
+
+def subscribe(callback: Callable[[Event], None], *types: EventType):
+    """
+    :param callback: called with each Event
+    :param types: the event types to receive, all types if none are given
+    """
+    for name in [t.name for t in types] if types else [None]:
+        _subscribers.setdefault(name, []).append(callback)
+
+
+def unsubscribe(callback: Callable[[Event], None], *types: EventType):
+    for name in [t.name for t in types] if types else [None]:
+        if callback in _subscribers.get(name, []):
+            _subscribers[name].remove(callback)
+            if not _subscribers[name]:
+                del _subscribers[name]
+
+
+@contextmanager
+def subscribed(callback: Callable[[Event], None], *types: EventType):
+    """
+    Subscribe a callback for the duration of a context.
+    """
+    subscribe(callback, *types)
+    try:
+        yield callback
+    finally:
+        unsubscribe(callback, *types)
+
+
+def emit(event_type: EventType, factory: Callable[[], Dict]):
+    """
+    Emit an event. Without subscribers and with logging disabled for its level, the payload is not built.
+
+    :param event_type:
+    :param factory: returns the payload dict
+    """
+    log = logger.isEnabledFor(event_type.level)
+    if not _subscribers and not log:
+        return
+    event = Event(event_type, factory)
+    for callback in _subscribers.get(event_type.name, ()):
+        callback(event)
+    for callback in _subscribers.get(None, ()):
+        callback(event)
+    if log:
+        logger.log(event_type.level, event_type.message.format(**event.payload))
+
+
+class EventCounter(object):
+    """
+    Counts events per type without building their payloads. Optionally keeps the first payloads of each type.
+    """
+
+    def __init__(self, keep: int = 0):
+        """
+        :param keep: the number of payloads to keep per event type
+        """
+        self.keep = keep
+        self.counts: Dict[str, int] = {}
+        self.payloads: Dict[str, List[Dict]] = {}
+
+    def __call__(self, event: Event):
+        name = event.type.name
+        count = self.counts.get(name, 0)
+        self.counts[name] = count + 1
+        if count < self.keep:
+            self.payloads.setdefault(name, []).append(event.payload)
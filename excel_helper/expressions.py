@@ -0,0 +1,305 @@
+"""
+Derived variables that are defined by expressions over other parameters.
+
+A row with a value in the 'expression' column defines a derived variable, e.g.
+
+| variable | expression             | unit |
+|----------|------------------------|------|
+| energy   | power * hours * units  | kWh  |
+
+Expressions can use the operators + - * / ** with parentheses, numeric constants, the names of other parameters
+(including other derived variables) and the functions exp, log, log10, sqrt, abs, minimum and maximum.
+
+`ExpressionGraph` compiles all expressions of a repository into a dependency graph and evaluates it with numpy
+operations on the magnitudes of the sampled values. Identical subexpressions are computed once.
+"""
+import ast
+from typing import Dict, Set
+
+import numpy as np
+import pandas as pd
+
+from excel_helper import ParameterRepository, ParameterScenarioSet, Parameter
+
+binary_operators = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/', ast.Pow: '**'}
+commutative_operators = {'+', '*'}
+kernels = {'+': np.add, '-': np.subtract, '*': np.multiply, '/': np.true_divide, '**': np.power}
+
+# functions that only accept dimensionless arguments
+dimensionless_functions = {'exp': np.exp, 'log': np.log, 'log10': np.log10}
+functions = {'sqrt': np.sqrt, 'abs': np.abs, 'minimum': np.minimum, 'maximum': np.maximum,
+             **dimensionless_functions}
+
+
+def compile_expression(expression: str):
+    """
+    Compile an expression string into a nested tuple. Identical subexpressions compile into equal tuples, so the tuples
+    serve as keys for caching their values.
+
+    :param expression: e.g. 'power * hours * units'
+    :return: a node tuple - ('const', value), ('name', name), ('neg', node), (operator, left, right) or
+        ('call', function name, *args)
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f'Invalid expression "{expression}": {e.msg}')
+    return _compile_node(tree.body, expression)
+
+
+def _compile_node(node, expression):
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return 'const', float(node.value)
+    if isinstance(node, ast.Name):
+        return 'name', node.id
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        operand = _compile_node(node.operand, expression)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        # negative constants are constants, e.g. for the exponent of a unit
+        return ('const', -operand[1]) if operand[0] == 'const' else ('neg', operand)
+    if isinstance(node, ast.BinOp) and type(node.op) in binary_operators:
+        op = binary_operators[type(node.op)]
+        left, right = _compile_node(node.left, expression), _compile_node(node.right, expression)
+        if op in commutative_operators and repr(right) < repr(left):
+            left, right = right, left
+        return op, left, right
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in functions \
+            and not node.keywords:
+        return ('call', node.func.id) + tuple(_compile_node(arg, expression) for arg in node.args)
+    raise ValueError(f'Unsupported element "{ast.dump(node)}" in expression "{expression}"')
+
+
+def referenced_names(node) -> Set[str]:
+    """
+    All parameter names used by a compiled expression.
+    """
+    if node[0] == 'name':
+        return {node[1]}
+    if node[0] == 'const':
+        return set()
+    children = node[2:] if node[0] == 'call' else node[1:]
+    return set().union(*[referenced_names(child) for child in children])
+
+
+def unit_registry():
+    from pint_pandas import PintType
+    return PintType.ureg
+
+
+class ExpressionGraph(object):
+    """
+    The dependency graph of all derived variables of a repository in one scenario.
+
+    Compiling the graph records the use of every parameter by the derived variables that reference it in
+    `Parameter.processes`, with the name of the derived variable as process name. Recompiling removes the usages of
+    references that are no longer in an expression.
+
+    Evaluated values are stored in the cache of the derived parameters, so that they are returned by
+    `Parameter.__call__` and reset by `ParameterRepository.clear_cache`. Evaluation only recomputes derived variables
+    without cached values, so after `ParameterRepository.invalidate` or a changed definition only the affected
+    results are recomputed. The graph is recompiled when the definitions in the repository change.
+
+    Usage:
+
+        graph = ExpressionGraph(repository)
+        values = graph.evaluate(settings)
+        energy = values['energy']
+
+    """
+    expressions: Dict[str, tuple]
+    dependencies: Dict[str, Set[str]]
+
+    def __init__(self, repository: ParameterRepository, scenario: str = ParameterScenarioSet.default_scenario):
+        self.repository = repository
+        self.scenario = scenario
+        self.parameters = repository.view(scenario)
+        self.compile()
+
+    def compile(self):
+        repository = self.repository
+        self.revision = repository.revision
+        previous = getattr(self, 'dependencies', {})
+
+        self.expressions = {}
+        self.dependencies = {}
+        for name, param in self.parameters.items():
+            if param.kwargs.get('expression'):
+                self.expressions[name] = compile_expression(str(param.kwargs['expression']))
+                self.dependencies[name] = referenced_names(self.expressions[name])
+
+        self.order = self._topological_order()
+
+        for name in self.order:
+            for dependency in self.dependencies[name]:
+                parameter = self.get_parameter(dependency)
+                if dependency not in parameter.processes[name]:
+                    parameter.add_usage(name, dependency)
+
+        # usages of references that were removed from an expression
+        for name, dependencies in previous.items():
+            for dependency in dependencies - self.dependencies.get(name, set()):
+                parameter = self.parameters.get(dependency)
+                if parameter is None or not parameter._processes or name not in parameter._processes:
+                    continue
+                variable_names = parameter._processes[name]
+                if dependency in variable_names:
+                    variable_names.remove(dependency)
+                if not variable_names:
+                    del parameter._processes[name]
+
+    def get_parameter(self, name) -> Parameter:
+        try:
+            return self.parameters[name]
+        except KeyError:
+            raise KeyError(f"{name} not found")
+
+    def _topological_order(self):
+        order = []
+        state = {}
+
+        def visit(name, path):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f'Circular dependency between derived variables {" -> ".join(path + [name])}')
+            if not self.repository.exists(name, self.scenario) and not self.repository.exists(name):
+                raise KeyError(f'{name} referenced in expression of {path[-1]} not found')
+            state[name] = 'visiting'
+            for dependency in sorted(self.dependencies.get(name, [])):
+                visit(dependency, path + [name])
+            state[name] = 'done'
+            if name in self.expressions:
+                order.append(name)
+
+        for name in self.expressions:
+            visit(name, [])
+        return order
+
+    def evaluate(self, settings=None, names=None) -> Dict[str, object]:
+        """
+        Evaluate derived variables. Derived variables whose parameter already holds a cached value are not
+        recomputed.
+
+        Values have the layout of the sampled parameters: numpy arrays, pint series with (time, samples) index or
+        wide DataFrames (see `time_series_values`). Derived variables with a unit are converted to that unit.
+
+        :param settings: passed to the parameters referenced by the expressions
+        :param names: derived variables to evaluate, defaults to all
+        :return: dict of {name: values}
+        """
+        if self.revision != self.repository.revision:
+            self.compile()
+
+        names = self.order if names is None else names
+        # values by node, shared by all expressions in this evaluation
+        computed = {}
+        # the index or time axis to wrap results with
+        container = {}
+
+        results = {}
+        for name in names:
+            if name not in self.expressions:
+                raise KeyError(f'{name} is not a derived variable')
+            self._evaluate_node(('name', name), settings, computed, container)
+            results[name] = self.get_parameter(name).cache
+        return results
+
+    def _evaluate_node(self, node, settings, computed, container):
+        if node in computed:
+            return computed[node]
+
+        kind = node[0]
+        if kind == 'const':
+            value = node[1], unit_registry().dimensionless
+        elif kind == 'name':
+            value = self._evaluate_name(node[1], settings, computed, container)
+        elif kind == 'neg':
+            magnitude, unit = self._evaluate_node(node[1], settings, computed, container)
+            value = np.negative(magnitude), unit
+        elif kind == 'call':
+            args = [self._evaluate_node(arg, settings, computed, container) for arg in node[2:]]
+            value = self._apply_function(node[1], args)
+        else:
+            left = self._evaluate_node(node[1], settings, computed, container)
+            right = self._evaluate_node(node[2], settings, computed, container)
+            value = self._apply_operator(kind, left, right, node)
+
+        computed[node] = value
+        return value
+
+    def _evaluate_name(self, name, settings, computed, container):
+        ureg = unit_registry()
+        parameter = self.get_parameter(name)
+
+        if name in self.expressions and parameter.cache is None:
+            magnitude, unit = self._evaluate_node(self.expressions[name], settings, computed, container)
+            if parameter.unit:
+                magnitude = magnitude * ureg.Quantity(1, unit).to(parameter.unit).magnitude
+                unit = ureg.Unit(parameter.unit)
+            parameter.cache = self._wrap(magnitude, unit, container)
+            return magnitude, unit
+
+        values = parameter(settings)
+        if isinstance(values, pd.DataFrame):
+            container.setdefault('wide', values)
+            return values.to_numpy(), ureg.Unit(values.attrs.get('unit', 'dimensionless'))
+        if isinstance(values, pd.Series):
+            container.setdefault('long', values)
+            quantity = values.values.quantity
+            return quantity.magnitude, quantity.units
+        return np.asarray(values), ureg.Unit(parameter.unit if parameter.unit else 'dimensionless')
+
+    @staticmethod
+    def _wrap(magnitude, unit, container):
+        if 'long' in container:
+            series = container['long']
+            magnitude = np.broadcast_to(magnitude, series.shape)
+            return pd.Series(magnitude, index=series.index, dtype=f'pint[{unit}]')
+        if 'wide' in container:
+            df = container['wide']
+            result = pd.DataFrame(np.broadcast_to(magnitude, df.shape), index=df.index, columns=df.columns)
+            result.attrs['unit'] = str(unit)
+            return result
+        return magnitude
+
+    @staticmethod
+    def _apply_operator(op, left, right, node):
+        ureg = unit_registry()
+        (left_magnitude, left_unit), (right_magnitude, right_unit) = left, right
+
+        if op in ['+', '-']:
+            factor = ureg.Quantity(1, right_unit).to(left_unit).magnitude
+            if factor != 1:
+                right_magnitude = right_magnitude * factor
+            return kernels[op](left_magnitude, right_magnitude), left_unit
+        if op == '*':
+            return np.multiply(left_magnitude, right_magnitude), left_unit * right_unit
+        if op == '/':
+            return np.true_divide(left_magnitude, right_magnitude), left_unit / right_unit
+
+        # power
+        if node[2][0] == 'const':
+            return np.power(left_magnitude, right_magnitude), left_unit ** right_magnitude
+        exponent = right_magnitude * ureg.Quantity(1, right_unit).to('dimensionless').magnitude
+        base = left_magnitude * ureg.Quantity(1, left_unit).to('dimensionless').magnitude
+        return np.power(base, exponent), ureg.dimensionless
+
+    @staticmethod
+    def _apply_function(name, args):
+        ureg = unit_registry()
+        if name in dimensionless_functions:
+            magnitude, unit = args[0]
+            magnitude = magnitude * ureg.Quantity(1, unit).to('dimensionless').magnitude
+            return functions[name](magnitude), ureg.dimensionless
+        if name == 'sqrt':
+            magnitude, unit = args[0]
+            return np.sqrt(magnitude), unit ** .5
+        if name == 'abs':
+            magnitude, unit = args[0]
+            return np.abs(magnitude), unit
+
+        # minimum and maximum
+        (left_magnitude, left_unit), (right_magnitude, right_unit) = args
+        factor = ureg.Quantity(1, right_unit).to(left_unit).magnitude
+        return functions[name](left_magnitude, right_magnitude * factor), left_unit
@@ -0,0 +1,213 @@
+"""
+An immutable columnar snapshot of the parameter definitions of a repository.
+
+`ParameterRepository.freeze()` returns a `FrozenRepository` with one row per (name, scenario) and one read-only numpy
+column per definition field (the Parameter attributes and all definition columns in `Parameter.kwargs`). Queries over
+definitions are vectorized:
+
+    frozen = repository.freeze()
+    growing = frozen.filter((frozen['cagr'] > .05) & (frozen['scenario'] == 'X'))
+    lognormal = frozen.filter(frozen['distribution_name'] == 'lognormal')
+    lognormal.names
+
+Scalar samples for all rows are drawn with one numpy call per distribution:
+
+    samples = frozen.in_scenario('X').sample({'sample_size': 1000})  # DataFrame of rows x samples
+"""
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from excel_helper import ParameterRepository, ParameterScenarioSet, Parameter
+
+attribute_columns = ['version', 'unit', 'tags', 'comment', 'source', 'source_scenarios_string']
+
+# vectorized numpy.random samplers and means by distribution, with the number of distribution params
+batched_distributions = {
+    'normal': (2, lambda a, b: a),
+    'uniform': (2, lambda a, b: (a + b) / 2.),
+    'lognormal': (2, lambda a, b: np.exp(a + b ** 2 / 2.)),
+    'triangular': (3, lambda a, b, c: (a + b + c) / 3.),
+}
+
+
+def _column(values: List) -> np.ndarray:
+    # numeric columns become float arrays with NaN for missing values, others stay object arrays
+    values = [None if isinstance(v, str) and v == '' else v for v in values]
+    numeric = [v for v in values if v is not None]
+    if numeric and all(isinstance(v, (int, float, np.number)) and not isinstance(v, bool) for v in numeric):
+        column = np.array([np.nan if v is None else v for v in values], dtype=float)
+    else:
+        column = np.empty(len(values), dtype=object)
+        column[:] = values
+    column.flags.writeable = False
+    return column
+
+
+class FrozenRepository(object):
+    """
+    Immutable table of parameter definitions with a (name, scenario) index.
+    """
+    index: pd.MultiIndex
+    columns: Dict[str, np.ndarray]
+
+    def __init__(self, index: pd.MultiIndex, columns: Dict[str, np.ndarray], parameters: np.ndarray,
+                 revision: int = None):
+        """
+        Use `ParameterRepository.freeze()` or `FrozenRepository.from_repository` to create a FrozenRepository.
+        """
+        object.__setattr__(self, 'index', index)
+        object.__setattr__(self, 'columns', columns)
+        object.__setattr__(self, '_parameters', parameters)
+        # the revision of the repository at the time it was frozen
+        object.__setattr__(self, 'revision', revision)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('FrozenRepository is immutable')
+
+    @classmethod
+    def from_repository(cls, repository: ParameterRepository) -> 'FrozenRepository':
+        rows = [(name, scenario, param) for name, parameter_set in repository.parameter_sets.items()
+                for scenario, param in parameter_set.scenarios.items()]
+        kwarg_names = list(dict.fromkeys(key for _, _, param in rows for key in param.kwargs))
+
+        columns = {'name': _column([name for name, _, _ in rows]),
+                   'scenario': _column([scenario for _, scenario, _ in rows])}
+        for attribute in attribute_columns:
+            columns[attribute] = _column([getattr(param, attribute) for _, _, param in rows])
+        for key in kwarg_names:
+            if key not in columns:
+                columns[key] = _column([param.kwargs.get(key) for _, _, param in rows])
+
+        parameters = np.empty(len(rows), dtype=object)
+        parameters[:] = [param for _, _, param in rows]
+        parameters.flags.writeable = False
+        index = pd.MultiIndex.from_arrays([columns['name'], columns['scenario']], names=['name', 'scenario'])
+        return cls(index, columns, parameters, repository.revision)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, column) -> np.ndarray:
+        """
+        :return: the read-only values of a column, an array of NaN (or None) values for unknown columns
+        """
+        if column in self.columns:
+            return self.columns[column]
+        return np.full(len(self), np.nan)
+
+    @property
+    def names(self) -> List[str]:
+        """
+        The parameter names, each name once
+        """
+        return list(dict.fromkeys(self.columns['name']))
+
+    def filter(self, mask) -> 'FrozenRepository':
+        """
+        :param mask: boolean array over the rows or array of row positions
+        :return: a FrozenRepository with the selected rows
+        """
+        positions = np.flatnonzero(mask) if np.asarray(mask).dtype == bool else np.asarray(mask, dtype=int)
+        columns = {}
+        for name, values in self.columns.items():
+            column = values[positions]
+            column.flags.writeable = False
+            columns[name] = column
+        parameters = self._parameters[positions]
+        parameters.flags.writeable = False
+        return FrozenRepository(self.index[positions], columns, parameters, self.revision)
+
+    def rows(self, name=None, scenario=None) -> np.ndarray:
+        """
+        :return: the positions of the rows of a parameter name and/or scenario
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if name is not None:
+            mask &= self.columns['name'] == name
+        if scenario is not None:
+            mask &= self.columns['scenario'] == scenario
+        return np.flatnonzero(mask)
+
+    def in_scenario(self, scenario: str) -> 'FrozenRepository':
+        """
+        One row per parameter name, the row of the scenario where it exists and of the default scenario otherwise
+        (as `ParameterRepository.get_parameter`).
+        """
+        names, scenarios = self.columns['name'], self.columns['scenario']
+        in_scenario = scenarios == scenario
+        fallback = (scenarios == ParameterScenarioSet.default_scenario) & ~np.isin(names, names[in_scenario])
+        return self.filter(in_scenario | fallback)
+
+    def parameters(self) -> List[Parameter]:
+        """
+        :return: the Parameter objects of the rows
+        """
+        return list(self._parameters)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        :return: a copy of the table as a DataFrame
+        """
+        return pd.DataFrame({name: values for name, values in self.columns.items()
+                             if name not in ('name', 'scenario')}, index=self.index).copy()
+
+    def sample(self, settings=None, fill_cache=False) -> pd.DataFrame:
+        """
+        Draw scalar samples for all rows. Rows with the numpy.random distributions normal, uniform, lognormal and
+        triangular are sampled with one vectorized call per distribution from the global numpy random state, all other
+        rows with their parameter. Rows of a parameter that is defined for several scenarios share one draw.
+
+        :param settings: the settings as for `Parameter.__call__`, time series are not supported
+        :param fill_cache: also set the samples as the caches of the parameters
+        :return: a DataFrame with the (name, scenario) index and one column per sample. Rows of derived variables
+            are NaN.
+        """
+        settings = settings if settings else {}
+        if settings.get('use_time_series', False):
+            raise ValueError('Batched sampling of time series is not supported, use Parameter.__call__')
+        size = settings.get('sample_size', 1)
+        sample_mean_value = settings.get('sample_mean_value', False)
+
+        samples = np.full((len(self), size), np.nan)
+        # derived variables are evaluated from expressions, they are not sampled
+        derived = np.array([isinstance(expression, str) and bool(expression.strip())
+                            for expression in self['expression']], dtype=bool)
+        # the first row of each parameter object, the other rows of a parameter copy its samples
+        first_rows = {}
+        owners = np.array([first_rows.setdefault(id(param), i) for i, param in enumerate(self._parameters)], dtype=int)
+        shared = owners != np.arange(len(self))
+        done = derived | shared
+        module, distribution = self['module_name'], self['distribution_name']
+        for name, (param_count, mean) in batched_distributions.items():
+            params = np.array([self.numeric(f'param_{i}') for i in 'abc'[:param_count]])
+            # rows with missing or non-numeric distribution params are sampled individually
+            rows = (module == 'numpy.random') & (distribution == name) & ~np.isnan(params).any(axis=0) & ~done
+            if not rows.any():
+                continue
+            args = [p[rows].reshape(-1, 1) for p in params]
+            if sample_mean_value:
+                samples[rows] = mean(*args)
+            else:
+                samples[rows] = getattr(np.random, name)(*args, size=(rows.sum(), size))
+            done |= rows
+
+        for i in np.flatnonzero(~done):
+            param = self._parameters[i]
+            samples[i] = param.create_generator(settings).generate_values(**param.value_kwargs())
+        samples[shared] = samples[owners[shared]]
+
+        if fill_cache:
+            for i in np.flatnonzero(~derived):
+                self._parameters[i].cache = samples[i]
+        return pd.DataFrame(samples, index=self.index)
+
+    def numeric(self, column) -> np.ndarray:
+        """
+        :return: the values of a column as floats, NaN for missing and non-numeric values
+        """
+        values = self[column]
+        if values.dtype == float:
+            return values
+        return pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=float)
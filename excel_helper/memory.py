@@ -0,0 +1,365 @@
+"""
+Memory accounting of a ParameterRepository.
+
+`memory_usage(repository)` (or `repository.memory_usage()`) reports the bytes held by the cached samples of each
+parameter, by tag and by scenario, and the overhead of the definitions and of the indexes of the repository. Caches
+that are memory-mapped (from `ParameterRepository.load` or spilled to disk) are reported separately as `mapped`, they
+are backed by files and not counted as resident.
+
+A `MemoryBudget` in the settings enforces a soft limit on the resident bytes of the caches:
+
+    with repository.memory_budget(2 * 2 ** 30, policy='spill') as budget:
+        model(repository, dict(settings, memory_budget=budget))
+
+Each time a parameter fills its cache, the budget checks the limit and evicts the caches that were filled first
+('evict', they are sampled again on their next call) or moves them to memory-mapped files ('spill', they keep their
+values). The parameter that was just sampled is never evicted. The budget keeps a running total of the caches it has
+seen, the caches of the repository are only scanned when the budget is created and by `MemoryBudget.scan`. Closing
+the budget deletes the spilled files and drops the caches that still map them.
+
+`bytes_per_sample` estimates the memory that a number of samples of a scenario needs, e.g. to choose the chunk size
+of a `MonteCarloRunner` for the memory of a worker process.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import weakref
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from excel_helper import ParameterRepository, ParameterScenarioSet, Parameter, TagIndex, TagQuery, DefinitionRecord
+
+
+def _is_mapped(array) -> bool:
+    base = array
+    while base is not None:
+        if isinstance(base, np.memmap):
+            return True
+        base = base.obj if isinstance(base, memoryview) else getattr(base, 'base', None)
+    return False
+
+
+def cache_nbytes(values) -> Tuple[int, int]:
+    """
+    :param values: cached samples, a numpy array, a pint series or a wide DataFrame
+    :return: tuple of (resident bytes, memory-mapped bytes)
+    """
+    if values is None:
+        return 0, 0
+    index_bytes = 0
+    if isinstance(values, pd.DataFrame):
+        index_bytes = values.index.memory_usage()
+        array = values.to_numpy()
+    elif isinstance(values, pd.Series):
+        index_bytes = values.index.memory_usage()
+        array = values.values
+        array = array.quantity.magnitude if hasattr(array, 'quantity') else np.asarray(array)
+    elif isinstance(values, np.ndarray):
+        array = values
+    else:
+        return sys.getsizeof(values), 0
+
+    if _is_mapped(array):
+        return index_bytes, array.nbytes
+    return index_bytes + array.nbytes, 0
+
+
+def definition_nbytes(parameter: Parameter) -> int:
+    """
+    :return: the bytes of a parameter object and of its definition record, without interned strings and the shared
+        schema
+    """
+    size = sys.getsizeof(parameter) + sys.getsizeof(parameter.kwargs) + sys.getsizeof(parameter.kwargs._values)
+    for value in parameter.kwargs._values:
+        if isinstance(value, str) and sys.intern(value) is value:
+            continue
+        size += sys.getsizeof(value)
+    if parameter._processes:
+        size += sys.getsizeof(parameter._processes) + sum(sys.getsizeof(v) for v in parameter._processes.values())
+    return size
+
+
+def unique_parameters(repository: ParameterRepository) -> Dict[int, Tuple[Parameter, list]]:
+    """
+    :return: dict of {id(parameter): (parameter, [scenarios])}, a variant defined for several scenarios is listed once
+    """
+    parameters = {}
+    for parameter_set in repository.parameter_sets.values():
+        for scenario, param in parameter_set.scenarios.items():
+            if id(param) in parameters:
+                parameters[id(param)][1].append(scenario)
+            else:
+                parameters[id(param)] = (param, [scenario])
+    return parameters
+
+
+class MemoryUsage(object):
+    """
+    The memory held by a repository.
+    """
+    "indexed by (parameter, scenarios) with the columns cache, mapped, definition and tags"
+    parameters: pd.DataFrame
+
+    "bytes of the indexes and shared structures of the repository"
+    overhead: Dict[str, int]
+
+    def __init__(self, parameters: pd.DataFrame, overhead: Dict[str, int]):
+        self.parameters = parameters
+        self.overhead = overhead
+
+    @property
+    def cache(self) -> int:
+        """
+        Resident bytes of all caches.
+        """
+        return int(self.parameters['cache'].sum())
+
+    @property
+    def total(self) -> int:
+        """
+        Resident bytes of the caches, the definitions and the overhead.
+        """
+        return self.cache + int(self.parameters['definition'].sum()) + sum(self.overhead.values())
+
+    def by_tag(self) -> pd.Series:
+        """
+        Resident cache bytes per tag. Parameters with several tags count for each of them.
+        """
+        totals = {}
+        for tags, cache in zip(self.parameters['tags'], self.parameters['cache']):
+            for tag in TagIndex.parse_tags(tags):
+                totals[tag] = totals.get(tag, 0) + cache
+        return pd.Series(totals, dtype='int64').sort_values(ascending=False)
+
+    def by_scenario(self) -> pd.Series:
+        """
+        Resident cache bytes per scenario. Variants defined for several scenarios count for each of them.
+        """
+        totals = {}
+        for scenarios, cache in zip(self.parameters.index.get_level_values('scenarios'), self.parameters['cache']):
+            for scenario in scenarios.split(','):
+                totals[scenario] = totals.get(scenario, 0) + cache
+        return pd.Series(totals, dtype='int64').sort_values(ascending=False)
+
+    def top(self, n=10) -> pd.DataFrame:
+        """
+        :return: the n parameters with the largest resident caches
+        """
+        return self.parameters.nlargest(n, 'cache')
+
+    def __repr__(self):
+        return f'MemoryUsage(cache={self.cache}, total={self.total}, parameters={len(self.parameters)})'
+
+
+def memory_usage(repository: ParameterRepository) -> MemoryUsage:
+    """
+    :param repository:
+    :return: the MemoryUsage of the caches, the definitions and the indexes of a repository
+    """
+    rows, index = [], []
+    for param, scenarios in unique_parameters(repository).values():
+        cache, mapped = cache_nbytes(param.cache)
+        rows.append((cache, mapped, definition_nbytes(param), param.tags if param.tags else ''))
+        index.append((param.name, ','.join(scenarios)))
+    parameters = pd.DataFrame(rows, columns=['cache', 'mapped', 'definition', 'tags'],
+                              index=pd.MultiIndex.from_tuples(index, names=['parameter', 'scenarios']))
+
+    tag_index = repository.tag_index
+    overhead = {
+        'parameter_sets': sys.getsizeof(repository.parameter_sets) + sum(
+            sys.getsizeof(s) + sys.getsizeof(s.scenarios) for s in repository.parameter_sets.values()),
+        'tag_index': sys.getsizeof(tag_index.parameters) + sys.getsizeof(tag_index.bitsets) + sum(
+            sys.getsizeof(b) for b in tag_index.bitsets.values()) + sys.getsizeof(tag_index._ids) + sys.getsizeof(
+            tag_index._tags) + sum(sys.getsizeof(t) for t in tag_index._tags if t is not None),
+        'views': sum(sys.getsizeof(view) for view in list(repository._views.values())),
+        'schemas': sys.getsizeof(DefinitionRecord._schemas) + sum(
+            sys.getsizeof(keys) + sys.getsizeof(positions) for keys, positions in DefinitionRecord._schemas.values())}
+    return MemoryUsage(parameters, overhead)
+
+
+def spill_cache(parameter: Parameter, directory: str, filename: str = None):
+    """
+    Move the cached samples of a parameter to a .npy file and replace them with a copy-on-write memory-mapped view
+    with the same values and layout.
+
+    :param parameter: a parameter with a cache
+    :param directory: the directory of the file
+    :param filename: defaults to a new file name
+    :return: the path of the file
+    """
+    from excel_helper.serialization import _encode_cache, _decode_cache
+    encoded = _encode_cache(parameter.cache)
+    if filename:
+        path = os.path.join(directory, filename)
+    else:
+        fd, path = tempfile.mkstemp(suffix='.npy', dir=directory)
+        os.close(fd)
+    np.save(path, np.ascontiguousarray(encoded['values']))
+    encoded['values'] = np.load(path, mmap_mode='c')
+    parameter.cache = _decode_cache(encoded)
+    return path
+
+
+class MemoryBudget(object):
+    """
+    A soft limit on the resident bytes of the caches of a repository, enforced after each parameter call with the
+    budget in the settings ('memory_budget').
+
+    Caches filled by calls without the budget in the settings are not counted until the next `scan`. The index of a
+    spilled cache stays resident and is counted.
+
+    Spilled files are deleted by `close` (or at the end of a `with` block). A temporary spill directory is also
+    deleted when the budget is garbage collected.
+    """
+
+    def __init__(self, repository: ParameterRepository, limit: int, policy='evict', directory: str = None):
+        """
+        :param repository: the repository of the parameters
+        :param limit: the resident bytes of caches above which caches are evicted or spilled
+        :param policy: 'evict' to drop caches, 'spill' to move them to memory-mapped files
+        :param directory: the directory of spilled caches, defaults to a new temporary directory that is deleted with
+            the budget
+        """
+        if policy not in ('evict', 'spill'):
+            raise ValueError(f'Unknown memory budget policy {policy}')
+        self.repository = repository
+        self.limit = limit
+        self.policy = policy
+        self.directory = directory
+        # the parameters in the order they filled their caches, with their resident bytes
+        self._filled = OrderedDict()
+        self.resident = 0
+        self.evicted = 0
+        self.spilled = 0
+        # the parameters with spilled caches and the files of the caches, by id of the parameter
+        self._spilled = {}
+        self._files = []
+        self._cleanup = None
+        self.scan()
+
+    def scan(self):
+        """
+        Count the caches of the repository again. Caches that the budget did not see being filled go first (largest
+        first), then the caches in the order they were filled.
+        """
+        parameters = [param for param, _ in unique_parameters(self.repository).values() if param.cache is not None]
+        sizes = {id(param): cache_nbytes(param.cache)[0] for param in parameters}
+        untracked = sorted((p for p in parameters if id(p) not in self._filled), key=lambda p: -sizes[id(p)])
+        tracked = [p for p, _ in self._filled.values() if id(p) in sizes]
+        self._filled = OrderedDict((id(p), (p, sizes[id(p)])) for p in untracked + tracked)
+        self.resident = sum(sizes.values())
+
+    def track(self, parameter: Parameter):
+        """
+        Account for the cache of a parameter that was just filled and enforce the limit.
+        """
+        size = cache_nbytes(parameter.cache)[0]
+        self._spilled.pop(id(parameter), None)
+        previous = self._filled.pop(id(parameter), (None, 0))[1]
+        self._filled[id(parameter)] = (parameter, size)
+        self.resident += size - previous
+        if self.resident > self.limit:
+            self.enforce(keep=parameter)
+
+    def enforce(self, keep: Parameter = None) -> int:
+        """
+        Evict or spill the counted caches in the order they were filled until the resident bytes are below the limit.
+
+        :param keep: a parameter whose cache is kept
+        :return: the number of bytes that were freed
+        """
+        freed = 0
+        for param, size in list(self._filled.values()):
+            if self.resident <= self.limit:
+                break
+            if param is keep or not size or id(param) in self._spilled:
+                continue
+            if param.cache is None:
+                # cleared outside the budget
+                self.resident -= size
+                del self._filled[id(param)]
+                continue
+            if self.policy == 'spill':
+                if self.directory is None:
+                    self.directory = tempfile.mkdtemp(prefix='excel_helper_spill_')
+                    self._cleanup = weakref.finalize(self, shutil.rmtree, self.directory, True)
+                self._files.append(spill_cache(param, self.directory))
+                self._spilled[id(param)] = param
+                self.spilled += 1
+            else:
+                param.cache = None
+                self.evicted += 1
+            remaining = cache_nbytes(param.cache)[0]
+            self.resident -= size - remaining
+            freed += size - remaining
+            if remaining:
+                # the index of a spilled cache stays in memory
+                self._filled[id(param)] = (param, remaining)
+            else:
+                del self._filled[id(param)]
+        return freed
+
+    def close(self):
+        """
+        Delete the spilled files. Caches that still map them are dropped, they are sampled again on their next call.
+        """
+        for param in self._spilled.values():
+            if param.cache is not None and cache_nbytes(param.cache)[1]:
+                self.resident -= self._filled.pop(id(param), (None, 0))[1]
+                param.cache = None
+        self._spilled = {}
+        for path in self._files:
+            if os.path.exists(path):
+                os.remove(path)
+        self._files = []
+        if self._cleanup is not None:
+            self._cleanup()
+            self._cleanup = None
+            self.directory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def bytes_per_sample(repository: ParameterRepository, settings, scenario=ParameterScenarioSet.default_scenario,
+                     names=None, probe_size=100) -> float:
+    """
+    Estimate the resident bytes per sample of the caches of the parameters of a scenario, by sampling them with
+    `probe_size` samples. numpy.random distributions draw from a separate random state, distributions of other
+    modules may draw from the global numpy random state, which is restored after probing. Parameters derived from
+    expressions are not included.
+
+    :param repository:
+    :param settings: the settings of the run, 'sample_size' is ignored
+    :param scenario: the scenario
+    :param names: a list of names or a TagQuery, defaults to all parameters
+    :param probe_size: the number of samples to draw per parameter
+    :return: bytes per sample, e.g. `memory_per_worker / bytes_per_sample(...)` is the number of samples a worker can
+        hold
+    """
+    if names is None or isinstance(names, TagQuery):
+        parameters = repository.select(names, scenario)
+    else:
+        parameters = {name: repository.get_parameter(name, scenario) for name in names}
+    probe = {k: v for k, v in settings.items() if k not in ('profiler', 'memory_budget')}
+    probe['sample_size'] = probe_size
+
+    total = 0
+    state = np.random.get_state()
+    try:
+        for param in parameters.values():
+            if param.kwargs.get('expression'):
+                continue
+            values = param.create_generator(probe, random_state=np.random.RandomState(0)).generate_values(
+                **param.value_kwargs())
+            total += sum(cache_nbytes(values))
+    finally:
+        np.random.set_state(state)
+    return total / probe_size
@@ -0,0 +1,130 @@
+"""
+Parallel Monte Carlo runs of a model over the parameters of a repository.
+
+The samples of a run are split into chunks of sample indices. Each chunk is evaluated in a worker process with its own
+random stream, and the model outputs are reduced to mergeable summary statistics
+(`excel_helper.accumulators.SummaryStatistics`) inside the worker, so that only the summaries are sent back to the
+parent process.
+
+Workers are forked from the parent and share the loaded parameter definitions copy-on-write, so the workbook is not
+reloaded and the repository is not pickled.
+"""
+import logging
+import multiprocessing
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from excel_helper import ParameterRepository
+from excel_helper.accumulators import SummaryStatistics
+
+logger = logging.getLogger(__name__)
+
+# the state of a run, inherited by forked workers
+_run_state = {}
+
+
+def _run_chunk(task):
+    start, stop, seed = task
+    repository = _run_state['repository']
+    settings = dict(_run_state['settings'], sample_size=stop - start)
+
+    # every chunk starts from fresh samples on its own random stream
+    repository.clear_cache()
+    np.random.seed(seed)
+    outputs = _run_state['model'](repository, settings)
+    if not isinstance(outputs, dict):
+        outputs = {'output': outputs}
+
+    return {name: SummaryStatistics(_run_state['quantiles'], seed=seed).update(values)
+            for name, values in outputs.items()}
+
+
+class MonteCarloRunner(object):
+    """
+    Run a model in parallel over chunks of samples and reduce its outputs to summary statistics.
+
+    The model is a callable `model(repository, settings)` that returns a dict of {output name: values} (or a single
+    value) where values are samples from `Parameter.__call__` or derived from them. The 'sample_size' in the settings
+    passed to the model is the size of the chunk.
+
+    Usage:
+
+        def model(repository, settings):
+            return {'energy': repository['power'](settings) * repository['hours'](settings)}
+
+        runner = MonteCarloRunner(repository, model, processes=4)
+        summaries = runner.run(settings, samples=100000)
+        summaries['energy']['mean']
+
+    Results are reproducible for a given seed and chunk size, independent of the number of processes.
+    """
+    model: Callable
+
+    def __init__(self, repository: ParameterRepository, model: Callable, processes: int = None,
+                 chunk_size: int = 10000, quantiles=(0.05, 0.5, 0.95), seed: int = None):
+        """
+        :param repository: the loaded parameters
+        :param model: callable(repository, settings) -> dict of outputs
+        :param processes: the number of worker processes, defaults to the number of cores. With 1, the chunks are
+            evaluated in the calling process.
+        :param chunk_size: the number of samples per chunk
+        :param quantiles: the quantiles to estimate for each output
+        :param seed: the root of the random streams of all chunks
+        """
+        self.repository = repository
+        self.model = model
+        self.processes = processes if processes else multiprocessing.cpu_count()
+        self.chunk_size = chunk_size
+        self.quantiles = tuple(quantiles)
+        self.seed = seed
+
+    def tasks(self, samples) -> List:
+        """
+        Split the sample indices into chunks with independent random streams.
+
+        :return: list of (first sample index, end sample index, seed)
+        """
+        starts = list(range(0, samples, self.chunk_size))
+        seeds = np.random.SeedSequence(self.seed).spawn(len(starts))
+        return [(start, min(start + self.chunk_size, samples), int(seed.generate_state(1)[0]))
+                for start, seed in zip(starts, seeds)]
+
+    def run(self, settings, samples: int) -> Dict[str, pd.DataFrame]:
+        """
+        Evaluate the model for `samples` samples.
+
+        The caches of the parameters in the repository are reset.
+
+        :param settings: settings for the parameters, 'sample_size' is set per chunk
+        :param samples: the total number of samples
+        :return: dict of {output name: DataFrame of summary statistics per time step}
+        """
+        _run_state.update(repository=self.repository, model=self.model, settings=settings,
+                          quantiles=self.quantiles)
+        tasks = self.tasks(samples)
+        try:
+            if self.processes > 1 and len(tasks) > 1 and 'fork' in multiprocessing.get_all_start_methods():
+                logger.info(f'Running {len(tasks)} chunks of {samples} samples in {self.processes} processes')
+                with multiprocessing.get_context('fork').Pool(min(self.processes, len(tasks))) as pool:
+                    results = pool.imap(_run_chunk, tasks)
+                    totals = self._merge(results)
+            else:
+                totals = self._merge(map(_run_chunk, tasks))
+        finally:
+            _run_state.clear()
+            self.repository.clear_cache()
+
+        return {name: summary.to_frame() for name, summary in totals.items()}
+
+    @staticmethod
+    def _merge(results):
+        totals = {}
+        for summaries in results:
+            for name, summary in summaries.items():
+                if name in totals:
+                    totals[name].merge(summary)
+                else:
+                    totals[name] = summary
+        return totals
@@ -0,0 +1,158 @@
+"""
+Timing and allocation counters per parameter and per stage of sampling.
+
+A profiler is enabled by adding it to the settings passed to `Parameter.__call__`:
+
+    profiler = SamplingProfiler()
+    settings = {'sample_size': 1000, 'use_time_series': True, 'times': times, 'profiler': profiler}
+    model(repository, settings)
+    profiler.report(top=10)
+
+The generators time the stages of sampling:
+
+- 'lookup': resolving the distribution function
+- 'draw': drawing the random values
+- 'growth': computing the growth coefficients and applying them
+- 'wrap': wrapping the values in a pint series or DataFrame
+- 'negative_check': checking the values for negative steps
+
+and `Parameter.__call__` times the whole call as stage 'total'. Without a profiler in the settings, the stages are
+no-ops.
+
+Callbacks are called after each stage with `callback(name, scenario, stage, seconds, allocated)`, where `allocated` is
+the peak of the bytes allocated during the stage (None unless the profiler traces memory). Workers of a
+`MonteCarloRunner` record into their own copy of the profiler.
+"""
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, List
+
+import pandas as pd
+
+stages = ['lookup', 'draw', 'growth', 'wrap', 'negative_check']
+
+
+class SamplingProfiler(object):
+    """
+    Accumulates the number of calls, the time and the allocated bytes per (parameter, scenario, stage).
+    """
+
+    def __init__(self, memory=False, callbacks: List[Callable] = None):
+        """
+        :param memory: trace allocations with tracemalloc. Tracing is started by the first stage if it is not running
+            and stopped by `close`. It slows down sampling considerably.
+        :param callbacks: functions called after each stage
+        """
+        self.memory = memory
+        self.callbacks = list(callbacks) if callbacks else []
+        # (name, scenario, stage) -> [calls, seconds, allocated bytes]
+        self.counters = {}
+        self._parameter = (None, None)
+        # [traced memory at the start, peak of the nested stages] per open stage
+        self._memory_stack = []
+        self._started_tracing = False
+
+    def add_callback(self, callback: Callable):
+        self.callbacks.append(callback)
+
+    @contextmanager
+    def parameter(self, parameter):
+        """
+        Attribute the stages in this context to a parameter.
+        """
+        previous = self._parameter
+        self._parameter = (parameter.name, parameter.scenario)
+        try:
+            with self.stage('total'):
+                yield
+        finally:
+            self._parameter = previous
+
+    @contextmanager
+    def stage(self, stage: str):
+        """
+        Time a stage of sampling of the current parameter.
+        """
+        if self.memory:
+            self._enter_memory()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            allocated = self._exit_memory() if self.memory else None
+            self.record(stage, seconds, allocated)
+
+    def _enter_memory(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        current, peak = tracemalloc.get_traced_memory()
+        if self._memory_stack:
+            self._memory_stack[-1][1] = max(self._memory_stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        self._memory_stack.append([current, 0])
+
+    def _exit_memory(self):
+        start, nested_peak = self._memory_stack.pop()
+        peak = max(nested_peak, tracemalloc.get_traced_memory()[1])
+        if self._memory_stack:
+            self._memory_stack[-1][1] = max(self._memory_stack[-1][1], peak)
+        return max(0, peak - start)
+
+    def record(self, stage: str, seconds: float, allocated: int = None):
+        name, scenario = self._parameter
+        counter = self.counters.get((name, scenario, stage))
+        if counter is None:
+            counter = self.counters[(name, scenario, stage)] = [0, 0., 0]
+        counter[0] += 1
+        counter[1] += seconds
+        if allocated is not None:
+            counter[2] = max(counter[2], allocated)
+        for callback in self.callbacks:
+            callback(name, scenario, stage, seconds, allocated)
+
+    def close(self):
+        """
+        Stop tracing allocations if this profiler started it.
+        """
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def reset(self):
+        self.counters = {}
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        :return: DataFrame with the columns calls, seconds and allocated (peak bytes) indexed by
+            (parameter, scenario, stage)
+        """
+        index = pd.MultiIndex.from_tuples(list(self.counters.keys()), names=['parameter', 'scenario', 'stage'])
+        return pd.DataFrame(list(self.counters.values()), index=index, columns=['calls', 'seconds', 'allocated'])
+
+    def report(self, top=10, by='seconds', stage='total') -> pd.DataFrame:
+        """
+        The parameters that took the longest (or allocated the most) in a stage, with the time of their stages as
+        columns.
+
+        :param top: the number of parameters
+        :param by: 'seconds' or 'allocated'
+        :param stage: the stage to rank by, 'total' for the whole call
+        :return: DataFrame indexed by (parameter, scenario)
+        """
+        frame = self.to_frame()
+        if frame.empty:
+            return frame
+        ranked = frame.xs(stage, level='stage')[by].nlargest(top)
+        seconds = frame['seconds'].unstack('stage').reindex(ranked.index)
+        seconds = seconds[[s for s in ['total'] + stages if s in seconds.columns]]
+        return seconds.assign(calls=frame.xs(stage, level='stage')['calls'].reindex(ranked.index),
+                              allocated=frame.xs(stage, level='stage')['allocated'].reindex(ranked.index))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,235 @@
+"""
+Global sensitivity analysis of a model over the parameters of a repository.
+
+First-order and total Sobol indices are estimated with the sampling scheme of Saltelli et al. (2010): two independent
+sample matrices A and B of N samples are drawn for all parameters, and for each parameter i a matrix AB_i is formed
+from A with the samples of parameter i taken from B. The samples of A, B and all AB_i share the base draws and are
+evaluated together in a single call of the model with N * (k + 2) samples, instead of one run per parameter.
+
+Tornado ranges hold all parameters at their mean value and move one parameter at a time to a low and a high quantile
+of its samples. They are evaluated in one model call with 2k + 1 samples.
+"""
+import logging
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from excel_helper import ParameterRepository, ParameterScenarioSet, Parameter, TagQuery, time_series_values
+from excel_helper.accumulators import sample_matrix
+
+logger = logging.getLogger(__name__)
+
+
+def select_samples(values, indices):
+    """
+    Select samples from sampled values, keeping their layout.
+
+    :param values: a numpy array of samples, a pint series with (time, samples) MultiIndex or a wide DataFrame
+    :param indices: the indices of the samples to select
+    :return: values of the same type with the selected samples
+    """
+    matrix, _, _ = sample_matrix(values)
+    return like_values(values, matrix[:, indices])
+
+
+def like_values(template, matrix):
+    """
+    Wrap a matrix of shape (steps, samples) in the layout of `template`.
+    """
+    if isinstance(template, pd.DataFrame):
+        return time_series_values(matrix, template.index, template.attrs.get('unit'), layout='wide')
+    if isinstance(template, pd.Series):
+        _, times, unit = sample_matrix(template)
+        if times is None:
+            return pd.Series(matrix.ravel(), dtype=template.dtype)
+        return time_series_values(matrix, times, unit, index_names=list(template.index.names))
+    return matrix.ravel() if np.ndim(template) < 2 else matrix
+
+
+class SensitivityAnalysis(object):
+    """
+    Sobol indices and tornado ranges of the outputs of a model.
+
+    The model is a callable `model(repository, settings)` as for `excel_helper.montecarlo.MonteCarloRunner`. It
+    must obtain the parameters from the repository (`repository.get_parameter(name, scenario)`), which returns the
+    samples of the analysis from the parameter caches. Parameters of the repository that are not analysed are sampled
+    as usual (or at their mean value for the tornado ranges).
+
+    Usage:
+
+        analysis = SensitivityAnalysis(repository, model, parameters=['power', 'hours', 'units'], seed=1)
+        indices = analysis.sobol_indices(settings, samples=10000)
+        indices['energy'].sort_values('ST', ascending=False)
+
+    For time series, the indices are computed per time step and the frames have a (time, parameter) MultiIndex.
+
+    Parameters of the scenario that are not analysed and not derived from expressions are sampled once for the base
+    rows of a model call and the same draw is repeated in every block (A, B and all AB_i), so that the blocks only
+    differ in the analysed parameters. The caches of parameters that do not depend on the analysed parameters (see
+    `ParameterRepository.dependents`) are restored after the call, the caches of the analysed parameters and their
+    dependents are cleared.
+    """
+    model: Callable
+    parameters: List[str]
+
+    def __init__(self, repository: ParameterRepository, model: Callable, parameters: Sequence[str] = None,
+                 scenario: str = ParameterScenarioSet.default_scenario, seed: int = None):
+        """
+        :param repository: the loaded parameters
+        :param model: callable(repository, settings) -> dict of outputs
+        :param parameters: the names of the parameters to analyse or a TagQuery that selects them, defaults to all
+            parameters that are not derived from expressions
+        :param scenario: the scenario of the parameters
+        :param seed: seed of the global numpy random state for the samples
+        """
+        self.repository = repository
+        self.model = model
+        self.scenario = scenario
+        self.seed = seed
+        if parameters is None or isinstance(parameters, TagQuery):
+            parameters = [name for name in repository.names(parameters)
+                          if not self.get_parameter(name).kwargs.get('expression')]
+        self.parameters = list(parameters)
+
+    def get_parameter(self, name) -> Parameter:
+        return self.repository.get_parameter(name, self.scenario)
+
+    def draw(self, settings, samples: int) -> Dict[str, object]:
+        """
+        Sample all parameters of the analysis.
+
+        :param settings: settings for the parameters
+        :param samples: N, the number of samples per matrix
+        :return: dict of {parameter name: values with 2N samples}, the first N samples form matrix A, the last N
+            matrix B
+        """
+        if self.seed is not None:
+            np.random.seed(self.seed)
+        settings = dict(settings, sample_size=2 * samples)
+        draws = {}
+        for name in self.parameters:
+            param = self.get_parameter(name)
+            param.cache = None
+            draws[name] = param(settings)
+        return draws
+
+    def sobol_indices(self, settings, samples: int, draws: Dict[str, object] = None) -> Dict[str, pd.DataFrame]:
+        """
+        Estimate first-order (S1) and total (ST) Sobol indices. S1 uses the estimator of Saltelli et al. (2010),
+        ST the estimator of Jansen (1999).
+
+        :param settings: settings for the parameters, 'sample_size' is set by the analysis
+        :param samples: N, the number of samples per matrix. The model is evaluated for N * (k + 2) samples.
+        :param draws: samples from `draw`, drawn if not given
+        :return: dict of {output name: DataFrame with the columns S1 and ST per parameter}
+        """
+        draws = draws if draws is not None else self.draw(settings, samples)
+        k = len(self.parameters)
+        a, b = np.arange(samples), np.arange(samples, 2 * samples)
+
+        batch = {}
+        for i, name in enumerate(self.parameters):
+            # A, B, then AB_j for all parameters j: the samples of B in block j + 2
+            blocks = [a, b] + [b if j == i else a for j in range(k)]
+            batch[name] = select_samples(draws[name], np.concatenate(blocks))
+
+        logger.info(f'Evaluating {k + 2} sample matrices of {samples} samples for {k} parameters')
+        outputs = self._evaluate(settings, batch, samples, k + 2)
+
+        results = {}
+        for output_name, (matrix, times) in outputs.items():
+            f_a, f_b = matrix[:, :samples], matrix[:, samples:2 * samples]
+            variance = np.var(matrix[:, :2 * samples], axis=1)
+            first_order, total = np.empty((matrix.shape[0], k)), np.empty((matrix.shape[0], k))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                for i in range(k):
+                    f_ab = matrix[:, (i + 2) * samples:(i + 3) * samples]
+                    first_order[:, i] = np.mean(f_b * (f_ab - f_a), axis=1) / variance
+                    total[:, i] = 0.5 * np.mean((f_a - f_ab) ** 2, axis=1) / variance
+            results[output_name] = self._frame({'S1': first_order, 'ST': total}, times)
+        return results
+
+    def tornado(self, settings, samples: int = 1000, quantiles=(0.05, 0.95),
+                draws: Dict[str, object] = None) -> Dict[str, pd.DataFrame]:
+        """
+        Output ranges when one parameter at a time is moved from its mean value to a low and a high quantile.
+
+        :param settings: settings for the parameters
+        :param samples: the number of samples to estimate the quantiles of the parameters from
+        :param quantiles: the low and the high quantile
+        :param draws: samples from `draw` to estimate the quantiles from, drawn if not given
+        :return: dict of {output name: DataFrame with the columns base, low, high and swing per parameter}, without
+            time steps sorted by swing
+        """
+        draws = draws if draws is not None else self.draw(settings, samples)
+        k = len(self.parameters)
+        mean_settings = dict(settings, sample_mean_value=True)
+
+        batch = {}
+        for i, name in enumerate(self.parameters):
+            param = self.get_parameter(name)
+            base = sample_matrix(param.create_generator(dict(mean_settings, sample_size=1)).generate_values(
+                **param.value_kwargs()))[0]
+            low, high = np.quantile(sample_matrix(draws[name])[0], quantiles, axis=1)
+            # column 0 is the base case, columns 2i + 1 and 2i + 2 move parameter i to its low and high quantile
+            matrix = np.repeat(base, 2 * k + 1, axis=1)
+            matrix[:, 2 * i + 1], matrix[:, 2 * i + 2] = low, high
+            batch[name] = like_values(draws[name], matrix)
+
+        outputs = self._evaluate(mean_settings, batch, 1, 2 * k + 1)
+
+        results = {}
+        for output_name, (matrix, times) in outputs.items():
+            low, high = matrix[:, 1::2], matrix[:, 2::2]
+            df = self._frame({'base': np.repeat(matrix[:, :1], k, axis=1), 'low': low, 'high': high,
+                              'swing': np.abs(high - low)}, times)
+            results[output_name] = df.sort_values('swing', ascending=False) if times is None else df
+        return results
+
+    def _evaluate(self, settings, batch: Dict[str, object], rows: int, blocks: int):
+        """
+        Call the model with the samples of the analysed parameters in the batch.
+
+        :param batch: {parameter name: values with rows * blocks samples}
+        :param rows: the number of samples of a block
+        :param blocks: the number of blocks, the other parameters repeat the same rows in every block
+        """
+        analysed = [self.get_parameter(name) for name in batch]
+        affected = {id(param) for param in analysed + self.repository._dependents(analysed)[1]}
+        kept = [(param, param.cache) for parameter_set in self.repository.parameter_sets.values()
+                for param in parameter_set.scenarios.values()
+                if param.cache is not None and id(param) not in affected]
+        fixed = {id(param): param for param in self.repository.view(self.scenario).values()
+                 if id(param) not in affected and not param.kwargs.get('expression')}.values()
+
+        self.repository.clear_cache()
+        try:
+            tiled = np.tile(np.arange(rows), blocks)
+            for param in fixed:
+                param.cache = select_samples(param(dict(settings, sample_size=rows)), tiled)
+            for param, values in zip(analysed, batch.values()):
+                param.cache = values
+            outputs = self.model(self.repository, dict(settings, sample_size=rows * blocks))
+        finally:
+            self.repository.clear_cache()
+            for param, values in kept:
+                param.cache = values
+        if not isinstance(outputs, dict):
+            outputs = {'output': outputs}
+
+        results = {}
+        for name, values in outputs.items():
+            matrix, times, _ = sample_matrix(values)
+            if times is None and matrix.shape[0] > 1:
+                times = pd.RangeIndex(matrix.shape[0])
+            results[name] = (matrix, times)
+        return results
+
+    def _frame(self, columns: Dict[str, np.ndarray], times) -> pd.DataFrame:
+        # columns are arrays of shape (steps, parameters)
+        if times is None:
+            index = pd.Index(self.parameters, name='parameter')
+        else:
+            index = pd.MultiIndex.from_product([times, self.parameters], names=['time', 'parameter'])
+        return pd.DataFrame({name: values.ravel() for name, values in columns.items()}, index=index)
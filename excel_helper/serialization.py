@@ -0,0 +1,143 @@
+"""
+Versioned binary files of a ParameterRepository.
+
+A file holds the parameter definitions and optionally the cached samples of the parameters. Definitions are pickled
+(protocol 5), numpy buffers of samples are written out-of-band as aligned raw blocks after the pickled definitions. On
+load, the blocks can be memory-mapped, so the samples of a large repository are not read until they are used and the
+file can be opened by several processes that share the pages.
+
+Layout:
+
+    magic (8 bytes) | format version (uint32) | reserved (uint32) | header offset (uint64) | header length (uint64)
+    | pickled definitions | buffers, each aligned to 64 bytes | header (JSON)
+
+The header holds the offsets and lengths of the pickled definitions and of all buffers.
+
+Files are unpickled on load: only load files from trusted sources.
+"""
+import json
+import pickle
+import struct
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from excel_helper import ParameterRepository, ParameterScenarioSet, Parameter, time_series_values
+
+magic = b'EXHREPO\x00'
+format_version = 1
+prefix = struct.Struct('<8sIIQQ')
+alignment = 64
+
+
+def _encode_cache(values):
+    # pint quantities of the pint-pandas registry do not pickle, time series are stored as plain matrices
+    if isinstance(values, pd.DataFrame):
+        return {'layout': 'wide', 'values': values.to_numpy(), 'times': values.index, 'unit': values.attrs.get('unit')}
+    if isinstance(values, pd.Series) and hasattr(values.values, 'quantity'):
+        from excel_helper.accumulators import sample_matrix
+        matrix, times, unit = sample_matrix(values)
+        return {'layout': 'long', 'values': matrix, 'times': times, 'unit': unit,
+                'index_names': list(values.index.names)}
+    return {'layout': None, 'values': values}
+
+
+def _decode_cache(encoded):
+    if encoded['layout'] is None:
+        return encoded['values']
+    return time_series_values(encoded['values'], encoded['times'], encoded['unit'], layout=encoded['layout'],
+                              index_names=encoded.get('index_names'))
+
+
+def _parameter_records(repository: ParameterRepository, include_cache: bool) -> List[Dict]:
+    records = {}
+    for name, parameter_set in repository.parameter_sets.items():
+        for scenario, param in parameter_set.scenarios.items():
+            if id(param) in records:
+                records[id(param)]['scenarios'].append(scenario)
+                continue
+            records[id(param)] = {
+                'name': param.name, 'version': param.version, 'unit': param.unit, 'comment': param.comment,
+                'source': param.source, 'source_scenarios_string': param.source_scenarios_string,
+                'tags': param.tags, 'kwargs': dict(param.kwargs), 'scenarios': [scenario],
+                'processes': dict(param._processes) if param._processes else None,
+                'cache': _encode_cache(param.cache) if include_cache and param.cache is not None else None}
+    return list(records.values())
+
+
+def save_repository(repository: ParameterRepository, path, include_cache=False):
+    """
+    Write a repository to a file.
+
+    :param repository:
+    :param path: the file path
+    :param include_cache: also write the cached samples of the parameters
+    """
+    buffers = []
+    payload = pickle.dumps({'parameters': _parameter_records(repository, include_cache)}, protocol=5,
+                           buffer_callback=buffers.append)
+
+    with open(path, 'wb') as f:
+        f.write(prefix.pack(magic, format_version, 0, 0, 0))
+        blocks = []
+        for block in [payload] + [buffer.raw() for buffer in buffers]:
+            offset = f.tell()
+            if offset % alignment:
+                f.write(b'\x00' * (alignment - offset % alignment))
+                offset = f.tell()
+            f.write(block)
+            blocks.append([offset, memoryview(block).nbytes])
+
+        header = json.dumps({'payload': blocks[0], 'buffers': blocks[1:]}).encode()
+        header_offset = f.tell()
+        f.write(header)
+        f.seek(0)
+        f.write(prefix.pack(magic, format_version, 0, header_offset, len(header)))
+
+
+def load_repository(path, mmap_mode='r') -> ParameterRepository:
+    """
+    Read a repository from a file written with `save_repository`.
+
+    :param path: the file path
+    :param mmap_mode: 'r' or 'c' (copy-on-write) to memory-map the samples (see numpy.memmap), None to read them into
+        memory
+    :return: a new ParameterRepository
+    """
+    with open(path, 'rb') as f:
+        file_magic, version, _, header_offset, header_length = prefix.unpack(f.read(prefix.size))
+        if file_magic != magic:
+            raise ValueError(f'{path} is not a parameter repository file')
+        if version > format_version:
+            raise ValueError(f'{path} has format version {version}, only versions up to {format_version} are supported')
+        f.seek(header_offset)
+        header = json.loads(f.read(header_length))
+
+        if mmap_mode is None:
+            f.seek(0)
+            data = memoryview(bytearray(f.read(header_offset)))
+        else:
+            data = memoryview(np.memmap(f, dtype=np.uint8, mode=mmap_mode, shape=(header_offset,)))
+
+    offset, length = header['payload']
+    buffers = [data[o:o + n] for o, n in header['buffers']]
+    state = pickle.loads(data[offset:offset + length], buffers=buffers)
+
+    repository = ParameterRepository()
+    for record in state['parameters']:
+        param = Parameter(record['name'], tags=record['tags'], source_scenarios_string=record['source_scenarios_string'],
+                          unit=record['unit'], comment=record['comment'], source=record['source'],
+                          version=record['version'], **record['kwargs'])
+        if record['processes']:
+            for process_name, variable_names in record['processes'].items():
+                param.processes[process_name] = list(variable_names)
+        if record['cache'] is not None:
+            param.cache = _decode_cache(record['cache'])
+        # definitions were resolved when they were saved, they are restored as they are
+        for scenario in record['scenarios']:
+            param.scenario = scenario
+            repository.parameter_sets[param.name][scenario] = param
+        repository.tag_index.add(param)
+        repository.revision += 1
+    return repository
@@ -0,0 +1,375 @@
+"""
+A local sampling server that holds a loaded repository with warm caches.
+
+The server loads a workbook or a repository file once and answers sample and statistics requests for (parameter,
+scenario, settings) over HTTP. Samples of the same request are cached, so repeated requests from notebooks and batch
+jobs return the same values without sampling again. When the source file changes, the server loads it in the
+background and swaps the repository and its caches in one step; requests in flight finish on the previous repository.
+
+    server = SamplingServer('params.bin', port=8765).start()
+
+    client = SamplingClient('http://127.0.0.1:8765')
+    values = client.sample('energy', settings={'sample_size': 1000, 'use_time_series': True, 'times': times})
+    client.statistics('energy', settings=settings)
+
+or from the command line: `excel-helper serve params.bin --port 8765`.
+
+Endpoints:
+
+- GET /status: source, revision and number of parameters
+- GET /parameters: {name: [scenarios]}
+- POST /sample: JSON {name, scenario, settings, seed}. Returns the samples as a (steps, samples) float64 matrix in
+  the .npy format, with the unit in the X-Unit header. Clients can wrap the body without copying.
+- POST /statistics: JSON {name, scenario, settings, seed, quantiles}. Returns the `SummaryStatistics` per time step
+  as JSON in the 'split' orientation.
+- POST /reload: load the source now
+
+The settings are those of `Parameter.__call__`, with 'times' as a list of ISO dates and 'freq' as the frequency of the
+dates. Without 'freq' the frequency is inferred, which needs at least 3 dates. Requests with a 'seed' sample
+numpy.random distributions from their own random state, so identical requests are reproducible across server
+restarts. Distributions of other modules draw from the global random state of the server and are not reproducible.
+The server binds to localhost by default and does not authenticate requests.
+"""
+import io
+import json
+import logging
+import os
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from excel_helper import ParameterRepository, ParameterScenarioSet, time_series_values, coarsen_times
+from excel_helper.accumulators import sample_matrix, SummaryStatistics
+
+logger = logging.getLogger(__name__)
+
+
+def encode_settings(settings: Dict) -> Dict:
+    """
+    :return: the settings with the time index as a list of ISO dates and its frequency as 'freq'
+    """
+    encoded = dict(settings)
+    if encoded.get('times') is not None:
+        times = pd.DatetimeIndex(encoded['times'])
+        encoded['times'] = [t.isoformat() for t in times]
+        if times.freqstr:
+            encoded['freq'] = times.freqstr
+    return encoded
+
+
+def decode_settings(settings: Dict) -> Dict:
+    """
+    :return: the settings with the time index of the ISO dates and the frequency of 'freq' or the inferred frequency
+    :raises ValueError: if the frequency cannot be inferred
+    """
+    decoded = dict(settings)
+    freq = decoded.pop('freq', None)
+    if decoded.get('times') is not None:
+        if freq is None and len(decoded['times']) < 3:
+            raise ValueError(f"the frequency of {len(decoded['times'])} dates cannot be inferred, set 'freq' in the "
+                             f"settings")
+        decoded['times'] = pd.DatetimeIndex(decoded['times'], freq=freq or 'infer')
+    return decoded
+
+
+def npy_header(matrix: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.lib.format.write_array_header_1_0(buffer, np.lib.format.header_data_from_array_1_0(matrix))
+    return buffer.getvalue()
+
+
+def read_npy(body: bytes) -> np.ndarray:
+    """
+    :return: a read-only array that wraps the body of a .npy response without copying
+    """
+    buffer = io.BytesIO(body)
+    np.lib.format.read_magic(buffer)
+    shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(buffer)
+    array = np.frombuffer(body, dtype=dtype, offset=buffer.tell(), count=int(np.prod(shape)))
+    return array.reshape(shape, order='F' if fortran_order else 'C')
+
+
+class _State(object):
+    """
+    A loaded repository and the caches of its samples, swapped as a whole on reload.
+    """
+
+    def __init__(self, repository: ParameterRepository, revision: int, mtime: int):
+        self.repository = repository
+        self.revision = revision
+        self.mtime = mtime
+        # {request key: (matrix, unit)}
+        self.cache = {}
+        self.lock = threading.Lock()
+
+
+class SamplingServer(object):
+    """
+    Serve the samples of a repository over HTTP on localhost.
+    """
+
+    def __init__(self, source: Union[str, ParameterRepository], host='127.0.0.1', port=0, excel_handler='xlrd',
+                 watch=True, poll_interval=1.0, max_cached=1024):
+        """
+        :param source: the path of a workbook or repository file, or a ParameterRepository
+        :param host: the address to bind to
+        :param port: the port, 0 to pick a free port
+        :param excel_handler: the handler of workbooks
+        :param watch: reload the source file when it changes
+        :param poll_interval: seconds between checks of the source file
+        :param max_cached: the maximum number of cached sample requests, the oldest are dropped first
+        """
+        self.source = source
+        self.excel_handler = excel_handler
+        self.watch = watch and isinstance(source, str)
+        self.poll_interval = poll_interval
+        self.max_cached = max_cached
+        self._reload_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads = []
+        self.state = None
+        self.reload()
+
+        server = self
+
+        class Handler(_RequestHandler):
+            sampling_server = server
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def reload(self) -> bool:
+        """
+        Load the source and swap it in if it changed.
+
+        :return: True if a new repository was swapped in
+        """
+        with self._reload_lock:
+            if isinstance(self.source, ParameterRepository):
+                if self.state is not None:
+                    return False
+                self.state = _State(self.source, 1, None)
+                return True
+
+            mtime = os.stat(self.source).st_mtime_ns
+            if self.state is not None and self.state.mtime == mtime:
+                return False
+            from excel_helper.cli import load
+            repository = load(self.source, self.excel_handler)
+            revision = self.state.revision + 1 if self.state is not None else 1
+            # a single assignment, requests that hold the previous state finish on it
+            self.state = _State(repository, revision, mtime)
+            logger.info(f'loaded revision {revision} of {self.source}')
+            return True
+
+    def _watch(self):
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                self.reload()
+            except Exception:
+                logger.exception(f'reloading {self.source} failed, keeping the previous revision')
+
+    def samples(self, name, scenario=ParameterScenarioSet.default_scenario, settings=None, seed=None,
+                state: _State = None) -> Tuple[np.ndarray, str, _State]:
+        """
+        The samples of a request, from the cache of the current repository if they were requested before.
+
+        :param settings: the settings in their JSON form, see `encode_settings`
+        :param seed: the seed of the random state of numpy.random distributions, other modules draw from the global
+            random state
+        :return: tuple of (read-only matrix of shape (steps, samples), unit, the state that answered)
+        """
+        state = state if state is not None else self.state
+        settings = settings if settings else {}
+        key = json.dumps([name, scenario, settings, seed], sort_keys=True)
+        with state.lock:
+            cached = state.cache.get(key)
+        if cached is not None:
+            return cached[0], cached[1], state
+
+        param = state.repository.get_parameter(name, scenario)
+        generator = param.create_generator(decode_settings(settings), random_state=np.random.RandomState(seed))
+        matrix, _, unit = sample_matrix(generator.generate_values(**param.value_kwargs()))
+        matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+        matrix.flags.writeable = False
+        unit = unit if unit is not None else param.unit
+
+        with state.lock:
+            # the first answer of concurrent identical requests wins
+            cached = state.cache.setdefault(key, (matrix, unit))
+            while len(state.cache) > self.max_cached:
+                del state.cache[next(iter(state.cache))]
+        return cached[0], cached[1], state
+
+    def start(self) -> 'SamplingServer':
+        """
+        Serve in background threads.
+        """
+        self._stopped.clear()
+        self._threads = [threading.Thread(target=self.httpd.serve_forever, daemon=True)]
+        if self.watch:
+            self._threads.append(threading.Thread(target=self._watch, daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def serve_forever(self):
+        if self.watch:
+            threading.Thread(target=self._watch, daemon=True).start()
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self._stopped.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    sampling_server: SamplingServer
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        state = self.sampling_server.state
+        if self.path == '/status':
+            self._send_json({'source': str(self.sampling_server.source), 'revision': state.revision,
+                             'parameters': len(state.repository.parameter_sets)})
+        elif self.path == '/parameters':
+            self._send_json({name: list(parameter_set.scenarios)
+                             for name, parameter_set in state.repository.parameter_sets.items()})
+        else:
+            self._send_json({'error': f'unknown path {self.path}'}, 404)
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length)) if length else {}
+            if self.path == '/sample':
+                self._sample(request)
+            elif self.path == '/statistics':
+                self._statistics(request)
+            elif self.path == '/reload':
+                self._send_json({'reloaded': self.sampling_server.reload(),
+                                 'revision': self.sampling_server.state.revision})
+            else:
+                self._send_json({'error': f'unknown path {self.path}'}, 404)
+        except KeyError as e:
+            self._send_json({'error': f'unknown parameter or field {e}'}, 404)
+        except Exception as e:
+            logger.exception('request failed')
+            self._send_json({'error': str(e)}, 400)
+
+    def _samples(self, request):
+        return self.sampling_server.samples(request['name'],
+                                            request.get('scenario', ParameterScenarioSet.default_scenario),
+                                            request.get('settings'), request.get('seed'))
+
+    def _sample(self, request):
+        matrix, unit, state = self._samples(request)
+        header = npy_header(matrix)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-npy')
+        self.send_header('Content-Length', str(len(header) + matrix.nbytes))
+        self.send_header('X-Unit', unit if unit else '')
+        self.send_header('X-Revision', str(state.revision))
+        self.end_headers()
+        self.wfile.write(header)
+        self.wfile.write(memoryview(matrix).cast('B'))
+
+    def _statistics(self, request):
+        matrix, unit, state = self._samples(request)
+        settings = decode_settings(request.get('settings') or {})
+        statistics = SummaryStatistics(request.get('quantiles', (0.05, 0.5, 0.95))).update(matrix).to_frame()
+        if settings.get('use_time_series'):
+            times = settings['times']
+            if settings.get('time_resolution'):
+                times = coarsen_times(times, settings['time_resolution'])
+            statistics.index = pd.Index(times, name='time')
+        self._send_json({'index': [str(i) for i in statistics.index], 'columns': list(statistics.columns),
+                         'data': statistics.to_numpy().tolist(), 'unit': unit, 'revision': state.revision})
+
+
+class SamplingClient(object):
+    """
+    Client of a SamplingServer.
+    """
+
+    def __init__(self, url: str, timeout=60):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, path, data=None):
+        body = json.dumps(data).encode() if data is not None else None
+        request = urllib.request.Request(self.url + path, data=body, method='POST' if body is not None else 'GET',
+                                         headers={'Content-Type': 'application/json'})
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def status(self) -> Dict:
+        with self._request('/status') as response:
+            return json.loads(response.read())
+
+    def parameters(self) -> Dict:
+        with self._request('/parameters') as response:
+            return json.loads(response.read())
+
+    def reload(self) -> Dict:
+        with self._request('/reload', {}) as response:
+            return json.loads(response.read())
+
+    def matrix(self, name, scenario=ParameterScenarioSet.default_scenario, settings=None,
+               seed=None) -> Tuple[np.ndarray, str]:
+        """
+        :return: tuple of (read-only matrix of shape (steps, samples), unit)
+        """
+        request = {'name': name, 'scenario': scenario, 'settings': encode_settings(settings or {}), 'seed': seed}
+        with self._request('/sample', request) as response:
+            return read_npy(response.read()), response.headers.get('X-Unit') or None
+
+    def sample(self, name, scenario=ParameterScenarioSet.default_scenario, settings=None, seed=None):
+        """
+        :return: the samples in the layout of the settings, as `Parameter.__call__`
+        """
+        settings = settings or {}
+        matrix, unit = self.matrix(name, scenario, settings, seed)
+        if not settings.get('use_time_series'):
+            return matrix.ravel()
+        times = settings['times']
+        if settings.get('time_resolution'):
+            times = coarsen_times(times, settings['time_resolution'])
+        return time_series_values(matrix, times, unit, settings.get('layout', 'long'),
+                                  index_names=['time', 'samples'])
+
+    def statistics(self, name, scenario=ParameterScenarioSet.default_scenario, settings=None, seed=None,
+                   quantiles=(0.05, 0.5, 0.95)) -> pd.DataFrame:
+        request = {'name': name, 'scenario': scenario, 'settings': encode_settings(settings or {}), 'seed': seed,
+                   'quantiles': list(quantiles)}
+        with self._request('/statistics', request) as response:
+            data = json.loads(response.read())
+        index = pd.DatetimeIndex(data['index'], name='time') if (settings or {}).get('use_time_series') else None
+        frame = pd.DataFrame(data['data'], columns=data['columns'], index=index)
+        frame.attrs['unit'] = data['unit']
+        return frame
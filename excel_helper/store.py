@@ -0,0 +1,373 @@
+"""
+On-disk storage of parameter samples.
+
+A `ResultStore` keeps the samples of each parameter (per scenario) as a matrix of shape (steps, samples) on disk,
+together with the name, scenario, unit, tags and time index of the parameter. Samples are appended in blocks as they are
+produced, e.g. after every chunk of a run, so the samples of a run do not need to fit into memory. Reads are lazy: only
+the blocks of the requested samples are loaded.
+
+Backends:
+
+- 'npz' (default, no dependencies): appended samples are split into chunks of `chunk_size` samples, every chunk is a
+  compressed .npz file that is only decompressed when samples of it are read. The files cannot be memory-mapped, a
+  read decompresses every chunk it touches once.
+- 'npy': every block is an uncompressed .npy file, blocks are memory-mapped on read. Use it when reads should not
+  decompress, at the cost of the raw size on disk.
+- 'zarr': one compressed, chunked zarr array per parameter. Requires the `zarr` package (`pip install
+  excel-modelling-helper[zarr]`).
+
+A parameter that is defined for several scenarios is stored once per scenario.
+
+Usage:
+
+    store = ResultStore('results', mode='w')
+    for chunk in range(10):
+        repository.clear_cache()
+        model(repository, settings)
+        store.record(repository)
+
+    samples = ResultStore('results', mode='r').read('energy')
+    samples[:, :1000]  # numpy matrix of the first 1000 samples
+    samples.values(layout='wide')
+"""
+import json
+import logging
+import os
+import shutil
+from typing import Dict, List
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from excel_helper import ParameterRepository, ParameterScenarioSet, Parameter, TagQuery, time_series_values
+from excel_helper.accumulators import sample_matrix
+
+logger = logging.getLogger(__name__)
+
+store_format_version = 1
+
+
+def parameter_scenarios(parameter: Parameter) -> List[str]:
+    """
+    :return: the scenarios a parameter is defined for
+    """
+    if parameter.source_scenarios_string:
+        return [i.strip() for i in parameter.source_scenarios_string.split(',')]
+    return [parameter.scenario or ParameterScenarioSet.default_scenario]
+
+
+def _dataset_key(name, scenario):
+    return f"{quote(name, safe='')}/{quote(scenario, safe='')}"
+
+
+class ChunkedArray(object):
+    """
+    A read-only matrix of shape (steps, samples) that is concatenated from blocks of samples. Indexing only loads the
+    blocks that overlap the requested samples.
+    """
+
+    def __init__(self, blocks: List):
+        """
+        :param blocks: array-likes of shape (steps, n), e.g. memory-mapped arrays
+        """
+        self.blocks = blocks
+        self.offsets = np.cumsum([0] + [block.shape[1] for block in blocks])
+
+    @property
+    def shape(self):
+        return (self.blocks[0].shape[0] if self.blocks else 0), int(self.offsets[-1])
+
+    def __getitem__(self, item):
+        rows, columns = item if isinstance(item, tuple) else (item, slice(None))
+        if isinstance(columns, slice) and columns.indices(self.shape[1])[2] < 0:
+            columns = np.arange(self.shape[1])[columns]
+        if not isinstance(columns, slice):
+            return self._take(rows, np.atleast_1d(np.arange(self.shape[1])[columns]))
+
+        start, stop, step = columns.indices(self.shape[1])
+        parts = []
+        for block, offset in zip(self.blocks, self.offsets):
+            first, last = max(start, offset), min(stop, offset + block.shape[1])
+            if first < last:
+                parts.append(np.asarray(block[rows, first - offset:last - offset]))
+        if not parts:
+            return np.asarray(self.blocks[0][rows, 0:0]) if self.blocks else np.empty((0, 0))
+        return np.hstack(parts)[:, ::step] if np.ndim(parts[0]) == 2 else np.hstack(parts)[::step]
+
+    def _take(self, rows, columns: np.ndarray) -> np.ndarray:
+        # every block is loaded once for all of its columns, the columns keep the requested order
+        if not len(columns) or not self.blocks:
+            return self[rows, 0:0]
+        block_ids = np.searchsorted(self.offsets, columns, side='right') - 1
+        result = None
+        for block_id in np.unique(block_ids):
+            positions = np.flatnonzero(block_ids == block_id)
+            part = np.asarray(self.blocks[block_id][rows, columns[positions] - self.offsets[block_id]])
+            if result is None:
+                result = np.empty(part.shape[:-1] + (len(columns),), dtype=part.dtype)
+            result[..., positions] = part
+        return result
+
+
+class NpyBackend(object):
+    """
+    Blocks are stored as .npy files in a directory per dataset, next to a meta.json with the attributes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def keys(self) -> List[str]:
+        keys = []
+        for name in sorted(os.listdir(self.path)):
+            if os.path.isdir(os.path.join(self.path, name)):
+                for scenario in sorted(os.listdir(os.path.join(self.path, name))):
+                    if os.path.exists(os.path.join(self.path, name, scenario, 'meta.json')):
+                        keys.append(f'{name}/{scenario}')
+        return keys
+
+    def exists(self, key) -> bool:
+        return os.path.exists(os.path.join(self.path, key, 'meta.json'))
+
+    def read_meta(self, key) -> Dict:
+        with open(os.path.join(self.path, key, 'meta.json')) as f:
+            return json.load(f)
+
+    def append(self, key, meta: Dict, block: np.ndarray):
+        directory = os.path.join(self.path, key)
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, f"block-{len(meta['blocks']):06d}.npy"), block)
+        meta['blocks'].append(block.shape[1])
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    def open(self, key, meta: Dict):
+        return ChunkedArray([np.load(os.path.join(self.path, key, f'block-{i:06d}.npy'), mmap_mode='r')
+                             for i in range(len(meta['blocks']))])
+
+
+class CompressedBlock(object):
+    """
+    A block of samples in a compressed .npz file, it is decompressed on every read.
+    """
+
+    def __init__(self, path, shape):
+        self.path = path
+        self.shape = tuple(shape)
+
+    def __getitem__(self, item):
+        with np.load(self.path) as f:
+            return f['samples'][item]
+
+
+class NpzBackend(NpyBackend):
+    """
+    Blocks are split into chunks of samples that are stored as compressed .npz files.
+    """
+
+    def __init__(self, path, chunk_size):
+        super().__init__(path)
+        self.chunk_size = chunk_size
+
+    def append(self, key, meta: Dict, block: np.ndarray):
+        directory = os.path.join(self.path, key)
+        os.makedirs(directory, exist_ok=True)
+        meta['steps'] = block.shape[0]
+        for start in range(0, max(block.shape[1], 1), self.chunk_size):
+            chunk = block[:, start:start + self.chunk_size]
+            np.savez_compressed(os.path.join(directory, f"block-{len(meta['blocks']):06d}.npz"), samples=chunk)
+            meta['blocks'].append(chunk.shape[1])
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    def open(self, key, meta: Dict):
+        return ChunkedArray([CompressedBlock(os.path.join(self.path, key, f'block-{i:06d}.npz'), (meta['steps'], n))
+                             for i, n in enumerate(meta['blocks'])])
+
+
+class ZarrBackend(object):
+    """
+    One zarr array per dataset, chunked in blocks of samples and compressed with the default zarr compressor.
+    The attributes are kept in the array attributes.
+    """
+
+    def __init__(self, path, mode, chunk_size):
+        import zarr
+        self.group = zarr.open_group(path, mode='r' if mode == 'r' else 'a')
+        self.chunk_size = chunk_size
+
+    def keys(self) -> List[str]:
+        return sorted(f'{name}/{scenario}' for name, group in self.group.groups() for scenario in group.array_keys())
+
+    def exists(self, key) -> bool:
+        return key in self.group
+
+    def read_meta(self, key) -> Dict:
+        return dict(self.group[key].attrs)
+
+    def append(self, key, meta: Dict, block: np.ndarray):
+        if self.exists(key):
+            self.group[key].append(block, axis=1)
+        else:
+            self.group.create_dataset(key, data=block, chunks=(block.shape[0], self.chunk_size))
+        meta['blocks'].append(block.shape[1])
+        self.group[key].attrs.update(meta)
+
+    def open(self, key, meta: Dict):
+        return self.group[key]
+
+
+class StoredSamples(object):
+    """
+    The stored samples of a parameter. Index it like a numpy matrix of shape (steps, samples) to load samples.
+    """
+
+    def __init__(self, meta: Dict, array):
+        self.meta = meta
+        self.array = array
+        self.name = meta['name']
+        self.scenario = meta['scenario']
+        self.unit = meta['unit']
+        self.tags = meta['tags']
+        self.times = pd.DatetimeIndex(meta['times']) if meta['times'] is not None else None
+
+    @property
+    def shape(self):
+        return tuple(self.array.shape)
+
+    def __getitem__(self, item):
+        return self.array[item]
+
+    def values(self, samples: slice = slice(None), layout=None):
+        """
+        Load samples in the form that `Parameter.__call__` returns them.
+
+        :param samples: the samples to load
+        :param layout: 'long' or 'wide' for time series, defaults to the layout they were stored from
+        :return: a numpy array for parameters without time axis, otherwise a pint series or a wide DataFrame
+        """
+        matrix = np.asarray(self.array[:, samples])
+        if self.times is None:
+            return matrix[0]
+        return time_series_values(matrix, self.times, self.unit, layout=layout or self.meta['layout'],
+                                  index_names=self.meta['index_names'])
+
+
+class ResultStore(object):
+    """
+    Chunked storage of parameter samples on disk.
+
+    The default 'npz' backend trades memory-mapped reads for compressed files: reads only load the chunks of the
+    requested samples, but decompress them into memory. The 'npy' backend memory-maps its blocks.
+    """
+    backend_name: str
+
+    def __init__(self, path, mode='a', backend='npz', chunk_size: int = 10000):
+        """
+        :param path: the directory of the store
+        :param mode: 'r' to read, 'a' to read and append, 'w' to replace an existing store
+        :param backend: 'npz', 'npy' or 'zarr', ignored when an existing store is opened
+        :param chunk_size: the number of samples per compressed chunk of the npz and zarr backends
+        """
+        self.path = path
+        self.mode = mode
+        info_file = os.path.join(path, 'store.json')
+
+        if mode == 'w' and os.path.exists(path):
+            if not os.path.exists(info_file):
+                raise ValueError(f'{path} exists and is not a result store')
+            shutil.rmtree(path)
+
+        if os.path.exists(info_file):
+            with open(info_file) as f:
+                info = json.load(f)
+            if info['version'] > store_format_version:
+                raise ValueError(f'{path} has store format version {info["version"]}, '
+                                 f'only versions up to {store_format_version} are supported')
+            backend = info['backend']
+        elif mode == 'r':
+            raise FileNotFoundError(f'No result store found at {path}')
+        else:
+            os.makedirs(path, exist_ok=True)
+            with open(info_file, 'w') as f:
+                json.dump({'version': store_format_version, 'backend': backend}, f)
+
+        if backend == 'npz':
+            self.backend = NpzBackend(path, chunk_size)
+        elif backend == 'npy':
+            self.backend = NpyBackend(path)
+        elif backend == 'zarr':
+            self.backend = ZarrBackend(path, mode, chunk_size)
+        else:
+            raise ValueError(f'Unknown result store backend {backend}')
+        self.backend_name = backend
+
+    def append(self, parameter: Parameter, values=None):
+        """
+        Append a block of samples of a parameter.
+
+        :param parameter: the parameter, its name, scenario, unit and tags are stored with the samples
+        :param values: the samples, defaults to the cache of the parameter
+        """
+        if self.mode == 'r':
+            raise ValueError('The result store is opened read only')
+        values = parameter.cache if values is None else values
+        if values is None:
+            raise ValueError(f'No samples for parameter {parameter.name}')
+
+        matrix, times, unit = sample_matrix(values)
+        matrix = np.ascontiguousarray(matrix)
+        for scenario in parameter_scenarios(parameter):
+            self._append(parameter, scenario, values, matrix, times, unit)
+
+    def _append(self, parameter: Parameter, scenario, values, matrix, times, unit):
+        key = _dataset_key(parameter.name, scenario)
+        if self.backend.exists(key):
+            meta = self.backend.read_meta(key)
+            stored_times = pd.DatetimeIndex(meta['times']) if meta['times'] is not None else None
+            if (times is None) != (stored_times is None) or (times is not None and not times.equals(stored_times)):
+                raise ValueError(f'The time index of the samples of {parameter.name} differs from the stored samples')
+        else:
+            meta = {'name': parameter.name, 'scenario': scenario, 'unit': unit or parameter.unit,
+                    'tags': parameter.tags,
+                    'times': [t.isoformat() for t in times] if times is not None else None,
+                    'layout': 'wide' if isinstance(values, pd.DataFrame) else 'long',
+                    'index_names': list(values.index.names) if isinstance(values, pd.Series) else None,
+                    'blocks': []}
+        self.backend.append(key, meta, matrix)
+
+    def record(self, repository: ParameterRepository, names: List[str] = None):
+        """
+        Append the cached samples of the parameters of a repository. Parameters without samples are skipped.
+
+        :param repository:
+        :param names: the names of the parameters to store or a TagQuery that selects them, defaults to all
+        """
+        if names is None or isinstance(names, TagQuery):
+            names = repository.names(names)
+        for name in names:
+            # a parameter that is defined for several scenarios is stored once
+            for param in {id(p): p for p in repository.parameter_sets[name].scenarios.values()}.values():
+                if param.cache is not None:
+                    self.append(param)
+
+    def keys(self) -> List[tuple]:
+        """
+        :return: list of the (name, scenario) of all stored parameters
+        """
+        return [(meta['name'], meta['scenario']) for meta in map(self.backend.read_meta, self.backend.keys())]
+
+    def __contains__(self, item):
+        name, scenario = item if isinstance(item, tuple) else (item, ParameterScenarioSet.default_scenario)
+        return self.backend.exists(_dataset_key(name, scenario))
+
+    def read(self, name, scenario=ParameterScenarioSet.default_scenario) -> StoredSamples:
+        """
+        Open the stored samples of a parameter without loading them.
+        """
+        key = _dataset_key(name, scenario)
+        if not self.backend.exists(key):
+            raise KeyError(f'{name} in scenario {scenario} not found in result store {self.path}')
+        meta = self.backend.read_meta(key)
+        return StoredSamples(meta, self.backend.open(key, meta))
@@ -0,0 +1,285 @@
+"""
+Validation of parameter definitions at load time.
+
+Errors in a definition row, such as a missing ref date, a ref value that is not a number, malformed interp JSON or a
+distribution that does not resolve, otherwise only raise when the parameter is sampled. `validate_definitions` checks
+the definition rows of a workbook column by column and reports all errors at once:
+
+    loader = ExcelParameterLoader(filename='params.xlsx', validate=True)
+    try:
+        loader.load_into_repo(repository)
+    except DefinitionError as e:
+        print('\\n'.join(e.errors))
+
+    errors, warnings = validate_definitions(loader.load_parameter_definitions(), loader.definition_version)
+
+The rows are checked for their version:
+
+- all rows: duplicate (variable, scenario) pairs and dates that are not dates or before 1900 or after 2200
+- version 1: module and distribution are set and resolve, the params of numpy.random distributions and the CAGR
+  are numbers and the start date is not after the end date
+- version 2: the type is 'exp' or 'interp', the columns that the type requires are set and numbers, interp ref values
+  are JSON objects of '%Y-%m-%d' dates and numbers with at least two points and the interp kind is known
+
+Rows with an expression and title rows (without a distribution, type or expression) are only checked for duplicates
+and dates. Ref dates that are not the first of a month are warnings.
+"""
+import datetime
+import json
+from operator import attrgetter
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from excel_helper import DistributionFunctionGenerator, ParameterScenarioSet
+
+"the interpolation kinds of scipy.interpolate.interp1d"
+interp_kinds = ['linear', 'nearest', 'nearest-up', 'zero', 'slinear', 'quadratic', 'cubic', 'previous', 'next']
+
+"{type: columns the type requires} of version 2 definitions"
+required_columns = {
+    'exp': ['ref value', 'ref date', 'mean growth', 'variability growth', 'initial_value_proportional_variation'],
+    'interp': ['ref value', 'ref date', 'param', 'variability growth', 'initial_value_proportional_variation']}
+
+"columns that must be numbers if they are set"
+numeric_columns = {1: ['CAGR'],
+                   2: ['mean growth', 'variability growth', 'initial_value_proportional_variation']}
+
+date_columns = {1: ['ref date', 'start date', 'end date'], 2: ['ref date']}
+
+"the first and last year of dates"
+date_range = (1900, 2200)
+
+_number_types = [int, float, np.int64, np.float64]
+_date_types = [datetime.datetime, datetime.date, pd.Timestamp]
+
+
+class DefinitionError(ValueError):
+    """
+    Raised with all errors of the definitions of a workbook.
+    """
+
+    def __init__(self, errors: List[str], warnings: List[str] = None):
+        self.errors = errors
+        self.warnings = warnings if warnings is not None else []
+        super().__init__(f'{len(errors)} invalid definitions:\n' + '\n'.join(errors))
+
+
+def definition_frame(definitions: List[Dict]) -> pd.DataFrame:
+    """
+    :return: the definitions as columns of objects, indexed by row (the first definition is row 2)
+    """
+    frame = pd.DataFrame(list(definitions), dtype=object)
+    frame.index = np.arange(2, len(frame) + 2)
+    return frame
+
+
+def _column(frame, name) -> pd.Series:
+    if name in frame:
+        return frame[name]
+    return pd.Series('', index=frame.index, dtype=object)
+
+
+def _empty(column) -> pd.Series:
+    return column.isna() | column.map(type).eq(str) & column.astype(str).str.strip().eq('')
+
+
+def _numbers(column) -> pd.Series:
+    return column.map(type).isin(_number_types) & column.notna()
+
+
+def _float_values(column) -> pd.Series:
+    # numbers and strings that float() accepts
+    return pd.to_numeric(column.where(column.map(type).isin(_number_types + [str])), errors='coerce').notna()
+
+
+def _number_lists(column) -> pd.Series:
+    # comma-separated numbers of choice distributions
+    strings = column.where(column.map(type).eq(str), '').str.split(',', expand=True)
+    if strings.empty:
+        return pd.Series(False, index=column.index)
+    tokens = strings.stack().str.strip()
+    return pd.to_numeric(tokens, errors='coerce').notna().groupby(level=0).all().reindex(column.index,
+                                                                                       fill_value=False)
+
+
+def _interp_error(value):
+    try:
+        points = json.loads(value.strip())
+    except ValueError as e:
+        return f'is not JSON: {e}'
+    if not isinstance(points, dict) or len(points) < 2:
+        return 'is not an object of at least two dates and values'
+    for date, point in points.items():
+        try:
+            datetime.datetime.strptime(date, '%Y-%m-%d')
+        except ValueError:
+            return f'has a date {date!r} that is not %Y-%m-%d'
+        if type(point) not in (int, float):
+            return f'has a value {point!r} that is not a number'
+    return None
+
+
+class _Report(object):
+
+    def __init__(self, frame, locations=None):
+        self.frame = frame
+        self.locations = locations
+        self.variables = _column(frame, 'variable')
+        self.errors = []
+        self.warnings = []
+
+    def add(self, messages, mask, message, values=None):
+        """
+        Add a message for each row in the mask.
+
+        :param message: formatted with the variable and the value of the row
+        :param values: the column of the values of the rows
+        """
+        values = values if values is not None else self.variables
+        for row in mask.index[mask.to_numpy(dtype=bool)]:
+            messages.append((row, message.format(variable=self.variables[row], value=values[row])))
+
+    def result(self) -> Tuple[List[str], List[str]]:
+        def label(row):
+            if self.locations is None:
+                return f'row {row}'
+            sheet, sheet_row = self.locations[row - 2]
+            return f'{sheet} row {sheet_row}'
+
+        def formatted(messages):
+            return [f'{label(row)}: {message}' for row, message in sorted(messages, key=lambda m: m[0])]
+
+        return formatted(self.errors), formatted(self.warnings)
+
+
+def _dates(column) -> pd.Series:
+    return column.map(type).isin(_date_types)
+
+
+def _check_dates(report, frame, version):
+    for name in date_columns[version]:
+        column = _column(frame, name)
+        is_date = _dates(column)
+        report.add(report.errors, ~_empty(column) & ~is_date, f'{name} {{value!r}} of <{{variable}}> is not a date',
+                   column)
+        dates = column[is_date]
+        years = dates.map(attrgetter('year'))
+        report.add(report.errors, (years < date_range[0]) | (years > date_range[1]),
+                   f'{name} {{value}} of <{{variable}}> is out of range', column)
+        if name == 'ref date':
+            report.add(report.warnings, dates.map(attrgetter('day')).ne(1),
+                       f'{name} {{value}} of <{{variable}}> is not the first of a month', column)
+    if version == 1:
+        start, end = _column(frame, 'start date'), _column(frame, 'end date')
+        both = _dates(start) & _dates(end)
+        report.add(report.errors, pd.to_datetime(start[both]) > pd.to_datetime(end[both]),
+                   'start date {value} of <{variable}> is after the end date', start)
+
+
+def _check_distributions(report, frame):
+    modules, distributions = _column(frame, 'module'), _column(frame, 'distribution')
+    report.add(report.errors, _empty(modules) & ~_empty(distributions), '<{variable}> has no module')
+    report.add(report.errors, ~_empty(modules) & _empty(distributions), '<{variable}> has no distribution')
+
+    # every distribution function is resolved once
+    functions = pd.DataFrame({'module': modules, 'distribution': distributions})
+    pairs = functions[~_empty(modules) & ~_empty(distributions)].groupby(['module', 'distribution']).groups
+    for (module, distribution), rows in pairs.items():
+        try:
+            DistributionFunctionGenerator.instantiate_distribution_function(module, distribution)
+        except Exception as e:
+            report.add(report.errors, pd.Series(True, index=rows),
+                       f'distribution {module}.{distribution} of <{{variable}}> does not resolve: {e}')
+
+    numpy_random = modules.eq('numpy.random')
+    choice = distributions.eq('choice')
+    for name in ('param 1', 'param 2', 'param 3'):
+        column = _column(frame, name)
+        valid = _numbers(column) | _empty(column)
+        if name == 'param 1':
+            valid |= choice & _number_lists(column)
+        report.add(report.errors, numpy_random & ~valid, f'{name} {{value!r}} of <{{variable}}> is not a number',
+                   column)
+
+
+def _check_types(report, frame):
+    types = _column(frame, 'type')
+    report.add(report.errors, ~types.isin(list(required_columns)), 'type {value!r} of <{variable}> is not '
+               + ' or '.join(repr(t) for t in required_columns), types)
+
+    for type_, columns in required_columns.items():
+        rows = types.eq(type_)
+        for name in columns:
+            report.add(report.errors, rows & _empty(_column(frame, name)),
+                       f'<{{variable}}> of type {type_} has no {name}')
+
+    ref_values = _column(frame, 'ref value')
+    report.add(report.errors, types.eq('exp') & ~_empty(ref_values) & ~_float_values(ref_values),
+               'ref value {value!r} of <{variable}> is not a number', ref_values)
+
+    interp = types.eq('interp') & ~_empty(ref_values)
+    interp_errors = ref_values[interp].map(lambda v: _interp_error(v) if isinstance(v, str) else 'is not JSON')
+    for row, error in interp_errors.dropna().items():
+        report.errors.append((row, f'ref value of <{report.variables[row]}> {error}'))
+
+    kinds = _column(frame, 'param')
+    report.add(report.errors, types.eq('interp') & ~_empty(kinds) & ~kinds.isin(interp_kinds),
+               'param {value!r} of <{variable}> is not an interpolation kind', kinds)
+
+
+def validate_definitions(definitions: List[Dict], version=1,
+                         locations: List[Tuple[str, int]] = None) -> Tuple[List[str], List[str]]:
+    """
+    Check definition rows for errors that would otherwise raise when the parameters are sampled.
+
+    :param definitions: rows as returned by `ExcelParameterLoader.load_parameter_definitions`
+    :param version: the definition version of the rows
+    :param locations: the (sheet, row) of each definition (see `ExcelHandler.locations`), defaults to the position of
+        the definition (the first definition is row 2)
+    :return: tuple of (errors, warnings) of the form 'row 3: message' or 'Sheet1 row 3: message', sorted by row
+    """
+    version = int(version)
+    frame = definition_frame(definitions)
+    if locations is not None and len(locations) != len(frame):
+        locations = None
+    report = _Report(frame, locations)
+    if frame.empty:
+        return report.result()
+
+    scenarios = _column(frame, 'scenario').where(~_empty(_column(frame, 'scenario')),
+                                                 ParameterScenarioSet.default_scenario)
+    keys = pd.DataFrame({'variable': report.variables, 'scenario': scenarios})
+    report.add(report.errors, keys.duplicated(), 'duplicate entry for parameter <{variable}> and <{value}> scenario',
+               scenarios)
+
+    expressions = ~_empty(_column(frame, 'expression'))
+    if version == 1:
+        sampled = ~expressions & ~(_empty(_column(frame, 'module')) & _empty(_column(frame, 'distribution')))
+    else:
+        sampled = ~expressions & ~_empty(_column(frame, 'type'))
+    sampled = frame[sampled]
+
+    _check_dates(report, frame, version)
+    for name in numeric_columns[version]:
+        column = _column(sampled, name)
+        report.add(report.errors, ~_empty(column) & ~_numbers(column),
+                   f'{name} {{value!r}} of <{{variable}}> is not a number', column)
+    if version == 1:
+        _check_distributions(report, sampled)
+    else:
+        _check_types(report, sampled)
+    return report.result()
+
+
+def check(definitions: List[Dict], version=1, locations: List[Tuple[str, int]] = None) -> List[str]:
+    """
+    Validate definition rows and raise a DefinitionError with all errors.
+
+    :return: the warnings
+    """
+    errors, warnings = validate_definitions(definitions, version, locations)
+    if errors:
+        raise DefinitionError(errors, warnings)
+    return warnings
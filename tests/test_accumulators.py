@@ -0,0 +1,120 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from excel_helper import Parameter, LazyTimeSeriesParameter
+from excel_helper.accumulators import MeanVariance, MinMax, Histogram, QuantileSketch, SummaryStatistics, \
+    Accumulator, sample_matrix
+
+
+class AccumulatorsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.values = np.random.RandomState(1).lognormal(size=(4, 20000))
+        self.blocks = np.array_split(self.values, 7, axis=1)
+
+    def test_mean_variance(self):
+        streamed = MeanVariance()
+        for block in self.blocks:
+            streamed.update(block)
+
+        assert streamed.count == 20000
+        assert np.allclose(streamed.mean, self.values.mean(axis=1))
+        assert np.allclose(streamed.variance, self.values.var(axis=1, ddof=1))
+
+    def test_merge(self):
+        left, right = MeanVariance(), MeanVariance()
+        for block in self.blocks[:3]:
+            left.update(block)
+        for block in self.blocks[3:]:
+            right.update(block)
+        merged = MeanVariance().merge(left).merge(right)
+
+        assert np.allclose(merged.mean, self.values.mean(axis=1))
+        assert np.allclose(merged.std, self.values.std(axis=1, ddof=1))
+
+    def test_min_max(self):
+        extremes = MinMax()
+        for block in self.blocks:
+            extremes.update(block)
+        assert (extremes.min == self.values.min(axis=1)).all()
+        assert (extremes.max == self.values.max(axis=1)).all()
+
+    def test_histogram(self):
+        edges = [0, 1, 2, 5]
+        histograms = [Histogram(edges).update(block) for block in self.blocks]
+        merged = Histogram(edges)
+        for histogram in histograms:
+            merged.merge(histogram)
+
+        for step in range(4):
+            expected, _ = np.histogram(self.values[step], bins=edges)
+            assert (merged.bin_counts[step] == expected).all()
+            assert merged.overflow[step] == (self.values[step] > 5).sum()
+        assert (merged.underflow == 0).all()
+
+        with self.assertRaises(ValueError):
+            merged.merge(Histogram([0, 1]))
+
+    def test_quantile_sketch_exact_for_small_samples(self):
+        values = self.values[:, :300]
+        sketch = QuantileSketch(k=200).update(values)
+
+        for q in [0, .1, .5, .99, 1]:
+            assert (sketch.quantile(q) == np.quantile(values, q, axis=1, method='inverted_cdf')).all()
+
+    def test_quantile_sketch_accuracy(self):
+        sketches = [QuantileSketch(k=200, seed=i).update(block) for i, block in enumerate(self.blocks)]
+        merged = sketches[0]
+        for sketch in sketches[1:]:
+            merged.merge(sketch)
+
+        assert merged.count == 20000
+        assert sum(level.shape[1] for level in merged.levels) < 2000
+        estimates = merged.quantile([.05, .5, .95])
+        for i, q in enumerate([.05, .5, .95]):
+            # rank error below 2 percent
+            ranks = (self.values < estimates[i].reshape(-1, 1)).mean(axis=1)
+            assert (np.abs(ranks - q) < .02).all()
+
+    def test_summary_statistics_from_parameter(self):
+        p = Parameter('a', module_name='numpy.random', distribution_name='uniform', param_a=0, param_b=1, unit='kg')
+        settings = {'sample_size': 1000, 'use_time_series': True,
+                    'times': pd.date_range('2009-01-01', '2009-12-01', freq='MS')}
+
+        summary = SummaryStatistics(histogram_edges=np.linspace(0, 1, 11))
+        for layout in ['long', 'wide']:
+            p.cache = None
+            summary.update(p(dict(settings, layout=layout)))
+        df = summary.to_frame()
+
+        assert len(df) == 12
+        assert (df['count'] == 2000).all()
+        assert df.index[0] == pd.Timestamp('2009-01-01')
+        assert (np.abs(df['mean'] - .5) < .05).all()
+        assert (np.abs(df[0.5] - .5) < .05).all()
+        assert (summary.histogram.bin_counts.sum(axis=1) == 2000).all()
+
+    def test_sliced_series(self):
+        p = Parameter('a', module_name='numpy.random', distribution_name='uniform', param_a=0, param_b=1, unit='kg')
+        settings = {'sample_size': 3, 'use_time_series': True,
+                    'times': pd.date_range('2009-01-01', '2009-12-01', freq='MS')}
+        values = p(settings)
+        window = LazyTimeSeriesParameter(p, settings).window('2009-03-01', '2009-06-01')
+
+        for sliced in [values.iloc[6:18], window]:
+            matrix, times, unit = sample_matrix(sliced)
+            assert matrix.shape == (len(sliced) // 3, 3)
+            assert times[0] == sliced.index[0][0]
+            assert unit == 'kilogram'
+        assert SummaryStatistics().update(window).to_frame().index.equals(pd.date_range('2009-03-01', '2009-06-01',
+                                                                                       freq='MS'))
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            Accumulator()
+
+
+if __name__ == '__main__':
+    unittest.main()
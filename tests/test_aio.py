@@ -0,0 +1,82 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from excel_helper import ParameterRepository, ExcelParameterLoader
+from excel_helper.aio import load_workbooks
+from excel_helper.expressions import ExpressionGraph
+
+
+class LoadWorkbooksTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.files = []
+        for region in ['uk', 'fr']:
+            self.files.append(os.path.join(self.directory, f'{region}.xlsx'))
+            shutil.copy('test_v2.xlsx', self.files[-1])
+        self.expected = ParameterRepository()
+        ExcelParameterLoader(filename='./test_v2.xlsx').load_into_repo(self.expected)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_namespaces(self):
+        repository = asyncio.run(load_workbooks(self.files, namespace='file'))
+
+        assert len(repository.parameter_sets) == 2 * len(self.expected.parameter_sets)
+        assert repository['uk__a'].kwargs == self.expected['a'].kwargs
+        assert repository.get_parameter('fr__a', 's1').kwargs == self.expected.get_parameter('a', 's1').kwargs
+        assert repository.get_parameter('fr__a', 's1').unit == self.expected.get_parameter('a', 's1').unit
+
+    def test_namespaced_expressions(self):
+        files = []
+        for region in ['uk', 'fr']:
+            files.append(os.path.join(self.directory, f'{region}_expressions.xlsx'))
+            shutil.copy('test_expressions.xlsx', files[-1])
+        with ThreadPoolExecutor(2) as executor:
+            repository = asyncio.run(load_workbooks(files, namespace=lambda f: os.path.basename(f)[:2],
+                                                    executor=executor))
+        assert repository['uk__cost'].kwargs['expression'] == 'uk__energy * uk__price'
+
+        settings = {'sample_size': 4, 'sample_mean_value': True}
+        values = ExpressionGraph(repository).evaluate(settings, names=['uk__cost', 'fr__energy_per_unit'])
+        assert np.allclose(values['uk__cost'], 120000 * .15)
+        assert np.allclose(values['fr__energy_per_unit'], 120)
+
+        with ThreadPoolExecutor(2) as executor, self.assertRaises(ValueError):
+            asyncio.run(load_workbooks(files, namespace='file', separator='.', executor=executor))
+
+    def test_conflicts(self):
+        with ThreadPoolExecutor(2) as executor:
+            with self.assertRaises(ValueError):
+                asyncio.run(load_workbooks(self.files, executor=executor))
+
+            first = asyncio.run(load_workbooks(self.files, on_conflict='first', executor=executor))
+            last = asyncio.run(load_workbooks(self.files, on_conflict='last', executor=executor))
+        assert sorted(first.parameter_sets) == sorted(self.expected.parameter_sets)
+        assert first['a'].kwargs == last['a'].kwargs == self.expected['a'].kwargs
+
+    def test_order(self):
+        from openpyxl import load_workbook
+        wb = load_workbook(self.files[1])
+        for row in wb['Sheet1'].iter_rows(min_row=2):
+            if row[0].value == 'a' and not row[1].value:
+                row[3].value = 99
+        wb.save(self.files[1])
+
+        # the later file in the list wins, independent of which file is parsed first
+        with ThreadPoolExecutor(2) as thread_pool:
+            for executor in [thread_pool, None]:
+                last = asyncio.run(load_workbooks(self.files, on_conflict='last', executor=executor))
+                first = asyncio.run(load_workbooks(list(reversed(self.files)), on_conflict='first',
+                                                   executor=executor))
+                assert last['a'].kwargs['ref value'] == first['a'].kwargs['ref value'] == 99
+
+if __name__ == '__main__':
+    unittest.main()
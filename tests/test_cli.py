@@ -0,0 +1,87 @@
+import contextlib
+import datetime
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from excel_helper import ParameterRepository, ExcelParameterLoader
+from excel_helper.cli import main
+from excel_helper.validation import validate_definitions
+
+
+class CliTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.bundle = os.path.join(self.directory, 'params.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_main(self, *args):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            code = main(list(args))
+        return code, output.getvalue()
+
+    def test_compile(self):
+        code, output = self.run_main('compile', 'test_v2.xlsx', '-o', self.bundle)
+        assert code == 0
+        assert 'written to' in output
+
+        repository = ParameterRepository.load(self.bundle)
+        loaded = ParameterRepository()
+        ExcelParameterLoader(filename='./test_v2.xlsx').load_into_repo(loaded)
+        assert sorted(repository.parameter_sets) == sorted(loaded.parameter_sets)
+        assert repository['a'].kwargs == loaded['a'].kwargs
+
+        code, output = self.run_main('inspect', self.bundle)
+        assert code == 0
+        assert output.startswith(f'{len(loaded.parameter_sets)} parameters')
+
+    def test_validate_definitions(self):
+        errors, warnings = validate_definitions([
+            {'variable': 'a', 'scenario': '', 'ref date': datetime.datetime(2020, 1, 1)},
+            {'variable': 'a', 'scenario': 's1', 'ref date': datetime.datetime(2020, 1, 15)},
+            {'variable': 'a', 'scenario': 's1', 'ref date': ''},
+            {'variable': 'b', 'scenario': '', 'ref date': '2020-01-01'}])
+        assert errors == ['row 4: duplicate entry for parameter <a> and <s1> scenario',
+                          "row 5: ref date '2020-01-01' of <b> is not a date"]
+        assert len(warnings) == 1
+
+    def test_validate(self):
+        from openpyxl import Workbook
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.title = 'params'
+        sheet.append(['variable', 'scenario', 'module', 'distribution', 'param 1', 'param 2', 'ref date'])
+        sheet.append(['a', '', 'numpy.random', 'uniform', 1, 2, 'soon'])
+        sheet.append(['a', '', 'numpy.random', 'uniform', 1, 2, None])
+        filename = os.path.join(self.directory, 'bad.xlsx')
+        workbook.save(filename)
+
+        code, output = self.run_main('validate', filename, '--handler', 'openpyxl')
+        assert code == 1
+        assert "error: params row 2: ref date 'soon' of <a> is not a date" in output
+        assert 'error: params row 3: duplicate entry for parameter <a> and <default> scenario' in output
+
+    def test_bench(self):
+        code, output = self.run_main('bench', 'test_v2.xlsx', '--samples', '10', '--top', '2')
+        assert code == 0
+        assert 'definitions/s' in output
+        assert 'samples/s' in output
+
+    def test_workbook_libraries_not_imported(self):
+        # loading a bundle does not need xlrd
+        self.run_main('compile', 'test_v2.xlsx', '-o', self.bundle)
+        code = ("import sys; from excel_helper import ParameterRepository; "
+                f"ParameterRepository.load({self.bundle!r}); assert 'xlrd' not in sys.modules")
+        assert subprocess.run([sys.executable, '-c', code]).returncode == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import datetime
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from excel_helper import ExcelParameterLoader, ParameterRepository, Parameter, events
+from excel_helper.validation import DefinitionError
+
+
+class EventsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parameter = Parameter('a', version=2, type='exp', unit='kg', **{'ref value': 1.},
+                                   initial_value_proportional_variation=5, growth_factor=0, ef_growth_factor=0,
+                                   ref_date=datetime.datetime(2020, 1, 1), param='')
+        self.settings = {'sample_size': 100, 'use_time_series': True,
+                         'times': pd.date_range('2020-01-01', '2020-12-01', freq='MS')}
+
+    def test_rows(self):
+        counter = events.EventCounter(keep=1)
+        with events.subscribed(counter, events.row_loaded):
+            ExcelParameterLoader(filename='./test_v2.xlsx').load_into_repo(repository=ParameterRepository())
+
+        assert counter.counts['row_loaded'] > 0
+        assert set(counter.payloads['row_loaded'][0]) == {'variable', 'sheet', 'row', 'values'}
+        assert not events._subscribers
+
+    def test_duplicate_payloads(self):
+        directory = tempfile.mkdtemp()
+        logger = logging.getLogger('excel_helper')
+        level = logger.level
+        try:
+            filename = os.path.join(directory, 'duplicates.csv')
+            with open(filename, 'w') as f:
+                f.write('variable,scenario,module,distribution,param 1,param 2\n'
+                        'a,,numpy.random,uniform,0,1\n'
+                        'a,,numpy.random,uniform,0,1\n'
+                        'b,s1,numpy.random,uniform,0,1\n'
+                        'b,s1,numpy.random,uniform,0,1\n'
+                        'c,,numpy.random,uniform,0,1\n')
+            logger.setLevel(logging.CRITICAL)
+            received = []
+            with events.subscribed(received.append, events.duplicate_found):
+                with self.assertRaises(DefinitionError):
+                    ExcelParameterLoader(filename=filename, excel_handler='csv',
+                                         validate=True).load_into_repo(ParameterRepository())
+        finally:
+            logger.setLevel(level)
+            shutil.rmtree(directory)
+
+        # the payloads are built after all rows were read
+        assert [event.payload for event in received] == [
+            {'variable': 'a', 'scenario': 'n/a', 'sheet': 'duplicates.csv'},
+            {'variable': 'b', 'scenario': 's1', 'sheet': 'duplicates.csv'}]
+
+    def test_lazy_payload(self):
+        built = []
+        events.emit(events.row_loaded, lambda: built.append(1))
+        assert not built
+
+        counter = events.EventCounter()
+        with events.subscribed(counter):
+            events.emit(events.row_loaded, lambda: built.append(1))
+        assert counter.counts == {'row_loaded': 1}
+        assert not built
+
+    def test_negative_values(self):
+        received = []
+        with events.subscribed(received.append, events.negative_values):
+            with self.assertLogs('excel_helper', level='WARNING') as logs:
+                self.parameter(self.settings)
+
+        assert received[0].payload['name'] == 'a'
+        assert received[0].payload['time'] == pd.Timestamp('2020-01-01')
+        assert received[0].payload['steps'] == 12
+        assert logs.output[0] == 'WARNING:excel_helper:Negative values for parameter a from 2020-01-01 00:00:00'
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,7 +5,7 @@ import pandas as pd
 import numpy as np
 from dateutil import relativedelta
 
-from excel_helper import ExcelParameterLoader, ParameterRepository, growth_coefficients
+from excel_helper import ExcelParameterLoader, ParameterRepository, growth_coefficients, coarsen_times
 
 
 class CSVParameterLoaderTestCase(unittest.TestCase):
@@ -335,3 +335,43 @@ class TestCAGRCalculation(unittest.TestCase):
 
         # the last row has positive coefficients
         assert np.all(a[-1] == np.ones((samples, 1)) * pow(1 + alpha, float(total_months - 1 - ref_row_idx) / 12))
+
+    def test_annual_and_quarterly_steps_match_monthly(self):
+        """
+        Coarse time axes must carry the same growth as the monthly axis at the dates they share.
+
+        :return:
+        """
+        samples = 2
+        alpha = 0.1
+        ref_date = date(2010, 7, 1)
+        start_date = date(2009, 1, 1)
+        end_date = date(2013, 1, 1)
+
+        monthly = growth_coefficients(start_date, end_date, ref_date, alpha, samples)
+        quarterly = growth_coefficients(start_date, end_date, ref_date, alpha, samples, 3)
+        annual = growth_coefficients(start_date, end_date, ref_date, alpha, samples, 12)
+
+        assert quarterly.shape == (17, samples)
+        assert annual.shape == (5, samples)
+        assert np.allclose(quarterly, monthly[::3])
+        assert np.allclose(annual, monthly[::12])
+        # one annual step after the ref date is exactly one year of growth
+        assert np.allclose(annual[3] / annual[2], 1 + alpha)
+
+    def test_coarsen_times(self):
+        times = pd.date_range('2009-03-01', '2012-02-01', freq='MS')
+
+        quarterly = coarsen_times(times, 'quarterly')
+        annual = coarsen_times(times, 'annual')
+
+        assert len(quarterly) == 12
+        assert len(annual) == 3
+        assert annual[0] == times[0]
+        assert annual[1] == pd.Timestamp('2010-03-01')
+        assert set(quarterly).issubset(set(times))
+
+    def test_coarsen_times_finer_resolution(self):
+        times = pd.date_range('2009-01-01', '2012-01-01', freq='AS')
+        with self.assertRaises(ValueError):
+            coarsen_times(times, 'quarterly')
@@ -0,0 +1,187 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from excel_helper import ExcelParameterLoader, ParameterRepository, Parameter
+from excel_helper.expressions import ExpressionGraph, compile_expression, referenced_names
+
+
+class CompileExpressionTestCase(unittest.TestCase):
+
+    def test_common_subexpressions_compile_to_equal_keys(self):
+        assert compile_expression('a * b') == compile_expression('b*a')
+        assert compile_expression('(a + b) * c')[1] == compile_expression('(b + a) / d')[1]
+
+    def test_referenced_names(self):
+        node = compile_expression('maximum(a, b) * exp(-c / 2) + 1')
+        assert referenced_names(node) == {'a', 'b', 'c'}
+
+    def test_negative_constants(self):
+        assert compile_expression('x ** -1') == ('**', ('name', 'x'), ('const', -1.0))
+        assert compile_expression('-x') == ('neg', ('name', 'x'))
+
+    def test_unsupported_expression(self):
+        with self.assertRaises(ValueError):
+            compile_expression('__import__("os")')
+        with self.assertRaises(ValueError):
+            compile_expression('a +')
+
+
+class ExpressionGraphTestCase(unittest.TestCase):
+
+    def load(self):
+        repository = ParameterRepository()
+        ExcelParameterLoader(filename='./test_expressions.xlsx').load_into_repo(repository=repository)
+        return repository
+
+    def test_evaluate_workbook(self):
+        repository = self.load()
+        settings = {'sample_size': 4, 'sample_mean_value': True}
+
+        values = ExpressionGraph(repository).evaluate(settings)
+
+        # 60 W * 2000 h * 1000 units in kWh
+        assert np.allclose(values['energy'], 120000)
+        assert np.allclose(values['energy_per_unit'], 120)
+        assert np.allclose(values['cost'], 120000 * .15)
+        assert repository['energy'].cache is values['energy']
+        assert repository['energy']() is values['energy']
+
+    def test_scenario(self):
+        repository = self.load()
+        settings = {'sample_size': 2, 'sample_mean_value': True}
+
+        values = ExpressionGraph(repository, scenario='growth').evaluate(settings, names=['energy'])
+
+        assert list(values.keys()) == ['energy']
+        assert np.allclose(values['energy'], 240000)
+
+    def test_usage_tracking(self):
+        repository = self.load()
+        ExpressionGraph(repository)
+        ExpressionGraph(repository)
+
+        assert repository['power'].processes['energy'] == ['power']
+        assert repository['power'].processes['energy_per_unit'] == ['power']
+        assert repository['energy'].processes['cost'] == ['energy']
+        assert 'energy' not in repository['price'].processes
+
+    def test_incremental_recomputation(self):
+        repository = self.load()
+        settings = {'sample_size': 4}
+        graph = ExpressionGraph(repository)
+        first = graph.evaluate(settings)
+
+        assert repository.invalidate('price') == {'cost'}
+        second = graph.evaluate(settings)
+
+        assert second['energy'] is first['energy']
+        assert second['energy_per_unit'] is first['energy_per_unit']
+        assert second['cost'] is not first['cost']
+
+    def test_recompute_after_definition_change(self):
+        repository = self.load()
+        settings = {'sample_size': 2, 'sample_mean_value': True}
+        graph = ExpressionGraph(repository)
+        first = graph.evaluate(settings)
+        price = repository['price'].cache
+
+        repository.add_parameter(Parameter('hours', module_name='numpy.random', distribution_name='choice',
+                                           param_a=1000, unit='hour'))
+        repository.add_parameter(Parameter('energy_per_unit', expression='power * hours / 2', unit='kWh'))
+        second = graph.evaluate(settings)
+
+        assert np.allclose(second['energy'], 60000)
+        assert np.allclose(second['cost'], 60000 * .15)
+        assert np.allclose(second['energy_per_unit'], 30)
+        assert repository['price'].cache is price
+        assert repository['hours'].processes['energy'] == ['hours']
+
+    def test_removed_reference(self):
+        repository = self.load()
+        settings = {'sample_size': 2, 'sample_mean_value': True}
+        graph = ExpressionGraph(repository)
+        graph.evaluate(settings)
+
+        repository.add_parameter(Parameter('energy_per_unit', expression='energy / units', unit='kWh'))
+        graph.evaluate(settings)
+        assert 'energy_per_unit' not in repository['power'].processes
+        assert 'energy_per_unit' not in repository['hours'].processes
+        assert repository['units'].processes['energy_per_unit'] == ['units']
+
+        repository.add_parameter(Parameter('energy_per_unit', expression='power * hours', unit='kWh'))
+        graph.evaluate(settings)
+        assert 'energy_per_unit' not in repository['units'].processes
+        assert 'energy_per_unit' not in repository['energy'].processes
+        # invalidating units no longer clears energy_per_unit
+        assert repository.invalidate('units') == {'energy', 'cost'}
+        assert repository['energy_per_unit'].cache is not None
+
+    def test_derived_parameter_call_without_evaluation(self):
+        repository = self.load()
+        with self.assertRaises(ValueError):
+            repository['energy']()
+
+    def test_time_series_layouts(self):
+        repository = ParameterRepository()
+        repository.add_all([
+            Parameter('a', module_name='numpy.random', distribution_name='uniform', param_a=1, param_b=2, unit='m'),
+            Parameter('b', module_name='numpy.random', distribution_name='uniform', param_a=1, param_b=2, unit='cm'),
+            Parameter('c', expression='(a + b) * (b + a) - a * a', unit='m**2')
+        ])
+        settings = {'sample_size': 3, 'use_time_series': True,
+                    'times': pd.date_range('2009-01-01', '2009-06-01', freq='MS')}
+
+        graph = ExpressionGraph(repository)
+        long = graph.evaluate(settings)['c']
+        a = repository['a']().pint.m.values
+        b = repository['b']().pint.m.values / 100
+        assert str(long.pint.u) == 'meter ** 2'
+        assert np.allclose(long.pint.m.values, (a + b) ** 2 - a ** 2)
+
+        repository.clear_cache()
+        wide = graph.evaluate(dict(settings, layout='wide'))['c']
+        assert wide.shape == (6, 3)
+        assert wide.attrs['unit'] == 'meter ** 2'
+
+    def test_negative_exponent(self):
+        repository = ParameterRepository()
+        repository.add_all([
+            Parameter('a', module_name='numpy.random', distribution_name='uniform', param_a=1, param_b=2, unit='m'),
+            Parameter('b', expression='a ** -2 * 4'),
+            Parameter('c', expression='a ** -1', unit='1/cm')])
+        settings = {'sample_size': 3, 'use_time_series': True,
+                    'times': pd.date_range('2009-01-01', '2009-06-01', freq='MS')}
+
+        values = ExpressionGraph(repository).evaluate(settings)
+        a = repository['a']().pint.m.values
+        assert str(values['b'].pint.u) == '1 / meter ** 2'
+        assert np.allclose(values['b'].pint.m.values, 4 / a ** 2)
+        assert np.allclose(values['c'].pint.m.values, 1 / a / 100)
+
+    def test_incompatible_units(self):
+        repository = ParameterRepository()
+        repository.add_all([
+            Parameter('a', module_name='numpy.random', distribution_name='uniform', param_a=1, param_b=2, unit='m'),
+            Parameter('b', module_name='numpy.random', distribution_name='uniform', param_a=1, param_b=2, unit='kg'),
+            Parameter('c', expression='a + b')
+        ])
+        with self.assertRaises(Exception):
+            ExpressionGraph(repository).evaluate({'sample_size': 2})
+
+    def test_circular_dependency(self):
+        repository = ParameterRepository()
+        repository.add_all([Parameter('a', expression='b * 2'), Parameter('b', expression='a + 1')])
+        with self.assertRaises(ValueError):
+            ExpressionGraph(repository)
+
+    def test_unknown_name(self):
+        repository = ParameterRepository()
+        repository.add_all([Parameter('a', expression='b * 2')])
+        with self.assertRaises(KeyError):
+            ExpressionGraph(repository)
+
+
+if __name__ == '__main__':
+    unittest.main()
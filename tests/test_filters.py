@@ -0,0 +1,51 @@
+import unittest
+
+from excel_helper import ExcelParameterLoader, ParameterRepository, DefinitionFilter, Tag
+from excel_helper import events
+
+
+def load(handler='xlrd', **filters):
+    repository = ParameterRepository()
+    ExcelParameterLoader(filename='./test_excelparameterloader.xlsx', excel_handler=handler).load_into_repo(
+        repository, **filters)
+    return {name: sorted(parameter_set.scenarios) for name, parameter_set in repository.parameter_sets.items()}
+
+
+class DefinitionFilterTestCase(unittest.TestCase):
+
+    def test_names(self):
+        assert load(names=['a', 'z']) == {'a': ['default', 's1', 's2', 's3'], 'z': ['default']}
+
+    def test_scenarios(self):
+        loaded = load(scenarios=['s1'])
+        assert loaded['a'] == ['default', 's1']
+        assert len(loaded) == len(load())
+
+    def test_tags(self):
+        assert sorted(load(tags='core')) == ['b', 'uniform_dist_growth']
+        # scenario variants are kept with the default row of their variable
+        assert load(tags=Tag('user') | Tag('x')) == {'a': ['default', 's1', 's2', 's3'], 'z': ['default']}
+        assert 'a' not in load(tags=~Tag('user'))
+
+    def test_handlers(self):
+        for handler in ['openpyxl', 'auto']:
+            with self.subTest(handler=handler):
+                assert load(handler, tags='core', scenarios=['s2']) == load('xlrd', tags='core', scenarios=['s2'])
+
+    def test_rows_skipped(self):
+        counter = events.EventCounter()
+        with events.subscribed(counter, events.row_loaded):
+            load(names=['a'])
+        # only the rows of <a> are converted to definitions
+        assert counter.counts['row_loaded'] == 3
+
+    def test_variant_without_default(self):
+        row_filter = DefinitionFilter(tags='t')
+        definitions = [{'variable': 'a', 'scenario': 's1', 'tags': 't'},
+                       {'variable': 'b', 'scenario': 's1', 'tags': ''}]
+        assert [row_filter.accept_definition(d) for d in definitions] == [True, True]
+        assert row_filter.resolve(definitions) == definitions[:1]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+import numpy as np
+
+from excel_helper import ParameterRepository, Parameter
+
+
+class FrozenRepositoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.repository = ParameterRepository()
+        self.repository.add_all([
+            Parameter('a', module_name='numpy.random', distribution_name='normal', param_a=10, param_b=1, cagr=.1,
+                      unit='kg'),
+            Parameter('a', module_name='numpy.random', distribution_name='normal', param_a=20, param_b=1, cagr=.02,
+                      source_scenarios_string='s1'),
+            Parameter('b', module_name='numpy.random', distribution_name='lognormal', param_a=0, param_b=.5,
+                      cagr=''),
+            Parameter('c', module_name='numpy.random', distribution_name='choice', param_a='1,2,3'),
+            Parameter('d', module_name='numpy.random', distribution_name='triangular', param_a=1, param_b=2,
+                      param_c=4),
+            Parameter('e', expression='a * b')])
+
+    def test_columns(self):
+        frozen = self.repository.freeze()
+
+        assert len(frozen) == 6
+        assert list(frozen.index) == [('a', 'default'), ('a', 's1'), ('b', 'default'), ('c', 'default'),
+                                      ('d', 'default'), ('e', 'default')]
+        assert frozen['cagr'].dtype == float
+        assert np.isnan(frozen['cagr'][2])
+        assert frozen['unit'][1] == 'kg'
+        assert frozen.revision == self.repository.revision
+
+        with self.assertRaises(ValueError):
+            frozen['cagr'][0] = 1
+        with self.assertRaises(AttributeError):
+            frozen.index = None
+
+    def test_filter(self):
+        frozen = self.repository.freeze()
+
+        growing = frozen.filter((frozen['cagr'] > .05) | (frozen['scenario'] == 's1'))
+        assert list(growing.index) == [('a', 'default'), ('a', 's1')]
+        assert frozen.filter(frozen['distribution_name'] == 'lognormal').names == ['b']
+        assert frozen.filter(frozen.rows(name='a')).parameters() == [self.repository['a'],
+                                                                     self.repository.get_parameter('a', 's1')]
+
+        s1 = frozen.in_scenario('s1')
+        assert list(s1.index) == [('a', 's1'), ('b', 'default'), ('c', 'default'), ('d', 'default'),
+                                  ('e', 'default')]
+
+    def test_shared_parameter(self):
+        self.repository.add_parameter(Parameter('a', module_name='numpy.random', distribution_name='normal',
+                                                param_a=30, param_b=1, source_scenarios_string='s2, s3'))
+        self.repository.add_parameter(Parameter('c', module_name='numpy.random', distribution_name='choice',
+                                                param_a='4,5,6', source_scenarios_string='s2, s3'))
+        samples = self.repository.freeze().sample({'sample_size': 10}, fill_cache=True)
+
+        for name in ['a', 'c']:
+            assert (samples.loc[(name, 's2')] == samples.loc[(name, 's3')]).all()
+            assert self.repository.get_parameter(name, 's2').cache is self.repository.get_parameter(name, 's3').cache
+        assert (samples.loc[('a', 's2')] != samples.loc[('a', 's1')]).all()
+
+    def test_sample(self):
+        samples = self.repository.freeze().in_scenario('s1').sample({'sample_size': 20000}, fill_cache=True)
+
+        assert samples.shape == (5, 20000)
+        assert abs(samples.loc[('a', 's1')].mean() - 20) < .1
+        assert abs(samples.loc[('b', 'default')].mean() - np.exp(.125)) < .05
+        assert set(samples.loc[('c', 'default')]) == {1, 2, 3}
+        assert abs(samples.loc[('d', 'default')].mean() - 7 / 3.) < .05
+        assert samples.loc[('e', 'default')].isnull().all()
+        assert (self.repository.get_parameter('a', 's1').cache == samples.loc[('a', 's1')].to_numpy()).all()
+        assert self.repository['e'].cache is None
+
+        means = self.repository.freeze().sample({'sample_size': 2, 'sample_mean_value': True})
+        assert (means.loc[('d', 'default')] == 7 / 3.).all()
+
+
+if __name__ == '__main__':
+    unittest.main()
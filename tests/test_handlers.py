@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from excel_helper import ExcelParameterLoader, AutoExcelHandler, XLRDExcelHandler
+
+workbooks = ['./test_v2.xlsx', './test.xlsx', './test_excelparameterloader.xlsx', './test_expressions.xlsx']
+handlers = ['xlrd', 'openpyxl', 'auto']
+csv_handlers = ['csv', 'pandas', 'auto']
+
+csv_files = {
+    'v1.csv': 'variable,scenario,module,distribution,param 1,param 2,param 3,unit,CAGR,ref date,label,tags\n'
+              'a,,numpy.random,choice,"1,2,3",,,kg,0.1,01/01/2009,test,t1\n'
+              'b,,numpy.random,uniform,2,4,,-,,,label,\n'
+              'b,s1,numpy.random,uniform,3,5,,-,,,label,\n',
+    'v2.csv': 'variable,scenario,type,ref value,param,initial_value_proportional_variation,unit,mean growth,'
+              'variability growth,ref date,label,comment,source\n'
+              'a,,exp,10,,0.4,kg,-0.2,0.1,15/01/2009,test,,\n'
+              'b,,interp,"{""2010-01-01"":1, ""2010-03-01"":100}",linear,0.4,kg,-0.2,0.1,01/01/2009,test,,\n'
+              'c,,,,,,,,,,title,,\n'}
+
+
+def read(filename, handler):
+    loader = ExcelParameterLoader(filename=filename, excel_handler=handler)
+    return loader, list(loader.load_parameter_definitions())
+
+
+class HandlerEquivalenceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        AutoExcelHandler.choices.clear()
+
+    def test_equivalence(self):
+        for filename in workbooks:
+            expected_loader, expected = read(filename, 'xlrd')
+            for handler in handlers[1:]:
+                with self.subTest(filename=filename, handler=handler):
+                    loader, definitions = read(filename, handler)
+                    assert definitions == expected
+                    assert loader.definition_version == expected_loader.definition_version
+
+    def test_csv_equivalence(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for name, content in csv_files.items():
+                filename = os.path.join(directory, name)
+                with open(filename, 'w') as f:
+                    f.write(content)
+                expected_loader, expected = read(filename, 'csv')
+                assert expected_loader.definition_version == (2 if name == 'v2.csv' else 1)
+                assert expected[0]['ref date'].day == 1
+                for handler in csv_handlers[1:]:
+                    with self.subTest(filename=name, handler=handler):
+                        loader, definitions = read(filename, handler)
+                        assert definitions == expected
+                        assert loader.definition_version == expected_loader.definition_version
+        finally:
+            shutil.rmtree(directory)
+
+    def test_auto_choice(self):
+        loader, _ = read('./test_v2.xlsx', 'auto')
+        assert loader.excel_handler.handler_name == 'xlrd'
+        assert list(AutoExcelHandler.choices.values()) == ['xlrd']
+
+    def test_auto_fallback(self):
+        _, expected = read('./test_v2.xlsx', 'openpyxl')
+        with mock.patch.object(XLRDExcelHandler, 'load_definitions', side_effect=ImportError('No module named xlrd')):
+            loader, definitions = read('./test_v2.xlsx', 'auto')
+        assert loader.excel_handler.handler_name == 'openpyxl'
+        assert definitions == expected
+
+        # the choice is tried first for the same file
+        with mock.patch.object(XLRDExcelHandler, 'load_definitions') as load_definitions:
+            read('./test_v2.xlsx', 'auto')
+        load_definitions.assert_not_called()
+
+    def test_definition_errors_raised(self):
+        with mock.patch.object(XLRDExcelHandler, 'load_definitions', side_effect=ValueError('duplicate entry')):
+            with self.assertRaises(ValueError):
+                read('./test_v2.xlsx', 'auto')
+
+    def test_unknown_handler(self):
+        with self.assertRaises(ValueError):
+            ExcelParameterLoader(filename='./test_v2.xlsx', excel_handler='xlrd3')
+
+
+if __name__ == '__main__':
+    unittest.main()
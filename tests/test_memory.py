@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from excel_helper import ParameterRepository, Parameter
+from excel_helper.memory import cache_nbytes, bytes_per_sample
+
+
+class MemoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.repository = ParameterRepository()
+        self.repository.add_all([
+            Parameter('a', module_name='numpy.random', distribution_name='uniform', param_a=0, param_b=1, unit='kg',
+                      tags='t1, t2'),
+            Parameter('a', module_name='numpy.random', distribution_name='uniform', param_a=1, param_b=2,
+                      source_scenarios_string='s1,s2'),
+            Parameter('b', module_name='numpy.random', distribution_name='normal', param_a=10, param_b=1, tags='t2'),
+            Parameter('c', module_name='numpy.random', distribution_name='normal', param_a=10, param_b=1)])
+        self.settings = {'sample_size': 1000, 'use_time_series': True,
+                         'times': pd.date_range('2009-01-01', '2009-12-01', freq='MS')}
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_memory_usage(self):
+        self.repository['a'](self.settings)
+        self.repository['b'](dict(self.settings, layout='wide'))
+        self.repository.get_parameter('a', 's1')({'sample_size': 1000})
+
+        usage = self.repository.memory_usage()
+        cache = usage.parameters['cache']
+        assert cache[('a', 'default')] > 12 * 1000 * 8
+        assert cache[('a', 's1,s2')] == 1000 * 8
+        assert cache[('c', 'default')] == 0
+        assert (usage.parameters['definition'] > 0).all()
+        # the scenario variant inherits the tags of the default parameter
+        assert usage.by_tag()['t2'] == cache[('a', 'default')] + cache[('a', 's1,s2')] + cache[('b', 'default')]
+        assert usage.by_scenario()['s2'] == 1000 * 8
+        assert usage.top(1).index[0] == ('a', 'default')
+        assert usage.total > usage.cache
+
+    def test_evict(self):
+        settings = dict(self.settings, layout='wide', memory_budget=self.repository.memory_budget(150000))
+        a = self.repository['a'](settings)
+        self.repository['b'](settings)
+        # the first cache was evicted to make room for the second
+        assert self.repository['a'].cache is None
+        assert self.repository['b'].cache is not None
+        assert settings['memory_budget'].evicted == 1
+        assert not self.repository['a'](settings).equals(a)
+
+    def test_spill(self):
+        budget = self.repository.memory_budget(150000, policy='spill', directory=self.directory)
+        settings = dict(self.settings, memory_budget=budget)
+        a = self.repository['a'](settings).copy()
+        self.repository['b'](settings)
+
+        spilled = self.repository['a'].cache
+        assert cache_nbytes(spilled)[1] == 12 * 1000 * 8
+        assert (spilled.values.quantity.magnitude == a.values.quantity.magnitude).all()
+        assert spilled.index.equals(a.index)
+        assert self.repository['a'](settings) is spilled
+        assert budget.spilled == 1
+        assert self.repository.memory_usage().parameters.loc[('a', 'default'), 'mapped'] == 12 * 1000 * 8
+        # the index of the spilled cache stays resident
+        assert budget.resident == cache_nbytes(spilled)[0] + cache_nbytes(self.repository['b'].cache)[0]
+        assert cache_nbytes(spilled)[0] > 0
+
+        budget.close()
+        assert os.listdir(self.directory) == []
+        assert self.repository['a'].cache is None
+        assert self.repository['b'].cache is not None
+
+    def test_spill_temporary_directory(self):
+        with self.repository.memory_budget(150000, policy='spill') as budget:
+            settings = dict(self.settings, memory_budget=budget)
+            self.repository['a'](settings)
+            self.repository['b'](settings)
+            directory = budget.directory
+            assert len(os.listdir(directory)) == 1
+        assert not os.path.exists(directory)
+
+    def test_running_total(self):
+        # filled before the budget exists
+        self.repository['c'](dict(self.settings, layout='wide'))
+        budget = self.repository.memory_budget(150000)
+        assert budget.resident == cache_nbytes(self.repository['c'].cache)[0]
+
+        settings = dict(self.settings, layout='wide', memory_budget=budget)
+        with mock.patch('excel_helper.memory.unique_parameters') as scan:
+            self.repository['a'](settings)
+            self.repository['b'](settings)
+        scan.assert_not_called()
+        # the cache that the budget did not see being filled goes first
+        assert self.repository['c'].cache is None
+        assert self.repository['a'].cache is None
+        assert budget.evicted == 2
+        assert budget.resident == cache_nbytes(self.repository['b'].cache)[0]
+
+    def test_bytes_per_sample(self):
+        estimate = bytes_per_sample(self.repository, dict(self.settings, layout='wide'), names=['a', 'b'])
+        # the values and a share of the time index
+        self.assertAlmostEqual(estimate, 2 * 12 * 8, delta=4)
+        assert self.repository['a'].cache is None
+
+        state = np.random.get_state()[1].copy()
+        bytes_per_sample(self.repository, self.settings)
+        assert (np.random.get_state()[1] == state).all()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from excel_helper import ParameterRepository, Parameter
+from excel_helper.montecarlo import MonteCarloRunner
+
+
+def model(repository, settings):
+    return {'product': repository['a'](settings) * repository['b'](settings),
+            'a': repository['a'](settings)}
+
+
+def time_series_model(repository, settings):
+    return repository['a'](settings)
+
+
+class MonteCarloRunnerTestCase(unittest.TestCase):
+
+    def repository(self):
+        repository = ParameterRepository()
+        repository.add_all([
+            Parameter('a', module_name='numpy.random', distribution_name='uniform', param_a=0, param_b=1, cagr=.1),
+            Parameter('b', module_name='numpy.random', distribution_name='normal', param_a=10, param_b=1)])
+        return repository
+
+    def test_run(self):
+        summaries = MonteCarloRunner(self.repository(), model, processes=2, chunk_size=5000, seed=1).run({}, 20000)
+
+        a = summaries['a'].iloc[0]
+        assert a['count'] == 20000
+        assert abs(a['mean'] - .5) < .01
+        assert abs(a['var'] - 1 / 12.) < .01
+        assert 0 <= a['min'] < a[0.05] < a[0.5] < a[0.95] < a['max'] <= 1
+        assert abs(summaries['product'].iloc[0]['mean'] - 5) < .1
+
+    def test_results_independent_of_processes(self):
+        serial = MonteCarloRunner(self.repository(), model, processes=1, chunk_size=300, seed=7).run({}, 1000)
+        parallel = MonteCarloRunner(self.repository(), model, processes=3, chunk_size=300, seed=7).run({}, 1000)
+
+        pd.testing.assert_frame_equal(serial['product'], parallel['product'])
+
+    def test_time_series(self):
+        settings = {'use_time_series': True, 'times': pd.date_range('2009-01-01', '2010-01-01', freq='MS')}
+        for layout in ['long', 'wide']:
+            summary = MonteCarloRunner(self.repository(), time_series_model, processes=2, chunk_size=500,
+                                       seed=3).run(dict(settings, layout=layout), 2000)['output']
+
+            assert len(summary) == 13
+            assert summary.index[0] == pd.Timestamp('2009-01-01')
+            assert abs(summary['mean'].iloc[-1] / summary['mean'].iloc[0] - 1.1) < .05
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,10 @@
 import unittest
+from datetime import datetime
 
+import numpy as np
 import pandas as pd
-from excel_helper import Parameter, DistributionFunctionGenerator, GrowthTimeSeriesGenerator
+from excel_helper import Parameter, DistributionFunctionGenerator, GrowthTimeSeriesGenerator, \
+    LazyTimeSeriesParameter
 from scipy import stats
 
 
@@ -60,6 +63,133 @@ class ParameterTestCase(unittest.TestCase):
 
         assert a.iloc[0] * 1.1 == a.iloc[-1]
 
+    def test_time_series_annual_resolution(self):
+        p = Parameter('test', module_name='numpy.random', distribution_name='uniform',
+                      param_a=1, param_b=2, cagr=.1)
+
+        settings = {
+            'use_time_series': True,
+            'times': pd.date_range('2009-01-01', '2012-01-01', freq='AS'),
+            'sample_size': 2,
+            'sample_mean_value': True}
+        a = p(settings)
+
+        assert len(a) == 8
+        assert abs(a.iloc[-1].m - 1.5 * pow(1.1, 3)) < 1e-9
+
+    def test_time_series_aggregated_resolution(self):
+        p = Parameter('test', module_name='numpy.random', distribution_name='uniform',
+                      param_a=1, param_b=2, cagr=.1)
+        q = Parameter('test', module_name='numpy.random', distribution_name='uniform',
+                      param_a=1, param_b=2, cagr=.1)
+
+        settings = {
+            'use_time_series': True,
+            'times': pd.date_range('2009-01-01', '2011-12-01', freq='MS'),
+            'sample_size': 1,
+            'sample_mean_value': True}
+        monthly = p(settings)
+        quarterly = q(dict(settings, time_resolution='quarterly'))
+
+        assert len(quarterly) == 12
+        assert (quarterly.pint.m.values == monthly.pint.m.values[::3]).all()
+
+    def test_lazy_time_series_windows_match_full_evaluation(self):
+        settings = {
+            'use_time_series': True,
+            'times': pd.date_range('2009-01-01', '2011-12-01', freq='MS'),
+            'sample_size': 4}
+
+        np.random.seed(123)
+        full = Parameter('test', module_name='numpy.random', distribution_name='normal',
+                         param_a=1, param_b=.1, cagr=.1)(settings)
+
+        np.random.seed(123)
+        lazy = LazyTimeSeriesParameter(Parameter('test', module_name='numpy.random', distribution_name='normal',
+                                                 param_a=1, param_b=.1, cagr=.1), settings)
+        # the global random stream is not consumed by the lazy parameter
+        np.random.seed(0)
+
+        # request a later window first
+        later = lazy['2010-07-01':'2011-06-01']
+        earlier = lazy['2009-03-01':'2009-05-01']
+        cached = lazy['2010-09-01':'2010-10-01']
+
+        assert len(later) == 12 * 4
+        assert (later.pint.m.values == full.loc['2010-07-01':'2011-06-01'].pint.m.values).all()
+        assert (earlier.pint.m.values == full.loc['2009-03-01':'2009-05-01'].pint.m.values).all()
+        assert (cached.pint.m.values == full.loc['2010-09-01':'2010-10-01'].pint.m.values).all()
+        assert (lazy[datetime(2011, 12, 1)].pint.m.values == full.loc['2011-12-01'].pint.m.values).all()
+
+        # draws of other modules do not go through the checkpointed random state
+        with self.assertRaises(ValueError):
+            LazyTimeSeriesParameter(Parameter('test', module_name='scipy.stats', distribution_name='norm',
+                                              param_a=1, param_b=.1, cagr=.1), settings)
+
+    def test_wide_layout(self):
+        settings = {
+            'use_time_series': True,
+            'times': pd.date_range('2009-01-01', '2009-12-01', freq='MS'),
+            'sample_size': 5}
+
+        np.random.seed(123)
+        long = Parameter('test', module_name='numpy.random', distribution_name='uniform',
+                         param_a=1, param_b=2, cagr=.1, unit='kg')(settings)
+        np.random.seed(123)
+        wide = Parameter('test', module_name='numpy.random', distribution_name='uniform',
+                         param_a=1, param_b=2, cagr=.1, unit='kg')(dict(settings, layout='wide'))
+
+        values = wide.to_numpy()
+        assert values.shape == (12, 5)
+        assert values.flags['C_CONTIGUOUS']
+        assert (wide.index == settings['times']).all()
+        assert wide.attrs['unit'] == 'kg'
+        assert (values.ravel() == long.pint.m.values).all()
+        assert np.allclose(values.mean(axis=1), long.pint.m.groupby(level=0).mean().values)
+
+    def test_wide_layout_growth_time_series(self):
+        def v2_parameter():
+            return Parameter('test', version=2, type='exp', unit='kg', ref_date=datetime(2009, 1, 1),
+                             growth_factor=.1, ef_growth_factor=.1,
+                             **{'ref value': 10., 'initial_value_proportional_variation': .4})
+
+        settings = {
+            'use_time_series': True,
+            'times': pd.date_range('2009-01-01', '2010-12-01', freq='MS'),
+            'sample_size': 3}
+
+        np.random.seed(123)
+        long = v2_parameter()(settings)
+        np.random.seed(123)
+        wide = v2_parameter()(dict(settings, layout='wide'))
+        np.random.seed(123)
+        lazy = LazyTimeSeriesParameter(v2_parameter(), dict(settings, layout='wide'))
+
+        assert wide.shape == (24, 3)
+        assert (wide.to_numpy().ravel() == long.pint.m.values).all()
+        assert (lazy['2010-01-01':'2010-03-01'].to_numpy() == wide.loc['2010-01-01':'2010-03-01'].to_numpy()).all()
+        assert (lazy['2009-02-01'].to_numpy() == wide.loc[['2009-02-01']].to_numpy()).all()
+
+    def test_compact_parameter(self):
+        p = Parameter('test', module_name='numpy.random', distribution_name='normal', param_a=0, param_b=.1,
+                      label='a label')
+        q = Parameter('other', module_name='numpy.random', distribution_name='normal', param_a=1, param_b=.1,
+                      label='a label')
+
+        assert not hasattr(p, '__dict__')
+        assert dict(p.kwargs) == {'module_name': 'numpy.random', 'distribution_name': 'normal', 'param_a': 0,
+                                  'param_b': .1, 'label': 'a label'}
+        assert p.kwargs.get('expression') is None
+        # rows with the same columns share the column names
+        assert p.kwargs._schema is q.kwargs._schema
+        with self.assertRaises(TypeError):
+            p.kwargs['param_a'] = 1
+
+        assert p._processes is None
+        p.add_usage('model', 'x')
+        assert p.processes == {'model': ['x']}
+        assert len(p({'sample_size': 4})) == 4
+
     def test_normal_zero_variance(self):
         p = Parameter('a', module_name='numpy.random', distribution_name='normal', param_a=0,
                       param_b=0, )
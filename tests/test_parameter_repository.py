@@ -1,7 +1,7 @@
 import unittest
 from unittest import skip
 
-from excel_helper import ParameterRepository, Parameter
+from excel_helper import ParameterRepository, Parameter, Tag, TagIndex, TagQuery
 
 
 class ParameterRepositoryTestCase(unittest.TestCase):
@@ -22,6 +22,110 @@ class ParameterRepositoryTestCase(unittest.TestCase):
 
         assert param.cache == None
 
+    def test_dependents(self):
+        repo = ParameterRepository()
+        repo.add_all([Parameter('a'), Parameter('b'), Parameter('c')])
+        repo['a'].add_usage('b', 'a')
+        repo['b'].add_usage('model', 'b_var')
+        repo['c'].add_usage('other_model', 'c_var')
+
+        assert repo.dependents('a') == {'b', 'model'}
+        assert repo.dependents('b') == {'model'}
+        assert repo.dependents('c') == {'other_model'}
+
+    def test_invalidate(self):
+        repo = ParameterRepository()
+        repo.add_all([Parameter('a'), Parameter('b'), Parameter('c')])
+        for p in [repo['a'], repo['b'], repo['c']]:
+            p.cache = 1
+        repo['a'].add_usage('b', 'a')
+        repo['b'].add_usage('model', 'b_var')
+
+        assert repo.invalidate('a') == {'b', 'model'}
+        assert repo['a'].cache is None
+        assert repo['b'].cache is None
+        assert repo['c'].cache == 1
+
+    def test_replace_parameter(self):
+        repo = ParameterRepository()
+        repo.add_all([Parameter('a', tags='t1'), Parameter('b')])
+        repo['a'].add_usage('b', 'a')
+        repo['b'].cache = 1
+        revision = repo.revision
+
+        a = Parameter('a', tags='t1')
+        repo.add_parameter(a)
+
+        assert repo.revision > revision
+        assert repo['b'].cache is None
+        assert a.processes['b'] == ['a']
+        assert repo.find_by_tag('t1')['a'] == {a}
+
+    def test_tag_query(self):
+        repo = ParameterRepository()
+        repo.add_all([Parameter('a', tags='UD, TV'), Parameter('b', tags='UD'), Parameter('c', tags='TV, legacy'),
+                      Parameter('a', tags='UD, TV', source_scenarios_string='s1'), Parameter('d')])
+
+        assert repo.names(Tag('UD') & Tag('TV')) == ['a']
+        assert repo.names(Tag('UD') | 'legacy') == ['a', 'b', 'c']
+        assert repo.names(Tag('TV') & ~Tag('legacy')) == ['a']
+        assert repo.names(~Tag('UD')) == ['c', 'd']
+        assert len(repo.find_by_tag(Tag('UD') & Tag('TV'))['a']) == 2
+        assert repo.select(Tag('TV'), scenario='s1') == {'a': repo.get_parameter('a', 's1'), 'c': repo['c']}
+
+        # queries do not add tags to the index
+        assert repo.find_by_tag('unknown') == {}
+        assert 'unknown' not in repo.tags
+        assert set(repo.tags) == {'UD', 'TV', 'legacy'}
+
+    def test_tag_index_replace(self):
+        repo = ParameterRepository()
+        repo.add_all([Parameter('a', tags='t1'), Parameter('b', tags='t1')])
+        repo.add_parameter(Parameter('a', tags='t2'))
+
+        assert repo.names(Tag('t1')) == ['b']
+        assert repo.names(Tag('t2')) == ['a']
+        assert repo.names(~Tag('t1')) == ['a']
+
+    def test_tag_index_compact(self):
+        repo = ParameterRepository()
+        repo.add_all([Parameter('a', tags='t1'), Parameter('b', tags='t2')])
+        for i in range(200):
+            repo.add_parameter(Parameter('a', tags='t1' if i % 2 else 't2'))
+
+        assert len(repo.tag_index.parameters) <= 2 * TagIndex.max_holes
+        assert repo.names(Tag('t1')) == ['a']
+        assert repo.names(Tag('t2')) == ['b']
+        assert repo.names(~Tag('t2')) == ['a']
+        assert repo.tag_index.find('t2') == [repo['b']]
+
+    def test_tag_query_abstract(self):
+        with self.assertRaises(TypeError):
+            TagQuery()
+
+    def test_view(self):
+        repo = ParameterRepository()
+        repo.add_all([Parameter('a'), Parameter('b'), Parameter('a', source_scenarios_string='s1')])
+
+        view = repo.view('s1')
+        assert view == {'a': repo.get_parameter('a', 's1'), 'b': repo['b']}
+        assert repo.view('s1') is view
+        assert repo.view()['a'] is repo['a']
+        with self.assertRaises(TypeError):
+            view['c'] = Parameter('c')
+
+        # the view follows changes of the repository
+        b = Parameter('b', source_scenarios_string='s1')
+        repo.add_all([b, Parameter('c')])
+        assert view['b'] is b
+        assert view['c'] is repo['c']
+
+    def test_get_parameter_unknown(self):
+        repo = ParameterRepository()
+        with self.assertRaises(KeyError):
+            repo.get_parameter('a', 's1')
+        assert 'a' not in repo.parameter_sets
+
     def test_add_parameter(self):
         p = Parameter('test')
 
@@ -167,6 +271,21 @@ class ParameterRepositoryTestCase(unittest.TestCase):
 
         assert repo.get_parameter('test', 's1').unit == 'kg'
 
+    def test_resolve_defaults_independent_of_order(self):
+        ps = Parameter('test', source_scenarios_string='s1,s2', label='')
+        p = Parameter('test', tags='t1,t2', unit='kg', source='EnergyStar', label='a label')
+
+        repo = ParameterRepository()
+        repo.add_all([ps])
+        repo.add_all([p, Parameter('other', source_scenarios_string='s1')])
+
+        s1 = repo.get_parameter('test', 's1')
+        assert s1 is ps
+        assert (s1.unit, s1.source, s1.tags) == ('kg', 'EnergyStar', 't1,t2')
+        assert s1.kwargs['label'] == 'a label'
+        assert repo.find_by_tag('t1')['test'] == {p, ps}
+        assert repo.get_parameter('other', 's1').unit is None
+
     def test_fill_missing_attributes_from_default_parameter_tags(self):
         """
         Test that tag values in scenarios are being overwritten with defaults.
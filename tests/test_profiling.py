@@ -0,0 +1,59 @@
+import datetime
+import unittest
+
+import pandas as pd
+
+from excel_helper import Parameter
+from excel_helper.profiling import SamplingProfiler
+
+
+class SamplingProfilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.times = pd.date_range('2020-01-01', '2021-12-01', freq='MS')
+        self.v1 = Parameter('v1', version=1, module_name='numpy.random', distribution_name='normal', param_a=10,
+                            param_b=1, cagr=.05, unit='kg')
+        self.v2 = Parameter('v2', version=2, type='exp', unit='kg', **{'ref value': 10.},
+                            initial_value_proportional_variation=.2, growth_factor=.05, ef_growth_factor=.02,
+                            ref_date=datetime.datetime(2020, 1, 1), param='')
+        self.v2.scenario = 'default'
+
+    def test_stages(self):
+        events = []
+        profiler = SamplingProfiler(callbacks=[lambda *event: events.append(event)])
+        settings = {'sample_size': 100, 'use_time_series': True, 'times': self.times, 'profiler': profiler}
+        self.v1(settings)
+        self.v2(settings)
+        # cached values are not profiled
+        self.v2(settings)
+
+        frame = profiler.to_frame()
+        assert set(frame.loc[('v1', None)].index) == {'total', 'lookup', 'draw', 'growth', 'wrap'}
+        assert set(frame.loc[('v2', 'default')].index) == {'total', 'draw', 'growth', 'wrap', 'negative_check'}
+        assert frame.loc[('v2', 'default', 'growth'), 'calls'] == 3
+        assert frame.loc[('v2', 'default', 'total'), 'calls'] == 1
+        assert frame.loc[('v1', None, 'total'), 'seconds'] >= frame.loc[('v1', None, 'draw'), 'seconds']
+        assert events[-1][:3] == ('v2', 'default', 'total')
+        assert events[-1][4] is None
+
+        report = profiler.report(top=1)
+        assert len(report) == 1
+        assert list(report.columns[:2]) == ['total', 'lookup']
+
+    def test_memory(self):
+        with SamplingProfiler(memory=True) as profiler:
+            self.v2({'sample_size': 1000, 'use_time_series': True, 'times': self.times, 'profiler': profiler})
+        frame = profiler.to_frame()
+        # the 24 x 1000 samples in float64
+        assert frame.loc[('v2', 'default', 'draw'), 'allocated'] >= 24 * 1000 * 8
+        assert frame.loc[('v2', 'default', 'total'), 'allocated'] >= frame.loc[('v2', 'default', 'draw'), 'allocated']
+        assert profiler.report(by='allocated').index[0] == ('v2', 'default')
+
+    def test_disabled(self):
+        generator = self.v1.create_generator({'sample_size': 10})
+        assert generator.profiler is None
+        assert len(self.v1({'sample_size': 10})) == 10
+
+
+if __name__ == '__main__':
+    unittest.main()
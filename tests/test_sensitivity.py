@@ -0,0 +1,89 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from excel_helper import ParameterRepository, Parameter
+from excel_helper.sensitivity import SensitivityAnalysis
+
+
+def additive_model(repository, settings):
+    return {'sum': repository['a'](settings) + 2 * repository['b'](settings),
+            'product': repository['a'](settings) * repository['b'](settings)}
+
+
+class SensitivityAnalysisTestCase(unittest.TestCase):
+
+    def repository(self):
+        repository = ParameterRepository()
+        repository.add_all([
+            Parameter('a', module_name='numpy.random', distribution_name='uniform', param_a=0, param_b=1, cagr=.1),
+            Parameter('b', module_name='numpy.random', distribution_name='uniform', param_a=0, param_b=1),
+            Parameter('c', module_name='numpy.random', distribution_name='normal', param_a=0, param_b=1)])
+        return repository
+
+    def test_sobol_indices(self):
+        repository = self.repository()
+        indices = SensitivityAnalysis(repository, additive_model, seed=1).sobol_indices({}, 20000)
+
+        additive = indices['sum']
+        assert list(additive.index) == ['a', 'b', 'c']
+        # Var(a) = 1/12, Var(2b) = 4/12
+        assert np.allclose(additive['S1'], [.2, .8, 0], atol=.03)
+        assert np.allclose(additive['ST'], [.2, .8, 0], atol=.03)
+
+        # a and b interact: S1 = 3/7, ST = 4/7
+        product = indices['product']
+        assert np.allclose(product.loc[['a', 'b'], 'S1'], 3 / 7., atol=.03)
+        assert np.allclose(product.loc[['a', 'b'], 'ST'], 4 / 7., atol=.03)
+
+        # the caches of the analysed parameters are reset after the analysis
+        assert repository['a'].cache is None
+
+    def test_parameters_not_analysed(self):
+        def model(repository, settings):
+            return repository['a'](settings) + repository['c'](settings) / np.sqrt(12)
+
+        indices = SensitivityAnalysis(self.repository(), model, parameters=['a'], seed=1).sobol_indices({}, 20000)
+        # Var(a) = Var(c / sqrt(12)) = 1/12, c is the same in all blocks
+        assert np.allclose(indices['output'].loc['a', ['S1', 'ST']], .5, atol=.03)
+
+    def test_unrelated_caches_kept(self):
+        repository = self.repository()
+        repository.add_parameter(Parameter('d', module_name='numpy.random', distribution_name='normal', param_a=0,
+                                           param_b=1))
+        repository['a'].add_usage('e', 'a')
+        repository.add_parameter(Parameter('e', expression='a * 2'))
+        d = repository['d']({'sample_size': 10})
+        repository['e'].cache = np.zeros(10)
+
+        SensitivityAnalysis(repository, additive_model, parameters=['a', 'b'], seed=1).sobol_indices({}, 100)
+        assert repository['d'].cache is d
+        # e depends on a
+        assert repository['e'].cache is None
+
+    def test_tornado(self):
+        tornado = SensitivityAnalysis(self.repository(), additive_model, parameters=['a', 'b'],
+                                      seed=1).tornado({}, samples=10000)['sum']
+
+        assert list(tornado.index) == ['b', 'a']
+        assert np.allclose(tornado['base'], 1.5)
+        assert np.allclose(tornado.loc['a', ['low', 'high']], [1.05, 1.95], atol=.02)
+        assert np.allclose(tornado.loc['b', 'swing'], 1.8, atol=.04)
+
+    def test_time_series(self):
+        settings = {'use_time_series': True, 'times': pd.date_range('2009-01-01', '2010-01-01', freq='MS')}
+        for layout in ['long', 'wide']:
+            analysis = SensitivityAnalysis(self.repository(), additive_model, parameters=['a', 'b'], seed=2)
+            indices = analysis.sobol_indices(dict(settings, layout=layout), 5000)['sum']
+
+            assert len(indices) == 13 * 2
+            assert indices.index.names == ['time', 'parameter']
+            first, last = indices.loc[pd.Timestamp('2009-01-01')], indices.loc[pd.Timestamp('2010-01-01')]
+            assert abs(first.loc['a', 'S1'] - .2) < .05
+            # a grows by 10%, so its share of the variance increases
+            assert last.loc['a', 'S1'] > first.loc['a', 'S1']
+
+
+if __name__ == '__main__':
+    unittest.main()
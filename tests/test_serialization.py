@@ -0,0 +1,91 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from excel_helper import ParameterRepository, Parameter, Tag
+
+
+class SerializationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'repository.bin')
+        self.repository = ParameterRepository()
+        self.repository.add_all([
+            Parameter('a', module_name='numpy.random', distribution_name='uniform', param_a=0, param_b=1, unit='kg',
+                      tags='t1, t2', label='label a'),
+            Parameter('a', module_name='numpy.random', distribution_name='uniform', param_a=1, param_b=2,
+                      source_scenarios_string='s1,s2'),
+            Parameter('b', module_name='numpy.random', distribution_name='normal', param_a=10, param_b=1, tags='t2'),
+            Parameter('c', module_name='numpy.random', distribution_name='normal', param_a=10, param_b=1)])
+        self.repository['a'].add_usage('model', 'a_var')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_definitions(self):
+        self.repository['a']({'sample_size': 10})
+        self.repository.save(self.path)
+        loaded = ParameterRepository.load(self.path)
+
+        a = loaded['a']
+        assert (a.unit, a.tags, a.kwargs['label'], a.kwargs['param_b']) == ('kg', 't1, t2', 'label a', 1)
+        assert a.cache is None
+        assert a.processes == {'model': ['a_var']}
+        assert loaded.get_parameter('a', 's1') is loaded.get_parameter('a', 's2')
+        assert loaded.get_parameter('a', 's1').unit == 'kg'
+        assert loaded.names(Tag('t2') & ~Tag('t1')) == ['b']
+        assert len(loaded['c']({'sample_size': 3})) == 3
+
+    def test_samples(self):
+        settings = {'sample_size': 1000, 'use_time_series': True,
+                    'times': pd.date_range('2009-01-01', '2009-12-01', freq='MS')}
+        a = self.repository['a'](settings)
+        b = self.repository['b'](dict(settings, layout='wide'))
+        c = self.repository['c']({'sample_size': 1000})
+        self.repository.save(self.path, include_cache=True)
+
+        for mmap_mode in ['r', None]:
+            loaded = ParameterRepository.load(self.path, mmap_mode=mmap_mode)
+            assert (loaded['a'].cache.values.quantity.magnitude == a.values.quantity.magnitude).all()
+            assert loaded['a'].cache.index.equals(a.index)
+            assert str(loaded['a'].cache.pint.u) == 'kilogram'
+            pd.testing.assert_frame_equal(loaded['b'].cache, b)
+            assert (loaded['c'].cache == c).all()
+
+        # memory-mapped samples are read-only views of the file
+        mapped = ParameterRepository.load(self.path)['c'].cache
+        assert not mapped.flags.writeable
+        base = mapped
+        while not isinstance(base, memoryview):
+            base = base.base
+        assert isinstance(base.obj, np.memmap)
+
+    def test_format_version(self):
+        self.repository.save(self.path)
+        with open(self.path, 'r+b') as f:
+            f.seek(8)
+            f.write((99).to_bytes(4, 'little'))
+        with self.assertRaises(ValueError):
+            ParameterRepository.load(self.path)
+
+        with open(self.path, 'wb') as f:
+            f.write(b'not a repository file' * 4)
+        with self.assertRaises(ValueError):
+            ParameterRepository.load(self.path)
+
+    def test_pickle(self):
+        self.repository.view('s1')
+        loaded = pickle.loads(pickle.dumps(self.repository))
+
+        assert loaded.view('s1')['a'] is loaded.get_parameter('a', 's1')
+        assert loaded.names(Tag('t1')) == ['a']
+
+
+if __name__ == '__main__':
+    unittest.main()
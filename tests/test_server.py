@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from excel_helper import ParameterRepository, Parameter
+from excel_helper.server import SamplingServer, SamplingClient
+
+
+class SamplingServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'params.bin')
+        self.repository(10).save(self.path)
+        self.server = SamplingServer(self.path, poll_interval=.05).start()
+        self.client = SamplingClient(self.server.url)
+        self.settings = {'sample_size': 100, 'use_time_series': True,
+                         'times': pd.date_range('2020-01-01', '2020-12-01', freq='MS')}
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    @staticmethod
+    def repository(mean):
+        repository = ParameterRepository()
+        repository.add_all([
+            Parameter('a', module_name='numpy.random', distribution_name='normal', param_a=mean, param_b=1, unit='kg',
+                      cagr=.1),
+            Parameter('a', module_name='numpy.random', distribution_name='normal', param_a=2 * mean, param_b=1,
+                      source_scenarios_string='s1')])
+        return repository
+
+    def test_sample(self):
+        values = self.client.sample('a', settings=self.settings, seed=1)
+        assert len(values) == 12 * 100
+        assert str(values.pint.u) == 'kilogram'
+        # warm cache and reproducible with a seed
+        matrix, unit = self.client.matrix('a', settings=self.settings, seed=1)
+        assert not matrix.flags.writeable
+        assert (matrix.ravel() == values.values.quantity.magnitude).all()
+        assert (self.client.sample('a', settings=self.settings) == self.client.sample('a', settings=self.settings)).all()
+
+        wide = self.client.sample('a', 's1', dict(self.settings, layout='wide'), seed=1)
+        assert wide.shape == (12, 100)
+        assert 15 < wide.to_numpy().mean() < 30
+
+        scalar = self.client.sample('a', settings={'sample_size': 50})
+        assert scalar.shape == (50,)
+
+    def test_statistics(self):
+        statistics = self.client.statistics('a', settings=self.settings, seed=1)
+        matrix, _ = self.client.matrix('a', settings=self.settings, seed=1)
+        assert isinstance(statistics.index, pd.DatetimeIndex)
+        assert np.allclose(statistics['mean'], matrix.mean(axis=1))
+        assert 0.5 in statistics.columns
+
+    def test_hot_swap(self):
+        assert self.client.status()['revision'] == 1
+        assert self.client.parameters() == {'a': ['default', 's1']}
+        before = self.client.matrix('a', settings={'sample_size': 1000}, seed=1)[0]
+
+        self.repository(1000).save(self.path)
+        for _ in range(100):
+            if self.client.status()['revision'] == 2:
+                break
+            time.sleep(.05)
+        assert self.client.status()['revision'] == 2
+        after = self.client.matrix('a', settings={'sample_size': 1000}, seed=1)[0]
+        assert before.mean() < 20 < after.mean()
+        assert not self.client.reload()['reloaded']
+
+    def test_errors(self):
+        from urllib.error import HTTPError
+        with self.assertRaises(HTTPError) as e:
+            self.client.matrix('unknown')
+        assert e.exception.code == 404
+
+        # the frequency of two dates cannot be inferred
+        request = {'name': 'a', 'settings': {'sample_size': 2, 'use_time_series': True,
+                                             'times': ['2020-01-01', '2020-02-01']}}
+        with self.assertRaises(HTTPError) as e:
+            self.client._request('/sample', request)
+        assert e.exception.code == 400
+        assert 'freq' in json.loads(e.exception.read())['error']
+
+    def test_short_time_axis(self):
+        settings = dict(self.settings, times=pd.date_range('2020-01-01', '2020-02-01', freq='MS'))
+        values = self.client.sample('a', settings=settings, seed=1)
+        assert len(values) == 2 * 100
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+import shutil
+import tempfile
+import unittest
+import os
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from excel_helper import ParameterRepository, Parameter
+from excel_helper.store import ResultStore
+
+try:
+    import zarr
+except ImportError:
+    zarr = None
+
+
+class ResultStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'results')
+        self.repository = ParameterRepository()
+        self.repository.add_all([
+            Parameter('a', module_name='numpy.random', distribution_name='uniform', param_a=0, param_b=1, unit='kg',
+                      tags='t1, t2'),
+            Parameter('a', module_name='numpy.random', distribution_name='uniform', param_a=1, param_b=2,
+                      source_scenarios_string='s1'),
+            Parameter('b', module_name='numpy.random', distribution_name='normal', param_a=10, param_b=1)])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_append_and_read(self):
+        store = ResultStore(self.path, mode='w')
+        blocks = []
+        for chunk in range(3):
+            self.repository.clear_cache()
+            blocks.append(self.repository['a']({'sample_size': 100}))
+            self.repository.get_parameter('a', 's1')({'sample_size': 100})
+            store.record(self.repository)
+
+        store = ResultStore(self.path, mode='r')
+        assert sorted(store.keys()) == [('a', 'default'), ('a', 's1')]
+        assert ('b', 'default') not in store
+
+        samples = store.read('a')
+        assert samples.shape == (1, 300)
+        assert samples.unit == 'kg'
+        assert samples.tags == 't1, t2'
+        assert (samples.values() == np.concatenate(blocks)).all()
+        # reads across block boundaries
+        assert (samples[0, 50:250:2] == np.concatenate(blocks)[50:250:2]).all()
+        assert (store.read('a', 's1')[0] >= 1).all()
+
+        with self.assertRaises(ValueError):
+            store.append(self.repository['a'])
+        with self.assertRaises(KeyError):
+            store.read('b')
+
+    def test_time_series(self):
+        settings = {'sample_size': 10, 'use_time_series': True,
+                    'times': pd.date_range('2009-01-01', '2009-12-01', freq='MS')}
+        store = ResultStore(self.path)
+        blocks = []
+        for layout in ['long', 'wide']:
+            self.repository.clear_cache()
+            blocks.append(self.repository['a'](dict(settings, layout=layout)))
+            store.append(self.repository['a'])
+
+        samples = ResultStore(self.path, mode='r').read('a')
+        assert samples.shape == (12, 20)
+        assert samples.times.equals(settings['times'])
+
+        long = samples.values(samples=slice(0, 10))
+        assert str(long.pint.u) == 'kilogram'
+        assert (long.values.quantity.magnitude == blocks[0].values.quantity.magnitude).all()
+        wide = samples.values(samples=slice(10, 20), layout='wide')
+        assert (wide.to_numpy() == blocks[1].to_numpy()).all()
+
+        self.repository.clear_cache()
+        self.repository['a'](dict(settings, times=settings['times'][:6]))
+        with self.assertRaises(ValueError):
+            store.append(self.repository['a'])
+
+    def test_replace(self):
+        self.repository['b']({'sample_size': 10})
+        ResultStore(self.path, mode='w').record(self.repository)
+        ResultStore(self.path, mode='w')
+        assert ResultStore(self.path, mode='r').keys() == []
+
+        os.makedirs(os.path.join(self.directory, 'other'))
+        with self.assertRaises(ValueError):
+            ResultStore(os.path.join(self.directory, 'other'), mode='w')
+
+    def test_backends(self):
+        backends = ['npz', 'npy'] + (['zarr'] if zarr is not None else [])
+        for backend in backends:
+            with self.subTest(backend=backend):
+                path = os.path.join(self.directory, backend)
+                store = ResultStore(path, mode='w', backend=backend, chunk_size=40)
+                blocks = []
+                for chunk in range(3):
+                    self.repository.clear_cache()
+                    blocks.append(self.repository['a']({'sample_size': 100}))
+                    store.record(self.repository, ['a'])
+                samples = ResultStore(path, mode='r').read('a')
+                assert samples.shape == (1, 300)
+                assert (samples[0, 30:290:3] == np.concatenate(blocks)[30:290:3]).all()
+
+    def test_compressed_chunks(self):
+        store = ResultStore(self.path, mode='w', chunk_size=40)
+        self.repository['a'](dict(sample_mean_value=True, sample_size=100))
+        store.append(self.repository['a'])
+        directory = os.path.join(self.path, 'a', 'default')
+        assert sorted(f for f in os.listdir(directory) if f.endswith('.npz')) == [
+            'block-000000.npz', 'block-000001.npz', 'block-000002.npz']
+        # constant samples compress to less than their raw size
+        assert sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)
+                   if f.endswith('.npz')) < 100 * 8
+
+    def test_column_indices(self):
+        for backend in ['npz', 'npy']:
+            with self.subTest(backend=backend):
+                path = os.path.join(self.directory, backend)
+                store = ResultStore(path, mode='w', backend=backend, chunk_size=40)
+                settings = {'sample_size': 100, 'use_time_series': True,
+                            'times': pd.date_range('2009-01-01', '2009-03-01', freq='MS'), 'layout': 'wide'}
+                expected = self.repository['a'](settings).to_numpy()
+                store.append(self.repository['a'])
+                samples = ResultStore(path, mode='r').read('a')
+
+                columns = [99, 0, 41, 40, 5, -1]
+                assert (samples[:, columns] == expected[:, columns]).all()
+                assert (samples[1, columns] == expected[1, columns]).all()
+                assert (samples[:, 90:10:-7] == expected[:, 90:10:-7]).all()
+                assert (samples[:, ::-1] == expected[:, ::-1]).all()
+                assert samples[:, []].shape == (3, 0)
+
+                # every chunk is decompressed once for all of its columns
+                if backend == 'npz':
+                    with mock.patch('numpy.load', wraps=np.load) as load:
+                        samples[:, list(range(0, 100, 3))]
+                    assert load.call_count == 3
+
+    def test_npy_memory_mapped(self):
+        store = ResultStore(self.path, mode='w', backend='npy')
+        self.repository['a']({'sample_size': 100})
+        store.append(self.repository['a'])
+        samples = ResultStore(self.path, mode='r').read('a')
+        assert all(isinstance(block, np.memmap) for block in samples.array.blocks)
+
+    @unittest.skipUnless(zarr, 'zarr is not installed')
+    def test_zarr(self):
+        settings = {'sample_size': 10, 'use_time_series': True,
+                    'times': pd.date_range('2009-01-01', '2009-12-01', freq='MS')}
+        store = ResultStore(self.path, mode='w', backend='zarr', chunk_size=5)
+        values = self.repository['a'](settings)
+        store.append(self.repository['a'])
+        samples = ResultStore(self.path, mode='r').read('a')
+        assert samples.shape == (12, 10)
+        assert (samples.values().values.quantity.magnitude == values.values.quantity.magnitude).all()
+
+    def test_several_scenarios(self):
+        repository = ParameterRepository()
+        repository.add_all([
+            Parameter('a', module_name='numpy.random', distribution_name='uniform', param_a=0, param_b=1),
+            Parameter('a', module_name='numpy.random', distribution_name='uniform', param_a=1, param_b=2,
+                      source_scenarios_string='s1, s2')])
+        values = repository.get_parameter('a', 's1')({'sample_size': 10})
+        store = ResultStore(self.path, mode='w')
+        store.record(repository)
+
+        assert sorted(store.keys()) == [('a', 's1'), ('a', 's2')]
+        for scenario in ['s1', 's2']:
+            assert (store.read('a', scenario)[0] == values).all()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from excel_helper import ExcelParameterLoader, ParameterRepository
+from excel_helper.validation import validate_definitions, DefinitionError
+
+
+class ValidationTestCase(unittest.TestCase):
+
+    def test_version_1(self):
+        errors, warnings = validate_definitions([
+            {'variable': 'a', 'module': 'numpy.random', 'distribution': 'choice', 'param 1': '1, 2,3', 'CAGR': 0.1,
+             'start date': datetime.datetime(2020, 1, 1), 'end date': datetime.datetime(2020, 6, 1),
+             'ref date': datetime.datetime(2020, 1, 1)},
+            {'variable': 'b', 'module': 'numpy.random', 'distribution': 'uniform', 'param 1': 1., 'param 2': 'x',
+             'CAGR': '0.1'},
+            {'variable': 'c', 'module': 'numpy.random', 'distribution': 'unknown', 'param 1': 1.},
+            {'variable': 'd', 'module': 'numpy.random', 'distribution': '', 'param 1': 1.},
+            {'variable': 'e', 'module': 'numpy.random', 'distribution': 'normal', 'param 1': 1., 'param 2': 1.,
+             'start date': datetime.datetime(2020, 6, 1), 'end date': datetime.datetime(2020, 1, 1),
+             'ref date': datetime.datetime(1800, 1, 1)},
+            {'variable': 'title'},
+            {'variable': 'f', 'expression': 'a * b'}])
+        assert errors == [
+            "row 3: CAGR '0.1' of <b> is not a number",
+            "row 3: param 2 'x' of <b> is not a number",
+            "row 4: distribution numpy.random.unknown of <c> does not resolve: module 'numpy.random' has no attribute "
+            "'unknown'",
+            'row 5: <d> has no distribution',
+            'row 6: ref date 1800-01-01 00:00:00 of <e> is out of range',
+            'row 6: start date 2020-06-01 00:00:00 of <e> is after the end date']
+        assert warnings == []
+
+    def test_version_2(self):
+        growth = {'variability growth': 0.1, 'initial_value_proportional_variation': 0.4,
+                  'ref date': datetime.datetime(2009, 1, 1)}
+        errors, _ = validate_definitions([
+            dict(growth, variable='a', type='exp', **{'ref value': 10., 'mean growth': -0.2}),
+            dict(growth, variable='b', type='interp', param='linear',
+                 **{'ref value': '{"2010-01-01":1, "2010-03-01":100}'}),
+            dict(growth, variable='c', type='exp', **{'ref value': 'ten', 'mean growth': ''}),
+            dict(growth, variable='d', type='interp', param='spline', **{'ref value': '{"2010-01-01":1'}),
+            dict(growth, variable='e', type='interp', param='linear', **{'ref value': '{"2010-01":1, "2010-03":2}'}),
+            dict(growth, variable='f', type='linear')], version=2)
+        assert errors == [
+            'row 4: <c> of type exp has no mean growth',
+            "row 4: ref value 'ten' of <c> is not a number",
+            "row 5: ref value of <d> is not JSON: Expecting ',' delimiter: line 1 column 16 (char 15)",
+            "row 5: param 'spline' of <d> is not an interpolation kind",
+            "row 6: ref value of <e> has a date '2010-01' that is not %Y-%m-%d",
+            "row 7: type 'linear' of <f> is not 'exp' or 'interp'"]
+
+    def test_workbooks(self):
+        for filename in ['./test_v2.xlsx', './test_expressions.xlsx']:
+            loader = ExcelParameterLoader(filename=filename)
+            assert validate_definitions(loader.load_parameter_definitions(), loader.definition_version) == ([], [])
+
+    def test_all_errors(self):
+        from openpyxl import Workbook
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.title = 'params'
+        sheet.append(['variable', 'scenario', 'module', 'distribution', 'param 1', 'param 2', 'ref date'])
+        sheet.append(['a', '', 'numpy.random', 'uniform', 1, 2, datetime.datetime(2020, 1, 1)])
+        sheet.append(['a', '', 'numpy.random', 'uniform', 1, 2, None])
+        sheet.append(['b', '', 'numpy.random', 'normalx', 1, 2, None])
+        sheet.append(['c', '', 'numpy.random', 'normal', 'x', 2, None])
+        sheet.append(['d', '', 'numpy.random', 'normal', 1, 2, 'soon'])
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'bad.xlsx')
+            workbook.save(filename)
+            for handler in ['xlrd', 'openpyxl']:
+                with self.subTest(handler=handler):
+                    with self.assertRaises(DefinitionError) as context:
+                        ExcelParameterLoader(filename=filename, excel_handler=handler,
+                                             validate=True).load_into_repo(ParameterRepository())
+                    assert context.exception.errors == [
+                        'params row 3: duplicate entry for parameter <a> and <default> scenario',
+                        "params row 4: distribution numpy.random.normalx of <b> does not resolve: module "
+                        "'numpy.random' has no attribute 'normalx'",
+                        "params row 5: param 1 'x' of <c> is not a number",
+                        "params row 6: ref date 'soon' of <d> is not a date"]
+        finally:
+            shutil.rmtree(directory)
+
+    def test_load(self):
+        repository = ParameterRepository()
+        ExcelParameterLoader(filename='./test_expressions.xlsx', validate=True).load_into_repo(repository)
+        assert repository.exists('energy')
+
+        # the module of the core router distribution is not installed
+        with self.assertRaises(DefinitionError) as context:
+            ExcelParameterLoader(filename='./test.xlsx', validate=True).load_into_repo(ParameterRepository())
+        assert len(context.exception.errors) == 1
+        assert 'bottom_up_comparision' in context.exception.errors[0]
+
+
+if __name__ == '__main__':
+    unittest.main()